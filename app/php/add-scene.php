@@ -1,6 +1,7 @@
 <?php
 require_once("/var/www/html/includes/user-check.php");
 require_once("/var/www/html/includes/session-check.php");
+require_once("/var/www/html/includes/preview.php");
 
 if ($_SERVER['REQUEST_METHOD'] === 'POST')
 {
@@ -60,12 +61,16 @@ if ($_SERVER['REQUEST_METHOD'] === 'POST')
 			// signal 30s popup to play
 			echo json_encode(["status" => "ok"]);
 
+			// the controller shows the scene on its next frame if it got it through the socket,
+			// the row is still written so the flag is kept for the rest of the web application
+			$previewed = send_preview($behavior, $brightness, $speed, $colors);
+
 			$db->beginTransaction();
 			
 			$stmt = $db->prepare("
 				UPDATE testmode
 				SET flag = 1,
-					reload = 1,
+					reload = :reload,
 					behavior = :behavior,
 					brightness = :brightness,
 					speed = :speed,
@@ -81,6 +86,7 @@ if ($_SERVER['REQUEST_METHOD'] === 'POST')
 					color9 = :color9
 			");
 			$stmt->execute([
+				':reload' => $previewed ? 0 : 1,
 				':behavior' => $behavior,
 				':brightness' => $brightness,
 				':speed' => $speed,
@@ -414,7 +420,7 @@ catch (PDOException $e)
 									class="color-btn rounded hover:scale-95 transition"
 									data-id="<?= $id ?>">
 									<img
-										src="/assets/colors/<?= $file ?>.svg"
+										src="/assets/colors.svg#<?= $file ?>"
 										class="w-10 h-10"
 										alt="<?= $file ?>">
 								</button>
@@ -517,7 +523,7 @@ catch (PDOException $e)
 		selectedBox.innerHTML = "";
 		selected.forEach((id,index)=>{
 			const img = document.createElement("img");
-			img.src = "/assets/colors/" + colorFiles[id] + ".svg";
+			img.src = "/assets/colors.svg#" + colorFiles[id];
 			img.className = "w-10 h-10 cursor-pointer";
 			img.alt = colorFiles[id];
 			img.addEventListener("click",()=>{
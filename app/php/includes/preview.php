@@ -0,0 +1,27 @@
+<?php
+// push a test mode scene straight to controller.py through its preview socket, shown on the next frame
+// returns false if the controller isn't listening, the caller then sets reload on the testmode row instead
+function send_preview($behavior, $brightness, $speed, $colors)
+{
+	$socket = @stream_socket_client("unix:///home/user/project/database/preview.sock", $errno, $errstr, 0.25);
+	if ($socket === false)
+	{
+		return false;
+	}
+	stream_set_timeout($socket, 1);
+
+	$message = json_encode([
+		"behavior" => $behavior,
+		"brightness" => $brightness,
+		"speed" => $speed,
+		"colors" => array_values($colors)
+	]);
+	fwrite($socket, $message . "\n");
+
+	// "ok", or "error <reason>" if the controller couldn't build the scene
+	$reply = fgets($socket);
+	fclose($socket);
+
+	return $reply !== false && trim($reply) === "ok";
+}
+?>
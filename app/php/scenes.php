@@ -189,7 +189,7 @@ $behavior_names = [
 									$color_id = $scene[$key] - 1;
 									$color_name = $colors[$color_id]['name'];
 							?>
-							<img src="/assets/colors/<?= $color_name; ?>.svg"
+							<img src="/assets/colors.svg#<?= $color_name; ?>"
 								 alt="<?= $color_name; ?>"
 								 class="w-7 h-7">
 							<?php endif; ?>
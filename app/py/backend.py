@@ -0,0 +1,404 @@
+import os
+import time
+import struct
+import collections
+
+# output backend used by the controller ("pca9685" on the board, "simulated" anywhere else)
+BACKEND = os.environ.get("PWM_BACKEND", "pca9685")
+
+# PCA9685 register map
+MODE1 = 0x00
+MODE2 = 0x01
+LED0_ON_L = 0x06
+ALL_LED_ON_L = 0xFA
+PRESCALE = 0xFE
+
+# MODE1 bits
+MODE1_RESTART = 0x80
+MODE1_AI = 0x20
+MODE1_SLEEP = 0x10
+MODE1_ALLCALL = 0x01
+
+# PCA9685 internal oscillator and channel count
+REFERENCE_CLOCK_SPEED = 25000000
+NUM_CHANNELS = 16
+
+# default I2C bus speed on the pi and fixed cost of one transaction through the kernel driver
+I2C_BUS_SPEED = 100000
+I2C_TRANSACTION_OVERHEAD = 0.0001
+
+# busio.I2C shared by every PCA9685 on the bus (created with the first board)
+i2c_bus = None
+
+
+# ---------------------- shared functions ----------------------
+
+def encode_duty_cycle(value):
+    # same range check the adafruit driver does
+    if not 0 <= value <= 0xffff:
+        raise ValueError(f"Out of range: value {value} not 0 <= value <= 65,535")
+
+    # full on and full off use bit 12 of the ON/OFF registers
+    if value == 0xffff:
+        return 0x1000, 0
+    if value < 0x0010:
+        return 0, 0x1000
+
+    # the PCA9685 is only 12 bits so drop the lowest four bits
+    return 0, value >> 4
+
+
+def decode_duty_cycle(on, off):
+    # inverse of encode_duty_cycle
+    if on & 0x1000:
+        return 0xffff
+    if off & 0x1000:
+        return 0
+
+    return (off & 0x0fff) << 4
+
+
+def transaction_time(num_bytes, bus_speed=I2C_BUS_SPEED):
+    # 9 clocks per byte (8 bits + ack) for the address byte and every written byte, plus start and stop
+    return I2C_TRANSACTION_OVERHEAD + (9 * (num_bytes + 1) + 2) / bus_speed
+
+
+def write_frame(pwm, duty_cycles, first_channel=0):
+    # pack every channel's ON/OFF registers into one buffer starting at LEDn_ON_L
+    buf = bytearray(1 + 4 * len(duty_cycles))
+    buf[0] = LED0_ON_L + 4 * first_channel
+
+    for i, value in enumerate(duty_cycles):
+        on, off = encode_duty_cycle(value)
+        struct.pack_into("<HH", buf, 1 + 4 * i, on, off)
+
+    write_buffer(pwm, buf)
+
+
+def read_register(pwm, register):
+    # read one register back through the same I2C device the frames go out on
+    buf = bytearray(1)
+    with pwm.i2c_device as i2c:
+        i2c.write_then_readinto(bytes([register]), buf)
+
+    return buf[0]
+
+
+def write_buffer(pwm, buf):
+    # auto-increment is enabled when the frequency is set, so the whole frame goes out in one transaction
+    with pwm.i2c_device as i2c:
+        i2c.write(buf)
+
+
+# --------------------- simulated backend ----------------------
+
+class SimulatedI2CDevice:
+    # stands in for adafruit_bus_device.I2CDevice on a PCA9685
+
+    def __init__(self, pca, bus_speed=I2C_BUS_SPEED, realtime=False, max_log=100000):
+        self.pca = pca
+        self.bus_speed = bus_speed
+        self.realtime = realtime
+
+        # bus counters
+        self.transactions = 0
+        self.bytes_written = 0
+        self.bus_time = 0.0
+
+        # timestamped (time, bytes) record of every write transaction
+        self.log = collections.deque(maxlen=max_log)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def write(self, buf, start=0, end=None):
+        data = bytes(buf[start:end])
+
+        # model the time the transaction holds the bus
+        cost = transaction_time(len(data), self.bus_speed)
+        if self.realtime:
+            time.sleep(cost)
+
+        self.transactions += 1
+        self.bytes_written += len(data)
+        self.bus_time += cost
+        self.log.append((time.monotonic(), data))
+
+        # first byte is the register pointer, the rest is data
+        self.pca.write_registers(data[0], data[1:])
+
+    def write_then_readinto(self, out_buffer, in_buffer, out_start=0, out_end=None, in_start=0, in_end=None):
+        data = bytes(out_buffer[out_start:out_end])
+
+        cost = transaction_time(len(data) + len(in_buffer), self.bus_speed)
+        if self.realtime:
+            time.sleep(cost)
+
+        self.transactions += 1
+        self.bytes_written += len(data)
+        self.bus_time += cost
+
+        # read back from the register pointer
+        if in_end is None:
+            in_end = len(in_buffer)
+        for i in range(in_start, in_end):
+            in_buffer[i] = self.pca.registers[(data[0] + i - in_start) & 0xff]
+
+
+class SimulatedChannel:
+    # stands in for adafruit_pca9685.PWMChannel
+
+    def __init__(self, pca, index):
+        self._pca = pca
+        self._index = index
+
+    @property
+    def duty_cycle(self):
+        on, off = self._pca.read_led(self._index)
+        return decode_duty_cycle(on, off)
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        on, off = encode_duty_cycle(value)
+
+        # one 4 byte transaction to LEDn_ON_L, exactly like the adafruit driver
+        address = LED0_ON_L + 4 * self._index
+        buf = bytes([address, on & 0xff, on >> 8, off & 0xff, off >> 8])
+        with self._pca.i2c_device as i2c:
+            i2c.write(buf)
+
+
+class SimulatedPCA9685:
+    # software model of a PCA9685 that records every duty cycle written to it
+
+    def __init__(self, address=0x40, bus_speed=I2C_BUS_SPEED, realtime=False, max_writes=100000):
+        self.address = address
+        self.reference_clock_speed = REFERENCE_CLOCK_SPEED
+
+        # 256 byte register file with power-on defaults
+        self.registers = bytearray(256)
+        self.registers[MODE1] = MODE1_SLEEP | MODE1_ALLCALL
+        self.registers[MODE2] = 0x04
+        self.registers[PRESCALE] = 0x1e
+
+        # every LED output starts full off
+        for channel in range(NUM_CHANNELS):
+            self.registers[LED0_ON_L + 4 * channel + 3] = 0x10
+
+        self.i2c_device = SimulatedI2CDevice(self, bus_speed=bus_speed, realtime=realtime, max_log=max_writes)
+        self.channels = [SimulatedChannel(self, i) for i in range(NUM_CHANNELS)]
+
+        # timestamped (time, channel, duty_cycle) record of every output change
+        self.writes = collections.deque(maxlen=max_writes)
+
+        # the adafruit driver resets the chip when it is created
+        self.reset()
+
+    def write_registers(self, register, data):
+        # registers touched by this transaction
+        touched = []
+
+        for byte in data:
+            self.registers[register] = byte
+            touched.append(register)
+
+            # the register pointer only moves when auto-increment is on
+            if self.registers[MODE1] & MODE1_AI:
+                register = (register + 1) & 0xff
+
+        # record the resulting duty cycle of every LED output that was touched
+        timestamp = time.monotonic()
+        led_end = LED0_ON_L + 4 * NUM_CHANNELS
+        for channel in sorted({(r - LED0_ON_L) // 4 for r in touched if LED0_ON_L <= r < led_end}):
+            on, off = self.read_led(channel)
+            self.writes.append((timestamp, channel, decode_duty_cycle(on, off)))
+
+    def read_led(self, channel):
+        base = LED0_ON_L + 4 * channel
+        on = self.registers[base] | (self.registers[base + 1] << 8)
+        off = self.registers[base + 2] | (self.registers[base + 3] << 8)
+        return on, off
+
+    @property
+    def frequency(self):
+        prescale = self.registers[PRESCALE]
+        return self.reference_clock_speed / 4096 / prescale
+
+    @frequency.setter
+    def frequency(self, freq):
+        prescale = int(self.reference_clock_speed / 4096.0 / freq + 0.5)
+        if prescale < 3:
+            raise ValueError("PCA9685 cannot output at the given frequency")
+
+        # same register sequence the adafruit driver uses (sleep, prescale, wake, auto-increment)
+        old_mode = self.registers[MODE1]
+        with self.i2c_device as i2c:
+            i2c.write(bytes([MODE1, (old_mode & 0x7f) | MODE1_SLEEP]))
+            i2c.write(bytes([PRESCALE, prescale]))
+            i2c.write(bytes([MODE1, old_mode]))
+            i2c.write(bytes([MODE1, old_mode | MODE1_RESTART | MODE1_AI]))
+
+    def reset(self):
+        with self.i2c_device as i2c:
+            i2c.write(bytes([MODE1, 0x00]))
+
+    def deinit(self):
+        self.reset()
+
+
+class SimulatedInputDevice:
+    # stands in for gpiozero.DigitalInputDevice, driven from code instead of a pin
+
+    def __init__(self, pin, pull_up=True, bounce_time=None):
+        self.pin = pin
+        self.pull_up = pull_up
+        self.bounce_time = bounce_time
+        self._value = 0
+
+        self.when_activated = None
+        self.when_deactivated = None
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def is_active(self):
+        return bool(self._value)
+
+    def drive(self, value):
+        # change the input state and fire the same callbacks gpiozero would
+        value = int(bool(value))
+        if value == self._value:
+            return
+
+        self._value = value
+        callback = self.when_activated if value else self.when_deactivated
+        if callback is not None:
+            callback()
+
+    def close(self):
+        return
+
+
+class SimulatedLED:
+    # stands in for gpiozero.LED
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.is_lit = False
+        self.blinking = False
+
+    def on(self):
+        self.is_lit = True
+        self.blinking = False
+
+    def off(self):
+        self.is_lit = False
+        self.blinking = False
+
+    def blink(self, on_time=1, off_time=1, n=None, background=True):
+        self.blinking = True
+
+    def close(self):
+        return
+
+
+class SimulatedRTC:
+    # stands in for adafruit_ds3231.DS3231, keeping its own time as an offset from the system clock
+
+    def __init__(self):
+        self.offset = 0.0
+
+    @property
+    def datetime(self):
+        return time.localtime(time.time() + self.offset)
+
+    @datetime.setter
+    def datetime(self, value):
+        self.offset = time.mktime(value) - time.time()
+
+
+# ---------------------- backend functions ----------------------
+
+def shared_i2c_bus():
+    # create the I2C bus interface once per process, every board and the RTC are on the same bus
+    global i2c_bus
+
+    if i2c_bus is None:
+        # hardware libraries are only imported when the bus is really used
+        import board
+        import busio
+        i2c_bus = busio.I2C(board.SCL, board.SDA)
+
+    return i2c_bus
+
+
+def create_pwm(backend=None, address=0x40):
+    backend = backend or BACKEND
+
+    if backend == "simulated":
+        return SimulatedPCA9685(address=address, realtime=True)
+
+    if backend == "pca9685":
+        import adafruit_pca9685
+        return adafruit_pca9685.PCA9685(shared_i2c_bus(), address=address)
+
+    raise ValueError(f"unknown output backend: {backend}")
+
+
+def create_input(pin, bounce_time=None, backend=None):
+    backend = backend or BACKEND
+
+    if backend == "simulated":
+        return SimulatedInputDevice(pin=pin, pull_up=True, bounce_time=bounce_time)
+
+    if backend == "pca9685":
+        import gpiozero
+        return gpiozero.DigitalInputDevice(pin=pin, pull_up=True, bounce_time=bounce_time)
+
+    raise ValueError(f"unknown output backend: {backend}")
+
+
+def create_led(pin, backend=None):
+    backend = backend or BACKEND
+
+    if backend == "simulated":
+        return SimulatedLED(pin)
+
+    if backend == "pca9685":
+        import gpiozero
+        return gpiozero.LED(pin)
+
+    raise ValueError(f"unknown output backend: {backend}")
+
+
+def create_rtc(backend=None):
+    backend = backend or BACKEND
+
+    if backend == "simulated":
+        return SimulatedRTC()
+
+    if backend == "pca9685":
+        import adafruit_ds3231
+        return adafruit_ds3231.DS3231(shared_i2c_bus())
+
+    raise ValueError(f"unknown output backend: {backend}")
+
+
+def set_system_clock(seconds, backend=None):
+    # step the system clock to a time.time() value (needs root)
+    backend = backend or BACKEND
+
+    if backend == "simulated":
+        # the simulated backend never touches the real clock
+        return
+
+    if backend == "pca9685":
+        time.clock_settime(time.CLOCK_REALTIME, seconds)
+        return
+
+    raise ValueError(f"unknown output backend: {backend}")
@@ -0,0 +1,257 @@
+import gc
+import sys
+import json
+import time
+import zones
+import frames
+import scenes
+import backend
+import argparse
+import datetime
+import platform
+import renderer
+import scheduler
+import tracemalloc
+
+# every benchmark scene cycles through red, green and blue (color_id -> hexval)
+BENCHMARK_COLORS = {1: "ff0000", 2: "00ff00", 3: "0000ff"}
+
+# the full range the web application lets users pick
+SPEEDS = [1, 2, 3, 4, 5]
+BRIGHTNESSES = [0, 1, 2, 3, 4, 5]
+
+# playback time before allocations are measured
+WARMUP_TIME = 0.1
+
+# bump when the layout of the results file changes
+RESULTS_VERSION = 1
+
+# a result is a regression if its CPU time per frame grows by more than this fraction of the baseline
+CPU_TOLERANCE = 0.25
+
+# or if its period error grows by more than this fraction of the nominal period
+PERIOD_TOLERANCE = 0.01
+
+
+def build_benchmark_scene(behavior, speed, brightness):
+    # compile the scene through the same path the controller uses for a scenes row
+    color_ids = list(BENCHMARK_COLORS) + [None] * (10 - len(BENCHMARK_COLORS))
+    row = (behavior, brightness, speed, *color_ids)
+
+    return scenes.build_scene(None, row, BENCHMARK_COLORS)
+
+
+def scene_bytes(scene):
+    # memory held by the compiled frames and packed transactions
+    return scene.scene_frames.nbytes + sum(len(transaction) for color in scene.transactions for transaction in color)
+
+
+def nominal_period(scene):
+    # one pass through every color
+    return len(scene.transactions) * sum(scene.durations)
+
+
+def measure_period(log, scene):
+    # match the recorded transactions to the scene's frame order and scale the nominal period by real/nominal time
+    sequence = [transaction for color in scene.transactions for transaction in color]
+    durations = list(scene.durations) * len(scene.transactions)
+    offsets = [sum(durations[:i]) for i in range(len(durations))]
+    period = nominal_period(scene)
+
+    matched = []
+    index = None
+    cycles = 0
+    for timestamp, data in log:
+        # the next frame written is the next one in order, or a later one if frames were skipped
+        start = 0 if index is None else index + 1
+        for skipped in range(len(sequence)):
+            position = (start + skipped) % len(sequence)
+            if sequence[position] == data:
+                break
+        else:
+            continue
+
+        if index is not None and position <= index:
+            cycles += 1
+        index = position
+        matched.append((timestamp, cycles * period + offsets[position]))
+
+    if len(matched) < 2:
+        return None, cycles
+
+    real_span = matched[-1][0] - matched[0][0]
+    nominal_span = matched[-1][1] - matched[0][1]
+
+    return period * real_span / nominal_span, cycles
+
+
+def start_playback(scene):
+    # play the scene on a fresh recording PCA9685
+    pwm = backend.SimulatedPCA9685(realtime=True)
+    pwm.frequency = 1600
+    pwm.i2c_device.log.clear()
+
+    lighting = renderer.Renderer({zones.DEFAULT_BOARD: pwm})
+    lighting.play(scene)
+
+    return pwm, lighting
+
+
+def measure_timing(scene, seconds):
+    # returns the recording board and the CPU time used while playing for the given time
+    cpu_start = time.process_time()
+    pwm, lighting = start_playback(scene)
+    time.sleep(seconds)
+    lighting.stop()
+    cpu_time = time.process_time() - cpu_start
+
+    return pwm, cpu_time
+
+
+def traced_size(snapshot):
+    # the recording backend keeps a log of every write, so it doesn't count as the renderer's memory
+    filters = [tracemalloc.Filter(False, backend.__file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+
+    return sum(stat.size for stat in snapshot.filter_traces(filters).statistics("filename"))
+
+
+def measure_allocations(scene, seconds):
+    # memory the render loop holds on to while playing (tracemalloc slows everything down, so it has its own pass)
+    gc.collect()
+    tracemalloc.start()
+    pwm, lighting = start_playback(scene)
+
+    # let the first frames go out, and the snapshot filters compile, before the first snapshot
+    time.sleep(WARMUP_TIME)
+    traced_size(tracemalloc.take_snapshot())
+    start = traced_size(tracemalloc.take_snapshot())
+    tracemalloc.reset_peak()
+    time.sleep(seconds)
+    end = traced_size(tracemalloc.take_snapshot())
+    peak = tracemalloc.get_traced_memory()[1]
+
+    lighting.stop()
+    tracemalloc.stop()
+
+    return end - start, peak
+
+
+def run_benchmark(behavior, speed, brightness, seconds, memory_seconds):
+    gc.collect()
+
+    compile_start = time.perf_counter()
+    scene = build_benchmark_scene(behavior, speed, brightness)
+    compile_time = time.perf_counter() - compile_start
+    period = nominal_period(scene)
+
+    # long holds (solid at low speeds) play for at least two frames so there is something to time
+    seconds = max(seconds, 2 * max(scene.durations))
+
+    scheduler.reset_stats()
+    pwm, cpu_time = measure_timing(scene, seconds)
+    frame_stats = scheduler.get_stats(behavior).summary()
+    bus_stats = scheduler.bus_summary()
+    writes = len(pwm.i2c_device.log)
+    real_period, cycles = measure_period(pwm.i2c_device.log, scene)
+
+    scheduler.reset_stats()
+    growth, peak = measure_allocations(scene, memory_seconds)
+
+    return {
+        "behavior": behavior,
+        "speed": speed,
+        "brightness": brightness,
+        "seconds": seconds,
+        "compile_time": compile_time,
+        "scene_bytes": scene_bytes(scene),
+        "frames": writes,
+        "missed": frame_stats["missed"],
+        "cpu_per_frame": cpu_time / writes if writes else None,
+        "transactions_per_second": writes / seconds,
+        "bus_time_per_frame": bus_stats["mean_bus_time"],
+        "mean_lateness": frame_stats["mean_lateness"],
+        "jitter": frame_stats["jitter"],
+        "nominal_period": period,
+        "real_period": real_period,
+        "period_error": (real_period - period) / period if real_period is not None else None,
+        "cycles": cycles,
+        "alloc_per_cycle": growth * period / memory_seconds,
+        "peak_alloc": peak,
+    }
+
+
+def find_regressions(results, baseline):
+    # compare against a previous results file, returns one line per regression
+    previous = {(r["behavior"], r["speed"], r["brightness"]): r for r in baseline["results"]}
+    regressions = []
+
+    for result in results:
+        key = (result["behavior"], result["speed"], result["brightness"])
+        old = previous.get(key)
+        if old is None:
+            continue
+
+        if old["cpu_per_frame"] and result["cpu_per_frame"] is not None:
+            if result["cpu_per_frame"] > old["cpu_per_frame"] * (1 + CPU_TOLERANCE):
+                regressions.append(f"{key}: cpu_per_frame {old['cpu_per_frame']:.6f} -> {result['cpu_per_frame']:.6f}")
+
+        if old["period_error"] is not None and result["period_error"] is not None:
+            if abs(result["period_error"]) > abs(old["period_error"]) + PERIOD_TOLERANCE:
+                regressions.append(f"{key}: period_error {old['period_error']:+.4f} -> {result['period_error']:+.4f}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every lighting behavior on a recording PCA9685.")
+    parser.add_argument("--output", default="benchmark.json", help="results file (JSON)")
+    parser.add_argument("--seconds", type=float, default=1.0, help="playback time per run for timing")
+    parser.add_argument("--memory-seconds", type=float, default=0.5, help="playback time per run for allocations")
+    parser.add_argument("--behavior", action="append", choices=sorted(frames.BEHAVIORS), help="only these behaviors")
+    parser.add_argument("--speed", action="append", type=int, choices=SPEEDS, help="only these speeds")
+    parser.add_argument("--brightness", action="append", type=int, choices=BRIGHTNESSES, help="only these brightnesses")
+    parser.add_argument("--baseline", help="earlier results file to check for regressions")
+    args = parser.parse_args()
+
+    results = []
+    for behavior in args.behavior or list(frames.BEHAVIORS):
+        for speed in args.speed or SPEEDS:
+            for brightness in args.brightness or BRIGHTNESSES:
+                result = run_benchmark(behavior, speed, brightness, args.seconds, args.memory_seconds)
+                results.append(result)
+
+                real_period = result["real_period"]
+                print(f"{behavior:18} speed {speed} brightness {brightness}: "
+                      f"{result['cpu_per_frame'] * 1e6:7.1f} us/frame, "
+                      f"{result['transactions_per_second']:6.1f} writes/s, "
+                      f"period {result['nominal_period']:.3f}s nominal "
+                      f"{'-' if real_period is None else f'{real_period:.3f}s'} real, "
+                      f"{result['alloc_per_cycle']:+.0f} B/cycle")
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "bus_speed": backend.I2C_BUS_SPEED,
+        "seconds": args.seconds,
+        "memory_seconds": args.memory_seconds,
+        "results": results,
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(results, json.load(file))
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import time
+import sqlite3
+import backend
+import metrics
+import threading
+import collections
+
+# skip the red/yellow/green startup blinks and bring the board, database and inputs up at once (1 to turn it on)
+FAST_BOOT = os.environ.get("FAST_BOOT", "0") == "1"
+
+# run LED patterns (on_time, off_time) for a passed and a failed self-test
+LED_OK = (0.5, 0.5)
+LED_FAULT = (0.1, 0.1)
+
+# longest to wait for the first frame before reporting the cold start anyway
+FIRST_FRAME_TIMEOUT = 10.0
+
+# result of one startup check
+SelfTest = collections.namedtuple("SelfTest", ["name", "ok", "detail", "seconds"])
+
+# fallback start time if /proc isn't available
+IMPORT_TIME = time.monotonic()
+
+
+def process_age():
+    # seconds since the kernel started this process (interpreter start and imports included)
+    try:
+        with open("/proc/self/stat") as file:
+            # fields after the command name, starttime is field 22 of the whole line
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as file:
+            uptime = float(file.read().split()[0])
+
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - IMPORT_TIME
+
+
+def run_check(name, check):
+    start = time.monotonic()
+    try:
+        detail = check()
+        ok = True
+    except Exception as e:
+        detail = f"{type(e).__name__}: {e}"
+        ok = False
+
+    return SelfTest(name, ok, detail, time.monotonic() - start)
+
+
+def check_pwm(pwm):
+    # frames are written as one burst, so the board must be awake with auto-increment on
+    mode1 = backend.read_register(pwm, backend.MODE1)
+    if mode1 & backend.MODE1_SLEEP or not mode1 & backend.MODE1_AI:
+        raise RuntimeError(f"unexpected MODE1 {mode1:#04x}")
+
+    return f"MODE1 {mode1:#04x}"
+
+
+def check_database(path):
+    # own connection, the controller's can only be used from the main thread
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+
+    if result != "ok":
+        raise RuntimeError(result)
+
+    return "quick_check ok"
+
+
+def check_inputs(input_bus):
+    states = input_bus.states()
+
+    return f"{sum(states)} of {len(states)} connections active"
+
+
+def self_test(pwms, database_path, input_bus):
+    results = [run_check(f"pwm {address:#04x}", lambda pwm=pwm: check_pwm(pwm)) for address, pwm in pwms.items()]
+    results.append(run_check("database", lambda: check_database(database_path)))
+    results.append(run_check("inputs", lambda: check_inputs(input_bus)))
+
+    return results
+
+
+def report_boot(lighting, pwms, database_path, input_bus, run_LED):
+    # once the first real frame is out, report the cold start and run the self-test without holding up the lights
+    lighting.first_frame.wait(timeout=FIRST_FRAME_TIMEOUT)
+    cold_start = process_age()
+    metrics.COLD_START.set(cold_start)
+    print(f"Cold start to first frame: {cold_start:.3f} s")
+
+    results = self_test(pwms, database_path, input_bus)
+    for result in results:
+        metrics.SELF_TEST.set(1 if result.ok else 0, result.name)
+        print(f"Self-test {result.name}: {'ok' if result.ok else 'FAILED'} ({result.detail}, {result.seconds * 1000:.1f} ms)")
+
+    # a fast blink on the run LED means a check failed, see the journal for which one
+    on_time, off_time = LED_OK if all(result.ok for result in results) else LED_FAULT
+    run_LED.blink(on_time=on_time, off_time=off_time)
+
+    return results
+
+
+def start_report(lighting, pwms, database_path, input_bus, run_LED):
+    thread = threading.Thread(target=report_boot, args=(lighting, pwms, database_path, input_bus, run_LED), daemon=True)
+    thread.start()
+
+    return thread
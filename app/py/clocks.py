@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import config
+import signal
+import sqlite3
+import backend
+import datetime
+import threading
+import collections
+
+# lighting database (override to run against a copy off the board)
+DATABASE_PATH = os.environ.get("LIGHTING_DB", '/home/user/project/database/lighting.db')
+
+# how often the RTC is read and the clock table is updated (on the minute)
+SYNC_INTERVAL = 60.0
+
+# the system clock is only stepped when it is further off than this (the RTC only counts whole seconds)
+CLOCK_TOLERANCE = 2.0
+
+# how often the wakeup and CPU footprint is logged
+FOOTPRINT_INTERVAL = 3600.0
+
+
+class Footprint:
+    # wakeups by reason and CPU time used since the service started
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.cpu_start = time.process_time()
+        self.wakeups = collections.Counter()
+
+    def wake(self, reason):
+        self.wakeups[reason] += 1
+
+    def summary(self):
+        hours = (time.monotonic() - self.start) / 3600
+        cpu = time.process_time() - self.cpu_start
+        wakeups = sum(self.wakeups.values())
+        reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(self.wakeups.items()))
+
+        return (f"Clock footprint: {wakeups} wakeups ({reasons}) and {cpu:.3f} s CPU in {hours:.2f} h, "
+                f"{wakeups / hours if hours else 0:.1f} wakeups/h")
+
+
+def initialize_database():
+    conn = sqlite3.connect(DATABASE_PATH)
+
+    # the web application may hold the lock for a moment
+    conn.execute("PRAGMA busy_timeout = 5000;")
+
+    return conn
+
+
+def sync_clocks(rtc, conn):
+    # set the system clock from the RTC if it drifted, and save the time to the clock table
+    now = rtc.datetime
+    drift = time.mktime(now) - time.time()
+    if abs(drift) > CLOCK_TOLERANCE:
+        backend.set_system_clock(time.mktime(now))
+        print(f"System clock stepped by {drift:+.1f} s to {time.strftime('%Y-%m-%d %H:%M:%S', now)}")
+
+    # a time the user just entered (change = 1) is never overwritten before it is applied
+    try:
+        conn.execute("UPDATE clock SET year = ?, month = ?, day = ?, hour = ?, minute = ? WHERE change IS NOT 1",
+                     (now.tm_year, now.tm_mon, now.tm_mday, now.tm_hour, now.tm_min))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+
+
+def apply_clock_change(rtc, conn):
+    # set the RTC and the system clock to a time the user entered in the web application, returns True if one was
+    row = conn.execute("SELECT year, month, day, hour, minute, change FROM clock").fetchone()
+    if row is None or row[5] != 1:
+        return False
+    year, month, day, hour, minute = row[:5]
+
+    # get weekday and yearday for DS3231 (seconds = 0, daylight savings not required)
+    weekday = datetime.date(year, month, day).weekday()
+    computed = time.localtime(time.mktime(time.struct_time((year, month, day, hour, minute, 0, 0, 0, -1))))
+    new_time = time.struct_time((year, month, day, hour, minute, 0, weekday, computed.tm_yday, -1))
+
+    rtc.datetime = new_time
+    backend.set_system_clock(time.mktime(new_time))
+    print(f"Clock set to {year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}")
+
+    # reset change flag
+    try:
+        conn.execute("UPDATE clock SET change = 0")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+
+    return True
+
+
+def seconds_until_sync():
+    # the next sync is on the minute, so the clock table turns over with the clock
+    return SYNC_INTERVAL - time.time() % SYNC_INTERVAL
+
+
+def main():
+    # one process and one I2C bus handle for reading and setting the RTC
+    rtc = backend.create_rtc()
+    conn = initialize_database()
+    footprint = Footprint()
+
+    # log the footprint on the way out too (systemctl stop)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # clock.change is picked up from lighting.db change notifications instead of polling
+    wake = threading.Event()
+    watcher = config.ConfigWatcher(conn, DATABASE_PATH)
+    watcher.changed()
+    watcher.notify(wake)
+
+    # a time entered while the service was down
+    apply_clock_change(rtc, conn)
+    sync_clocks(rtc, conn)
+
+    next_sync = time.monotonic() + seconds_until_sync()
+    next_report = time.monotonic() + FOOTPRINT_INTERVAL
+
+    try:
+        while True:
+            timeout = next_sync - time.monotonic()
+            if timeout > 0 and wake.wait(timeout):
+                wake.clear()
+                footprint.wake("database")
+
+                # our own commits don't count, only the web application's
+                if watcher.changed():
+                    apply_clock_change(rtc, conn)
+                continue
+
+            footprint.wake("sync")
+            sync_clocks(rtc, conn)
+            next_sync = time.monotonic() + seconds_until_sync()
+
+            if time.monotonic() >= next_report:
+                print(footprint.summary())
+                next_report += FOOTPRINT_INTERVAL
+    finally:
+        print(footprint.summary())
+
+
+if __name__ == "__main__":
+    main()
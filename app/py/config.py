@@ -0,0 +1,147 @@
+import os
+import time
+import ctypes
+import select
+import struct
+import threading
+import collections
+import ctypes.util
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+
+# how often to check the database files when inotify isn't available
+CONFIG_POLL_INTERVAL = 1.0
+
+# quiet time after the last file event before waking (the commit lands in -shm through mmap, which inotify can't see)
+CONFIG_SETTLE_TIME = 0.05
+
+# everything main() needs from lighting.db to decide which scene should be running
+Config = collections.namedtuple("Config", [
+    "test_flag",
+    "test_reload",
+    "open_hours",
+    "event_scenes",
+    "event_dates",
+    "default_id",
+    "connection_scenes",
+])
+
+
+class ConfigWatcher:
+    # tells the controller when another connection (the PHP side) has committed to lighting.db
+
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.paths = [path, path + "-wal"]
+
+        # nothing has been read yet, so the first check always reports a change
+        self.signature = None
+        self.data_version = None
+
+    def file_signature(self):
+        # every commit in WAL mode touches the -wal file, and checkpoints touch the database file
+        signature = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+
+        return signature
+
+    def changed(self):
+        # cheap check first: no file activity means no query at all
+        signature = self.file_signature()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+
+        # data_version only moves for commits from other connections (the PHP side, or the controller's writer thread)
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return False
+        self.data_version = data_version
+
+        return True
+
+    def forget(self):
+        # the next check reports a change whatever the files say (a reload requested from outside)
+        self.signature = None
+        self.data_version = None
+
+    def notify(self, wake):
+        # set wake whenever lighting.db or its -wal file is written, without polling if possible
+        try:
+            fd = inotify_watch(os.path.dirname(self.paths[0]))
+            target = self.inotify_loop
+            args = (fd, wake)
+        except (OSError, AttributeError):
+            target = self.poll_loop
+            args = (wake,)
+
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+
+        return thread
+
+    def inotify_loop(self, fd, wake):
+        name = os.path.basename(self.paths[0])
+
+        while True:
+            # blocks until something in the database directory changes
+            if not self.database_event(os.read(fd, 4096), name):
+                continue
+
+            # let the writer finish its commit, then wake once for the whole burst
+            while select.select([fd], [], [], CONFIG_SETTLE_TIME)[0]:
+                os.read(fd, 4096)
+            wake.set()
+
+    @staticmethod
+    def database_event(data, name):
+        # walk the inotify_event structs and only report lighting.db, -wal and -journal
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = struct.unpack_from("iIII", data, offset)
+            filename = data[offset + 16:offset + 16 + length].rstrip(b"\0").decode(errors="replace")
+            offset += 16 + length
+
+            if filename.startswith(name):
+                return True
+
+        return False
+
+    def poll_loop(self, wake):
+        signature = self.file_signature()
+
+        while True:
+            time.sleep(CONFIG_POLL_INTERVAL)
+
+            # only compare file stats here, changed() still does the real check
+            new_signature = self.file_signature()
+            if new_signature != signature:
+                signature = new_signature
+                wake.set()
+
+
+def inotify_watch(path):
+    # open an inotify descriptor watching a directory for writes
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+        errno = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    return fd
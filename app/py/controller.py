@@ -1,44 +1,73 @@
+import os
+import sys
 import time
-import board
-import busio
-import numpy
+import boot
+import signal
+import asyncio
+import config
+import scenes
 import sqlite3
-import gpiozero
+import backend
+import inputs
+import metrics
 import datetime
-import threading
-import adafruit_pca9685
+import renderer
+import timeline
+import zones
+import writer
+import preview
+import recorder
+import concurrent.futures
 
-# thread global flag
-stop_flag = threading.Event()
+# lighting database (override to run against a copy off the board)
+DATABASE_PATH = os.environ.get("LIGHTING_DB", '/home/user/project/database/lighting.db')
 
+# Unix socket the web application pushes test mode scenes through (next to lighting.db, which PHP can already reach)
+PREVIEW_SOCKET = os.environ.get("PREVIEW_SOCKET", os.path.join(os.path.dirname(DATABASE_PATH), "preview.sock"))
 
-# ---------------------- init functions ------------------------
+# time.monotonic() fubar.py started a factory reset at, left for the reload it sends afterwards
+RESET_STAMP = os.environ.get("RESET_STAMP", os.path.join(os.path.dirname(DATABASE_PATH), "reset.stamp"))
+
+# longest the control loop sleeps without a reason to wake (picks up system clock changes)
+MAX_IDLE_WAIT = 60.0
+
+# crossfade between scenes in seconds (0 switches on the next frame boundary)
+SCENE_FADE_TIME = float(os.environ.get("SCENE_FADE_TIME", "0"))
+
+# test mode ends this long after the last scene the web application sent
+TEST_MODE_TIME = 30.0
 
-def initialize_pwm():
-    # create the I2C bus interface
-    i2c = busio.I2C(board.SCL, board.SDA)
 
-    # create a PCA9685 object and set the frequency for LED control
-    pwm = adafruit_pca9685.PCA9685(i2c)
+# ---------------------- init functions ------------------------
+
+def initialize_pwm(address=zones.DEFAULT_BOARD):
+    # create a PCA9685 object on the configured backend and set the frequency for LED control
+    pwm = backend.create_pwm(address=address)
     pwm.frequency = 1600
 
     return pwm
 
 
+def initialize_boards(pwm, zone_list):
+    # the default board is already running the status blinks, create every other board a zone is on
+    pwms = {zones.DEFAULT_BOARD: pwm}
+    for address in zones.boards(zone_list):
+        if address not in pwms:
+            pwms[address] = initialize_pwm(address)
+
+    return pwms
+
+
 def pwm_good(pwm):
     # blink red 3 times on startup
     for i in range(3):
         # set red color
-        pwm.channels[0].duty_cycle = 0xffff
-        pwm.channels[1].duty_cycle = 0x0000
-        pwm.channels[2].duty_cycle = 0x0000
+        backend.write_frame(pwm, (0xffff, 0x0000, 0x0000))
         # hold red for 0.5 second
         time.sleep(0.5)
 
         # set all channels off
-        pwm.channels[0].duty_cycle = 0x0000
-        pwm.channels[1].duty_cycle = 0x0000
-        pwm.channels[2].duty_cycle = 0x0000
+        backend.write_frame(pwm, (0x0000, 0x0000, 0x0000))
         # hold off for 0.25 second
         time.sleep(0.25)
 
@@ -47,7 +76,7 @@ def pwm_good(pwm):
 
 def initialize_database():
     # connect to SQLite database and get cursor
-    conn = sqlite3.connect('/home/user/project/database/lighting.db')
+    conn = sqlite3.connect(DATABASE_PATH, factory=metrics.TimedConnection)
     cursor = conn.cursor()
 
     # set WAL mode to avoid blocking between python and PHP
@@ -69,55 +98,56 @@ def database_good(pwm):
     # blink yellow 3 times on startup
     for i in range(3):
         # set yellow color
-        pwm.channels[0].duty_cycle = 0xffff
-        pwm.channels[1].duty_cycle = 0xffff
-        pwm.channels[2].duty_cycle = 0x0000
+        backend.write_frame(pwm, (0xffff, 0xffff, 0x0000))
         # hold yellow for 0.5 second
         time.sleep(0.5)
 
         # set all channels off
-        pwm.channels[0].duty_cycle = 0x0000
-        pwm.channels[1].duty_cycle = 0x0000
-        pwm.channels[2].duty_cycle = 0x0000
+        backend.write_frame(pwm, (0x0000, 0x0000, 0x0000))
         # hold off for 0.25 second
         time.sleep(0.25)
 
     return
 
 
-def initialize_input_bus():
-    # provide GPIO input pins to use
-    input_pins = [22, 10, 9, 11, 5, 6, 13, 26]
+def initialize_input_bus(wake):
+    # initialize the connection inputs with edge callbacks and debounce
+    input_bus = inputs.InputBus(wake)
 
-    # initialize input_pins as gpiozero DigitalInputDevice class objects
-    inputs = [gpiozero.DigitalInputDevice(pin=pin, pull_up=True) for pin in input_pins]
-
-    return inputs
+    return input_bus
 
 
 def input_bus_good(pwm):
     # blink green 3 times on startup
     for i in range(3):
         # set green color
-        pwm.channels[0].duty_cycle = 0x0000
-        pwm.channels[1].duty_cycle = 0xffff
-        pwm.channels[2].duty_cycle = 0x0000
+        backend.write_frame(pwm, (0x0000, 0xffff, 0x0000))
         # hold green for 0.5 second
         time.sleep(0.5)
 
         # set all channels off
-        pwm.channels[0].duty_cycle = 0x0000
-        pwm.channels[1].duty_cycle = 0x0000
-        pwm.channels[2].duty_cycle = 0x0000
+        backend.write_frame(pwm, (0x0000, 0x0000, 0x0000))
         # hold off for 0.5 second
         time.sleep(0.25)
 
     return
 
 
+def initialize_parallel(wake):
+    # bring up the PWM board and the inputs (and their hardware imports) on their own threads
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+        pwm_future = pool.submit(initialize_pwm)
+        input_future = pool.submit(initialize_input_bus, wake)
+
+        # the database connection can only be used from the thread that opened it, so it opens here meanwhile
+        conn, cursor = initialize_database()
+
+        return pwm_future.result(), conn, cursor, input_future.result()
+
+
 def initialize_run_LED():
     # RUN on board using GPIO18 (board pin 12)
-    run_LED = gpiozero.LED(18)
+    run_LED = backend.create_led(18)
     run_LED.off()
 
     return run_LED
@@ -125,117 +155,17 @@ def initialize_run_LED():
 
 # ---------------------- data functions ------------------------
 
-def read_scene_info(cursor, scene_id):
-    # read scene info from lighting.db
-    cursor.execute(
-        "SELECT behavior, brightness, speed, color0, color1, color2, color3, color4, color5, color6, color7, color8, color9 FROM scenes WHERE scene_id = ?",
-        (scene_id,))
-
-    # get full default scene row as tuple (tuples aren't real, they can't hurt you)
-    row = cursor.fetchone()
-
-    # store scene table data in variables
-    behavior, brightness, speed, color0, color1, color2, color3, color4, color5, color6, color7, color8, color9 = row
-
-    # turn behavior string into callable lighting function
-    function = globals().get(behavior)
-
-    # put all color_id keys into a list
-    color_ids = [color0, color1, color2, color3, color4, color5, color6, color7, color8, color9]
-
-    # remove unused colors starting from last
-    for i in range(9, -1, -1):
-        if color_ids[i] is None:
-            del color_ids[i]
-
-    # if all colors were null, add black to the list (keep things from breaking)
-    if all(color_id is None for color_id in color_ids):
-        color_ids = [64]
-
-    color_list = color_ids_to_list(cursor, color_ids)
-
-    # derive cycle time from speed
-    cycle_time = 6 - speed
-
-    # derive dimmer from brightness (1 = 10%, 10 = 100%)
-    dimmer = int(0x3333 * (5 - brightness))
-
-    return function, color_list, cycle_time, dimmer
-
-
-def read_connection_scene(cursor, connection_id):
-    # increment connection_id for sqlite 1-indexing
-    connection_id += 1
+def read_connection_scenes(cursor):
+    # read the scene used by every connection in lighting.db (index 0 is connection_id 1)
+    cursor.execute("SELECT scene FROM connections ORDER BY connection_id")
 
-    # navigate to scene used in connection in lighting.db
-    cursor.execute("SELECT scene FROM connections WHERE connection_id = ?", (connection_id,))
-
-    # get connection scene row (more tuple nonsense)
-    row = cursor.fetchone()
-
-    # get scene_id from pulled row
-    scene_id = row[0]
-
-    # if scene_id is null, set to 1 (so nothing breaks)
-    if scene_id is None:
-        scene_id = 1
-
-    return scene_id
-
-
-def color_ids_to_list(cursor, color_ids):
-    ####################### from ChatGPT #######################
-    # Build placeholders for the IN clause
-    placeholders = ",".join("?" for _ in color_ids)
-
-    # Query hex values for all needed colors at once
-    query = f"""SELECT color_id, hexval FROM colors WHERE color_id IN ({placeholders})"""
-
-    cursor.execute(query, color_ids)
+    # pull the scene column as a list of tuples (more tuple nonsense)
     rows = cursor.fetchall()
 
-    # Map ids to hex strings
-    id_to_hex = {row[0]: row[1] for row in rows}
-
-    # Final ordered list of hex values
-    colors = [id_to_hex.get(color_id) for color_id in color_ids]
-    ############################################################
-
-    # convert hex string into floats
-    color_list = []
-    for color in colors:
-        # create a list for the individual red, green, and blue values
-        rgb = []
-
-        # extract each color from the hex value string
-        red = color[:2]
-        green = color[2:4]
-        blue = color[4:]
-
-        # convert string to int (hex format)
-        red = int(red, 16)
-        green = int(green, 16)
-        blue = int(blue, 16)
-
-        # convert int to float
-        red = red / 255.0
-        green = green / 255.0
-        blue = blue / 255.0
-
-        # round float to nearest five hundredth so we have less complex real-time fp calculations
-        red = round(red / 0.05) * 0.05
-        green = round(green / 0.05) * 0.05
-        blue = round(blue / 0.05) * 0.05
-
-        # append rgb values to rgb list
-        rgb.append(red)
-        rgb.append(green)
-        rgb.append(blue)
-
-        # move rgb values to color_list list
-        color_list.append(rgb)
+    # if scene_id is null, set to 1 (so nothing breaks)
+    scene_ids = [1 if row[0] is None else row[0] for row in rows]
 
-    return color_list
+    return scene_ids
 
 
 def read_events(cursor):
@@ -252,52 +182,28 @@ def read_events(cursor):
     return event_scenes, event_dates
 
 
-def read_open_hours(cursor, weekday):
+def read_open_hours(cursor):
     # read entire time table
-    cursor.execute("SELECT * FROM time")
+    cursor.execute("SELECT * FROM time ORDER BY weekday_id")
 
     # pull the entire table as a list of tuples
     hours = cursor.fetchall()
 
-    # extract the business hours depending on the weekday
-    open_hour, open_minute, close_hour, close_minute = hours[weekday][1], hours[weekday][2], hours[weekday][3], hours[weekday][4]
-
-    return open_hour, open_minute, close_hour, close_minute
+    # extract the business hours for every weekday as (open_hour, open_minute, close_hour, close_minute)
+    open_hours = [(row[1], row[2], row[3], row[4]) for row in hours]
 
+    return open_hours
 
-def set_active_connections(conn, cursor, connection_id):
-    # set the active connections to none in the table
-    cursor.execute("UPDATE connections SET is_active = 0")
 
-    # if a new connection is active
-    if connection_id != 0:
-        # set the is_active column to 1 for the active connection
-        cursor.execute("UPDATE connections SET is_active = 1 WHERE connection_id = ?", (connection_id,))
-
-    # commit changes to database
-    conn.commit()
+def set_active_connections(db_writer, connection_id):
+    # mark only connection_id as active (0 for none), touching only the rows whose flag changes
+    db_writer.update("connections",
+                     "UPDATE connections SET is_active = (connection_id = ?) WHERE is_active IS NOT (connection_id = ?)",
+                     (connection_id, connection_id))
 
     return
 
 
-def read_input_bus(inputs):
-    # gather states from inputs
-    states = [i.value for i in inputs]
-
-    return states
-
-
-def check_time():
-    # get time struct from pi clock
-    now = datetime.datetime.now()
-
-    # get ISO 8601 string of today's date
-    today = datetime.date.today()
-    date_string = today.isoformat()
-
-    return date_string, now.hour, now.minute
-
-
 def check_test_flags_active(cursor):
     # check flag on testmode table
     cursor.execute("SELECT flag, reload FROM testmode")
@@ -308,40 +214,45 @@ def check_test_flags_active(cursor):
     return flag
 
 
-def read_test_scene_info(cursor):
+def read_test_row(cursor):
     # read scene info from lighting.db
-    cursor.execute("SELECT * FROM testmode")
+    cursor.execute(f"SELECT {scenes.SCENE_COLUMNS} FROM testmode")
 
-    # get full default scene row as tuple (tuples aren't real, they can't hurt you)
-    row = cursor.fetchone()
+    # get full test scene row as tuple (tuples aren't real, they can't hurt you)
+    return cursor.fetchone()
 
-    # store event scene table data in variables
-    _, _, behavior, brightness, speed, color0, color1, color2, color3, color4, color5, color6, color7, color8, color9 = row
 
-    # turn behavior string into callable lighting function
-    function = globals().get(behavior)
+def reset_test_reload(db_writer, row, end_test=False):
+    # clear reload only if the testmode row still holds the scene that was read, so a scene the web application
+    # writes while the reset is queued keeps its reload and is picked up on the next read
+    match = " AND ".join(f"{column} IS ?" for column in scenes.SCENE_COLUMNS.split(", "))
+    flag = "flag = 0, " if end_test else ""
+    db_writer.update("testmode.reload", f"UPDATE testmode SET {flag}reload = 0 WHERE reload = 1 AND {match}", row)
 
-    # put all color_id keys into a list
-    color_ids = [color0, color1, color2, color3, color4, color5, color6, color7, color8, color9]
 
-    # remove unused colors starting from last
-    for i in range(9, -1, -1):
-        if color_ids[i] is None:
-            del color_ids[i]
+def read_config(cursor):
+    # read every table main() makes decisions from in one go
+    flag, reload = check_test_flags_active(cursor)
+    open_hours = read_open_hours(cursor)
+    event_scenes, event_dates = read_events(cursor)
+    default_id = read_default_scene_id(cursor)
+    connection_scenes = read_connection_scenes(cursor)
 
-    # if all colors were null, add black to the list (keep things from breaking)
-    if all(color_id is None for color_id in color_ids):
-        color_ids = [64]
+    return config.Config(flag, reload, open_hours, event_scenes, event_dates, default_id, connection_scenes)
 
-    color_list = color_ids_to_list(cursor, color_ids)
 
-    # derive cycle time from speed
-    cycle_time = 6 - speed
+def reload_settings(cursor, scene_cache, db_writer):
+    # re-read settings, refresh the compiled scenes and recompile the schedule timeline
+    settings = read_config(cursor)
+    scene_cache.refresh(cursor)
+    schedule = timeline.Timeline(settings.open_hours, settings.event_scenes, settings.event_dates)
 
-    # derive dimmer from brightness (1 = 10%, 10 = 100%)
-    dimmer = int(0x3333 * (5 - brightness))
+    return settings, schedule
 
-    return function, color_list, cycle_time, dimmer
+
+def get_zone_scenes(zone_list, settings, get_scene):
+    # each zone's own default scene, or the site default scene for zones without one
+    return [get_scene(settings.default_id if zone.scene is None else zone.scene) for zone in zone_list]
 
 
 def read_default_scene_id(cursor):
@@ -351,361 +262,78 @@ def read_default_scene_id(cursor):
     # get row from table
     row = cursor.fetchone()
 
-    # get scene_id
-    scene_id = row[0]
+    # get scene_id (None if no scene is marked default, which shows lights off)
+    scene_id = None if row is None else row[0]
 
     return scene_id
 
 
-# -------------------- lighting functions ----------------------
-
-def sequence_solid(pwm, color_list, cycle_time, dimmer):
-    # get color_list length
-    num_colors = len(color_list)
-
-    while True:
-        for color in range(num_colors):
-            # assign lookup table value to color channels minus the scaled dimmer value
-            pwm.channels[0].duty_cycle = int(color_list[color][0] * (0xffff - dimmer))
-            pwm.channels[1].duty_cycle = int(color_list[color][1] * (0xffff - dimmer))
-            pwm.channels[2].duty_cycle = int(color_list[color][2] * (0xffff - dimmer))
-
-            # check for raised flag during the cycle_time timeout
-            if stop_flag.wait(timeout=cycle_time):
-                return None
-
-
-def sequence_fade(pwm, color_list, cycle_time, dimmer):
-    # create lookup table for loop
-    x = numpy.linspace(0, 2 * numpy.pi, 100 * cycle_time, endpoint=False, dtype=float)
-    
-    fade = []
-    for i in x:
-        fade.append(int(round(32767.5 * numpy.sin(i + ((3 * numpy.pi) / 2)) + 32767.5)))
-
-    # all speeds use 10ms step time
-    step_time = 0.01
-
-    # get color_list length
-    num_colors = len(color_list)
-
-    while True:
-        for color in range(num_colors):
-            for i in range(100 * cycle_time):
-                # assign lookup table value to color channels minus the scaled dimmer value
-                pwm.channels[0].duty_cycle = int(
-                    (color_list[color][0] * int(fade[i] - ((fade[i] / 0xffff) * dimmer))))
-                pwm.channels[1].duty_cycle = int(
-                    (color_list[color][1] * int(fade[i] - ((fade[i] / 0xffff) * dimmer))))
-                pwm.channels[2].duty_cycle = int(
-                    (color_list[color][2] * int(fade[i] - ((fade[i] / 0xffff) * dimmer))))
-
-                # check for raised flag during the step_time timeout
-                if stop_flag.wait(timeout=step_time):
-                    return None
-
-
-def sequence_decay(pwm, color_list, cycle_time, dimmer):
-    # create lookup table for loop
-    x1 = numpy.linspace(0, 65535, 20 * cycle_time, endpoint=True, dtype=int)
-    x2 = numpy.linspace(65535, 0, 80 * cycle_time, endpoint=True, dtype=int)
-
-    decay = []
-    for i in range(cycle_time * 20):
-	    decay.append(int(x1[i]))
-    for i in range(cycle_time * 80):
-	    decay.append(int(x2[i]))
-
-    # all speeds use 10ms step time
-    step_time = 0.01
-
-    # get color_list length
-    num_colors = len(color_list)
-
-    while True:
-        for color in range(num_colors):
-            for i in range(100 * cycle_time):
-                # assign lookup table value to color channels minus the scaled dimmer value
-                pwm.channels[0].duty_cycle = int(
-                    (color_list[color][0] * int(decay[i] - ((decay[i] / 0xffff) * dimmer))))
-                pwm.channels[1].duty_cycle = int(
-                    (color_list[color][1] * int(decay[i] - ((decay[i] / 0xffff) * dimmer))))
-                pwm.channels[2].duty_cycle = int(
-                    (color_list[color][2] * int(decay[i] - ((decay[i] / 0xffff) * dimmer))))
-
-                # check for raised flag during the step_time timeout
-                if stop_flag.wait(timeout=step_time):
-                    return None
-
-
-def sequence_wigwag(pwm, color_list, cycle_time, dimmer):
-    # lookup table for function
-    wigwag = [0x0, 0x0, 0xffff, 0xffff, 0x0, 0xffff, 0xffff, 0x0, 0xffff, 0xffff]
-
-    # create smaller time increment for loop
-    step_time = cycle_time / 10
-
-    # get color_list length
-    num_colors = len(color_list)
-
-    while True:
-        for color in range(num_colors):
-            for i in range(10):
-                # assign lookup table value to color channels minus the scaled dimmer value
-                pwm.channels[0].duty_cycle = int((color_list[color][0] * int(wigwag[i] - dimmer)))
-                pwm.channels[1].duty_cycle = int((color_list[color][1] * int(wigwag[i] - dimmer)))
-                pwm.channels[2].duty_cycle = int((color_list[color][2] * int(wigwag[i] - dimmer)))
-
-                # check for raised flag during the step_time timeout
-                if stop_flag.wait(timeout=step_time):
-                    return None
-
-
-def sequence_sos(pwm, color_list, cycle_time, dimmer):
-    # lookup table for function
-    sos = [0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0x0,
-           0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff,
-           0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff,
-           0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff,
-           0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0,
-           0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0,
-           0x0, 0x0]
-
-    # create smaller time increment for loop
-    step_time = cycle_time / 100
-
-    # get color_list length
-    num_colors = len(color_list)
-
-    while True:
-        for color in range(num_colors):
-            for i in range(100):
-                # assign lookup table value to color channels minus the scaled dimmer value
-                pwm.channels[0].duty_cycle = int((color_list[color][0] * int(sos[i] - ((sos[i] / 0xffff) * dimmer))))
-                pwm.channels[1].duty_cycle = int((color_list[color][1] * int(sos[i] - ((sos[i] / 0xffff) * dimmer))))
-                pwm.channels[2].duty_cycle = int((color_list[color][2] * int(sos[i] - ((sos[i] / 0xffff) * dimmer))))
-
-                # check for raised flag during the step_time timeout
-                if stop_flag.wait(timeout=step_time):
-                    return None
-
-
-def sequence_breathe(pwm, color_list, cycle_time, dimmer):
-    # create lookup table for loop
-    x = numpy.linspace(0, 6 * numpy.pi, 100 * cycle_time, endpoint=False, dtype=float)
-
-    breathe = []
-    for i in x:
-        breathe.append(int(round(20000 * numpy.sin(i + ((3 * numpy.pi) / 2)) + 45535)))
-
-    # all speeds use 10ms step time
-    step_time = 0.01
-
-    # get color_list length
-    num_colors = len(color_list)
-
-    while True:
-        for color in range(num_colors):
-            for i in range(100 * cycle_time):
-                # assign lookup table value to color channels minus the scaled dimmer value
-                pwm.channels[0].duty_cycle = int(
-                    (color_list[color][0] * int(breathe[i] - ((breathe[i] / 0xffff) * dimmer))))
-                pwm.channels[1].duty_cycle = int(
-                    (color_list[color][1] * int(breathe[i] - ((breathe[i] / 0xffff) * dimmer))))
-                pwm.channels[2].duty_cycle = int(
-                    (color_list[color][2] * int(breathe[i] - ((breathe[i] / 0xffff) * dimmer))))
-
-                # check for raised flag during the step_time timeout
-                if stop_flag.wait(timeout=step_time):
-                    return None
-
-
-def crossfade(pwm, color_list, cycle_time, dimmer):
-    # create smaller time increment for loop and set increment count
-    step_time = 0.025
-
-    increment_dict = {
-        1: 10,
-        2: 20,
-        3: 30,
-        4: 40,
-        5: 50
-    }
-
-    inc = increment_dict[cycle_time]
-
-    # get color_list length
-    num_colors = len(color_list)
-
-    while True:
-        for color in range(len(color_list)):
-            # get current color and next color for transition
-            if color == num_colors - 1:
-                current_color = color_list[color]
-                next_color = color_list[0]
-                color_difference = [a - b for a, b in zip(next_color, current_color)]
-
-                for i in range(1, inc + 1):
-                    # assign current color values with progressive difference from next color
-                    pwm.channels[0].duty_cycle = int(current_color[0] * (0xffff - dimmer)) + int(
-                        (color_difference[0] * i * (0xffff - dimmer)) / inc)
-                    pwm.channels[1].duty_cycle = int(current_color[1] * (0xffff - dimmer)) + int(
-                        (color_difference[1] * i * (0xffff - dimmer)) / inc)
-                    pwm.channels[2].duty_cycle = int(current_color[2] * (0xffff - dimmer)) + int(
-                        (color_difference[2] * i * (0xffff - dimmer)) / inc)
-
-                    # check for raised flag during the step_time timeout
-                    if stop_flag.wait(timeout=step_time):
-                        return None
-
-            # get current color and next color for transition
-            else:
-                current_color = color_list[color]
-                next_color = color_list[color + 1]
-                color_difference = [a - b for a, b in zip(next_color, current_color)]
-
-                for i in range(1, inc + 1):
-                    # assign current color values with progressive difference from next color
-                    pwm.channels[0].duty_cycle = int(current_color[0] * (0xffff - dimmer)) + int(
-                        (color_difference[0] * i * (0xffff - dimmer)) / inc)
-                    pwm.channels[1].duty_cycle = int(current_color[1] * (0xffff - dimmer)) + int(
-                        (color_difference[1] * i * (0xffff - dimmer)) / inc)
-                    pwm.channels[2].duty_cycle = int(current_color[2] * (0xffff - dimmer)) + int(
-                        (color_difference[2] * i * (0xffff - dimmer)) / inc)
-
-                    # check for raised flag during the step_time timeout
-                    if stop_flag.wait(timeout=step_time):
-                        return None
-
-
-def crossfade_hold(pwm, color_list, cycle_time, dimmer):
-    # create smaller time increment for loop and set increment count
-    step_time = 0.015
-
-    increment_dict = {
-        1: 10,
-        2: 20,
-        3: 30,
-        4: 40,
-        5: 50
-    }
-
-    inc = increment_dict[cycle_time]
-
-    hold_time = (2 * step_time * inc) / 5
-
-    # get color_list length
-    num_colors = len(color_list)
-
-    while True:
-        for color in range(len(color_list)):
-            # get current color and next color for transition
-            if color == num_colors - 1:
-                current_color = color_list[color]
-                next_color = color_list[0]
-                color_difference = [a - b for a, b in zip(next_color, current_color)]
-
-                # hold color for hold_time then crossfade
-                pwm.channels[0].duty_cycle = int(current_color[0] * (0xffff - dimmer))
-                pwm.channels[1].duty_cycle = int(current_color[1] * (0xffff - dimmer))
-                pwm.channels[2].duty_cycle = int(current_color[2] * (0xffff - dimmer))
-
-                # check for raised flag during the hold_time timeout
-                if stop_flag.wait(timeout=hold_time):
-                    return None
-
-                for i in range(1, inc + 1):
-                    # assign current color values with progressive difference from next color
-                    pwm.channels[0].duty_cycle = int(current_color[0] * (0xffff - dimmer)) + int(
-                        (color_difference[0] * i * (0xffff - dimmer)) / inc)
-                    pwm.channels[1].duty_cycle = int(current_color[1] * (0xffff - dimmer)) + int(
-                        (color_difference[1] * i * (0xffff - dimmer)) / inc)
-                    pwm.channels[2].duty_cycle = int(current_color[2] * (0xffff - dimmer)) + int(
-                        (color_difference[2] * i * (0xffff - dimmer)) / inc)
-
-                    # check for raised flag during the step_time timeout
-                    if stop_flag.wait(timeout=step_time):
-                        return None
-
-            # get current color and next color for transition
-            else:
-                current_color = color_list[color]
-                next_color = color_list[color + 1]
-                color_difference = [a - b for a, b in zip(next_color, current_color)]
-
-                # hold color for hold_time then crossfade
-                pwm.channels[0].duty_cycle = int(current_color[0] * (0xffff - dimmer))
-                pwm.channels[1].duty_cycle = int(current_color[1] * (0xffff - dimmer))
-                pwm.channels[2].duty_cycle = int(current_color[2] * (0xffff - dimmer))
-
-                # check for raised flag during the hold_time timeout
-                if stop_flag.wait(timeout=hold_time):
-                    return None
+# ------------------------ control core ------------------------
 
-                for i in range(1, inc + 1):
-                    # assign current color values with progressive difference from next color
-                    pwm.channels[0].duty_cycle = int(current_color[0] * (0xffff - dimmer)) + int(
-                        (color_difference[0] * i * (0xffff - dimmer)) / inc)
-                    pwm.channels[1].duty_cycle = int(current_color[1] * (0xffff - dimmer)) + int(
-                        (color_difference[1] * i * (0xffff - dimmer)) / inc)
-                    pwm.channels[2].duty_cycle = int(current_color[2] * (0xffff - dimmer)) + int(
-                        (color_difference[2] * i * (0xffff - dimmer)) / inc)
+class Wakeup:
+    # a set() any thread can call (like threading.Event) that wakes one task on the control loop,
+    # remembering when it was first set so every source's response time can be measured
 
-                    # check for raised flag during the step_time timeout
-                    if stop_flag.wait(timeout=step_time):
-                        return None
+    def __init__(self):
+        self.loop = None
+        self.event = None
+        self.time = None
 
+    def bind(self, loop):
+        # called from the control loop once it runs, sets before that are kept
+        # (the event exists before set() can see the loop, and a set() that didn't see it has already set the time)
+        self.event = asyncio.Event()
+        self.loop = loop
+        if self.time is not None:
+            self.event.set()
 
-# --------------------------- main -----------------------------
+    def set(self):
+        if self.time is None:
+            self.time = time.monotonic()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
 
-def main():
-    # -------------- initialization and startup ----------------
+    async def wait(self, timeout=None):
+        # returns the time.monotonic() of the first set() since the last wait, or None on timeout
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
 
-    # create pwm object for light control
-    pwm = initialize_pwm()
+        self.event.clear()
+        set_time, self.time = self.time, None
 
-    # indicate pwm object has been initialized
-    pwm_good(pwm)
+        return set_time or time.monotonic()
 
-    # load sqlite database for program
-    conn, cursor = initialize_database()
 
-    # indicate database has been initialized
-    database_good(pwm)
+def read_reset_start():
+    # the factory reset this reload comes from, None for any other reload (the stamp is only used once)
+    try:
+        with open(RESET_STAMP) as f:
+            start = float(f.read())
+        os.unlink(RESET_STAMP)
+    except (OSError, ValueError):
+        return None
 
-    # initialize input bus for hardware inputs
-    inputs = initialize_input_bus()
+    return start
 
-    # indicate input bus has been initialized
-    input_bus_good(pwm)
 
-    # initialize run LED
-    run_LED = initialize_run_LED()
-    
-    # blink run LED forever
-    run_LED.blink(on_time=0.5, off_time=0.5)
+class ReloadLatency:
+    # takes the input bus's place in a render command to log when a requested reload reaches the lights
 
-	# get default scene number
-    default_id = read_default_scene_id(cursor)
+    def __init__(self, reset_start=None):
+        self.reset_start = reset_start
 
-    # read default scene info from scenes table
-    function, color_list, cycle_time, dimmer = read_scene_info(cursor, scene_id=default_id)
+    def record_first_frame(self, request_time):
+        now = time.monotonic()
+        print(f"Reload applied, first frame {(now - request_time) * 1000:.1f} ms after the request")
+        if self.reset_start is not None:
+            print(f"Factory reset to lights on in {now - self.reset_start:.2f} s")
 
-    # start lighting thread with default scene info
-    lighting_thread = threading.Thread(target=function, args=(pwm, color_list, cycle_time, dimmer))
-    lighting_thread.start()
-
-    # create status variable to track if lighting is disabled
-    lights_off = False
-
-    # create status variable to see if a connection was just running
-    connection_was_running = False
-    
-    # set starting value for default scene_id
-    default_id = 0
-
-    # ----------------- lighting thread loop -------------------
 
+class ControlCore:
+    # the lighting hierarchy on one asyncio loop, with one task per source of change that only wakes when it has work
+    #
     # light tube control hierarchy
     # -------------------------------
     # 1 - test mode: if test mode is active, then it has control
@@ -714,234 +342,347 @@ def main():
     # 4 - event: if today is an event day AND the business is open AND no connections are active AND test mode is off, then event lighting will be displayed
     # 5 - default: if no other level has control, then default lighting will be displayed
 
-    while True:
-        # check current test mode flags state
-        flag, reload = check_test_flags_active(cursor)
-        
-        # if test mode is active
-        while(flag == 1):
-            # run test scene for up to 30 seconds or until flag is reset
-            for i in range(0,60):
-                # check current test mode flags state
-                flag, reload = check_test_flags_active(cursor)
-                
-                if flag == 1 and reload == 1:
-                    # get test scene info
-                    test_function, test_color_list, test_cycle_time, test_dimmer = read_test_scene_info(cursor)
-
-                    # stop the lighting thread
-                    stop_flag.set()
-                    lighting_thread.join()
-                    stop_flag.clear()
-
-                    # and restart the lighting thread with the test scene info
-                    lighting_thread = threading.Thread(target=test_function, args=(pwm, test_color_list, test_cycle_time, test_dimmer))
-                    lighting_thread.start()
-
-                    # update reload on table and reset 30s timer
-                    cursor.execute("UPDATE testmode SET reload = 0")
-                    conn.commit()
-                    time.sleep(0.1)
-                    break
-
-                elif flag == 1:
-                    if i == 59:
-                        # turn off flag to end test mode
-                        cursor.execute("UPDATE testmode SET flag = 0")
-                        conn.commit()
-                        time.sleep(0.1)
-                    else:
-                        time.sleep(0.5)
-
-            if flag == 0:
-                # stop the lighting thread
-                stop_flag.set()
-                lighting_thread.join()
-                stop_flag.clear()
-
-                # and restart lighting thread with default scene info
-                lighting_thread = threading.Thread(target=function, args=(pwm, color_list, cycle_time, dimmer))
-                lighting_thread.start()
-
-        # check current state of input bus
-        states = read_input_bus(inputs)
-
-        # if any connections are currently active
+    def __init__(self, cursor, db_writer, watcher, scene_cache, input_bus, lighting, zone_list, input_wake, config_wake,
+                 clock=datetime.datetime):
+        # clock.now() is the wall clock the schedule is checked against (simulate.py passes a virtual one)
+        self.clock = clock
+
+        self.cursor = cursor
+        self.db_writer = db_writer
+        self.watcher = watcher
+        self.scene_cache = scene_cache
+        self.input_bus = input_bus
+        self.lighting = lighting
+        self.zone_list = zone_list
+        self.input_wake = input_wake
+        self.config_wake = config_wake
+
+        # read all scene selection settings, load the scene cache and compile the schedule
+        self.settings, self.schedule = reload_settings(cursor, scene_cache, db_writer)
+
+        # compiled scene shown while the business is closed
+        self.off_scene = scenes.Scene(None, "sequence_solid", [[0, 0, 0]], 1, 0)
+
+        # nothing is playing yet, so the first update starts the right scene for this moment
+        self.zone_scenes = [None] * len(zone_list)
+
+        # connection_id marked active in lighting.db (None until the first update writes it)
+        self.active_connection = None
+
+        # scene sent by the web application and the task that ends test mode (None outside test mode)
+        self.test_scene = None
+        self.test_timeout = None
+
+        # testmode flag as last read, test mode starts and ends when it changes
+        self.test_flag_seen = None
+
+        # set when the config task has compiled a new schedule
+        self.schedule_changed = None
+
+        # time.monotonic() of a reload requested with SIGHUP that the config task hasn't done yet,
+        # and the start of the factory reset that sent it (None for any other reload)
+        self.reload_time = None
+        self.reset_start = None
+
+        # asyncio server behind the preview socket (None until run() has started it, or if it couldn't be)
+        self.preview_server = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.input_wake.bind(loop)
+        self.config_wake.bind(loop)
+        self.schedule_changed = asyncio.Event()
+
+        # systemctl reload (SIGHUP) re-reads the configuration, fubar.py sends it after a factory reset
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self.request_reload)
+        except (RuntimeError, NotImplementedError) as e:
+            # only the main thread can take signals (the controller run from a test harness)
+            print(f"Reload signal unavailable: {e}")
+
+        self.check_test_mode()
+        self.update("startup")
+
+        # test mode scenes from the web application, applied on the next frame
+        try:
+            self.preview_server = await preview.serve(PREVIEW_SOCKET, self.preview)
+        except OSError as e:
+            # test mode still works through the testmode row
+            print(f"Preview socket unavailable: {e}")
+
+        try:
+            await asyncio.gather(self.watch_inputs(), self.watch_config(), self.watch_schedule())
+        finally:
+            # stopped (systemctl stop or a crash), the socket goes with the controller
+            if self.preview_server is not None:
+                preview.close(self.preview_server, PREVIEW_SOCKET)
+                self.preview_server = None
+
+    async def watch_inputs(self):
+        # wakes on every connection edge
+        while True:
+            trigger = await self.input_wake.wait()
+            self.update("input", trigger, self.input_bus.take_edge())
+
+    async def watch_config(self):
+        # wakes when lighting.db was written, and only reloads if another connection changed a setting
+        while True:
+            trigger = await self.config_wake.wait()
+            if not self.watcher.changed():
+                continue
+
+            reload_time, self.reload_time = self.reload_time, None
+            if not self.reload_config(force=reload_time is not None):
+                continue
+            self.schedule_changed.set()
+
+            reset_start, self.reset_start = self.reset_start, None
+            if reload_time is None:
+                self.update("config", trigger)
+            elif not self.update("reload", trigger, reload_time, ReloadLatency(reset_start)):
+                print("Reload applied, the scenes are unchanged")
+
+    def reload_config(self, force=False):
+        # re-read lighting.db, returns False without touching anything if no setting the controller acts on changed
+        # (the writer thread's active connection and the clock sync commit to lighting.db too)
+        settings = read_config(self.cursor)
+        scenes_changed = self.scene_cache.refresh(self.cursor)
+        # (a test scene waiting for its reload reset is always read again, as the web application may have resent it)
+        if not force and not scenes_changed and settings == self.settings and not settings.test_reload:
+            return False
+
+        self.settings = settings
+        self.schedule = timeline.Timeline(settings.open_hours, settings.event_scenes, settings.event_dates)
+        self.check_test_mode()
+
+        return True
+
+    def request_reload(self):
+        # re-read lighting.db on the config task even if the watcher hasn't seen the write yet
+        if self.reload_time is None:
+            self.reload_time = time.monotonic()
+            self.reset_start = read_reset_start()
+        self.watcher.forget()
+        self.config_wake.set()
+
+    async def watch_schedule(self):
+        # wakes at the next open, close or event transition (capped so system clock changes are picked up)
+        while True:
+            timeout = self.schedule.seconds_until_next(self.clock.now(), MAX_IDLE_WAIT)
+            due = time.monotonic() + timeout
+            try:
+                await asyncio.wait_for(self.schedule_changed.wait(), timeout)
+                # a new schedule may move the next transition
+                self.schedule_changed.clear()
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            self.update("schedule", due)
+
+    def check_test_mode(self):
+        # start, restart or end test mode from the testmode flags just read
+        # (our own flag writes may still be queued, so the flag only counts when it changes)
+        settings = self.settings
+        flag_seen, self.test_flag_seen = self.test_flag_seen, settings.test_flag
+
+        if settings.test_flag == 1 and settings.test_reload == 1:
+            # a new test scene (or the same one sent again) from the web application
+            row = read_test_row(self.cursor)
+            try:
+                self.test_scene = self.scene_cache.build(row)
+            except (ValueError, KeyError) as e:
+                self.reject_test_scene(row, e)
+                return
+
+            # reading the same row again before the reset is committed only restarts the timer
+            reset_test_reload(self.db_writer, row)
+            self.restart_test_timeout()
+
+        elif settings.test_flag == 1 and flag_seen != 1 and self.test_timeout is None:
+            # test mode was on when the controller started, it still times out
+            self.restart_test_timeout()
+
+        elif settings.test_flag == 0 and flag_seen == 1 and self.test_timeout is not None:
+            # the web application ended test mode
+            self.test_timeout.cancel()
+            self.test_timeout = None
+            self.test_scene = None
+
+    def reject_test_scene(self, row, error):
+        # a testmode row that can't be built ends test mode instead of the controller,
+        # and both flags are reset so the row isn't read again on every reload
+        print(f"Test scene rejected: {error}")
+
+        reset_test_reload(self.db_writer, row, end_test=True)
+
+        if self.test_timeout is not None:
+            self.test_timeout.cancel()
+            self.test_timeout = None
+        self.test_scene = None
+
+    def get_scene(self, scene_id):
+        # the compiled scene, or lights off if its scenes row can't be built (the controller keeps running)
+        try:
+            return self.scene_cache.get(scene_id)
+        except (ValueError, KeyError) as e:
+            print(f"Scene {scene_id} rejected, lights off instead: {e}")
+            return self.off_scene
+
+    def preview(self, row, received):
+        # a test mode scene pushed through the preview socket, shown from the next frame
+        # an unknown behavior or color raises ValueError, which is sent back to the web application
+        self.test_scene = self.scene_cache.build(row)
+
+        # PHP writes flag = 1 to the testmode row after the reply (the flag still reading 0 until then doesn't end it),
+        # and a timeout that just ended the last test must not turn it off after that
+        self.db_writer.discard("testmode.flag")
+        self.restart_test_timeout()
+        self.update("preview", received)
+
+    def restart_test_timeout(self):
+        # (re)start the 30s timer
+        if self.test_timeout is not None:
+            self.test_timeout.cancel()
+        self.test_timeout = asyncio.create_task(self.end_test_mode())
+
+    async def end_test_mode(self):
+        due = time.monotonic() + TEST_MODE_TIME
+        await asyncio.sleep(TEST_MODE_TIME)
+
+        # turn off flag to end test mode, unless the web application has sent a new scene to reload since
+        self.db_writer.update("testmode.flag", "UPDATE testmode SET flag = 0 WHERE flag = 1 AND reload = 0")
+        self.test_timeout = None
+        self.test_scene = None
+
+        self.update("testmode", due)
+
+    def choose_scenes(self):
+        # every zone's scene for this moment, from the top of the hierarchy down
+        if self.test_scene is not None:
+            return [self.test_scene] * len(self.zone_list)
+
+        # the lowest connection that is powered has control
+        states = self.input_bus.states()
         if any(states):
-            # set connection status to running
-            connection_was_running = True
+            connection = states.index(True) + 1
+            scene = self.get_scene(self.settings.connection_scenes[connection - 1])
 
-            # return the lowest index that is true
-            connection = states.index(True)
+        else:
+            connection = 0
+
+            # check the current time against the compiled schedule
+            is_open, event_scene_id = self.schedule.state(self.clock.now())
+            if not is_open:
+                scene = self.off_scene
+            elif event_scene_id is not None:
+                scene = self.get_scene(event_scene_id)
+            else:
+                scene = None
 
-            # get the scene_id for the connection
-            scene_id = read_connection_scene(cursor, connection_id=connection)
+        # update the database to reflect the active connection
+        if connection != self.active_connection:
+            set_active_connections(self.db_writer, connection)
+            self.active_connection = connection
 
-            # and check the associated scene info
-            temp_function, temp_color_list, temp_cycle_time, temp_dimmer = read_scene_info(cursor, scene_id)
+        # every level above default shows one scene on all zones
+        if scene is None:
+            return get_zone_scenes(self.zone_list, self.settings, self.get_scene)
 
-            # if the scene info has not changed from the last connection's scene info
-            if (temp_function, temp_color_list, temp_cycle_time, temp_dimmer) == (function, color_list, cycle_time,
-                                                                                  dimmer):
-                # wait for 100ms and loop again
-                time.sleep(0.1)
-                continue
+        return [scene] * len(self.zone_list)
 
-            # if the scene info has changed
-            else:
-                # update the database to reflect the active connection (+1 for sqlite 1-indexing)
-                set_active_connections(conn, cursor, connection + 1)
+    def update(self, source, trigger=None, edge_time=None, latency=None):
+        # hand the render thread any zone whose scene changed, and time the response to whatever woke us,
+        # edge_time is passed to latency (the input bus by default) with the first frame, returns True if anything changed
+        start = time.monotonic()
 
-                # get the new scene info
-                function, color_list, cycle_time, dimmer = temp_function, temp_color_list, temp_cycle_time, temp_dimmer
+        zone_scenes = self.choose_scenes()
+        changed = any(new is not old for new, old in zip(zone_scenes, self.zone_scenes))
+        if changed:
+            self.zone_scenes = zone_scenes
 
-                # stop the lighting thread
-                stop_flag.set()
-                lighting_thread.join()
-                stop_flag.clear()
+            # zones that kept their scene carry on
+            self.lighting.play_zones(zone_scenes, SCENE_FADE_TIME, latency or self.input_bus, edge_time)
 
-                # and restart the lighting thread with the new scene info
-                lighting_thread = threading.Thread(target=function, args=(pwm, color_list, cycle_time, dimmer))
-                lighting_thread.start()
+        end = time.monotonic()
+        metrics.LOOP_TIME.observe(end - start)
+        if trigger is not None:
+            metrics.WAKE_TIME.observe(max(0.0, end - trigger), source)
 
-                # wait for 100ms and loop again
-                time.sleep(0.1)
-                continue
+        return changed
 
-        # if no connections are currently active
-        else:
-            # check if connection was just running
-            if connection_was_running:
-                # set running to false
-                connection_was_running = False
-                # set all connections as off in table
-                set_active_connections(conn, cursor, connection_id=0)
-
-            # get system weekday
-            today = datetime.datetime.today()
-            weekday = today.weekday()
-
-            # check time table for up-to-date business hours
-            open_hour, open_minute, close_hour, close_minute = read_open_hours(cursor, weekday)
-
-            # check the current time
-            curr_date, curr_hour, curr_minute = check_time()
-
-            # manage all possible hour scenarios
-            if open_hour <= close_hour:
-                # normal hours like 9a-5p
-                is_open = (open_hour, open_minute) <= (curr_hour, curr_minute) < (close_hour, close_minute)
-            else:
-                # overnight hours like 10:30a-1a (wingstop case)
-                is_open = (curr_hour, curr_minute) >= (open_hour, open_minute) or (curr_hour, curr_minute) < (
-                    close_hour, close_minute)
-
-            # if the current time is within business hours
-            if is_open:
-                # set off as not running
-                lights_off = False
-
-                # check events table for up-to-date event dates
-                event_scenes, event_dates = read_events(cursor)
-
-                # check if current date is event date
-                try:
-                    event_index = event_dates.index(curr_date)
-                except ValueError:
-                    event_index = -1
-
-                # if current day is present on event table
-                if event_index != -1:
-                    # check the associated scene info
-                    temp_function, temp_color_list, temp_cycle_time, temp_dimmer = read_scene_info(cursor, scene_id=
-                    event_scenes[event_index])
-
-                    # if the scene info has not changed from the last scene's info
-                    if (temp_function, temp_color_list, temp_cycle_time, temp_dimmer) == (function, color_list,
-                                                                                          cycle_time, dimmer):
-                        # wait for 200ms and loop again
-                        time.sleep(0.2)
-                        continue
-
-                    # if the scene info has changed
-                    else:
-                        # get the new scene info
-                        function, color_list, cycle_time, dimmer = temp_function, temp_color_list, temp_cycle_time, temp_dimmer
-
-                        # stop the lighting thread
-                        stop_flag.set()
-                        lighting_thread.join()
-                        stop_flag.clear()
-
-                        # and restart the lighting thread with new scene info
-                        lighting_thread = threading.Thread(target=function, args=(pwm, color_list, cycle_time, dimmer))
-                        lighting_thread.start()
-
-                        # wait for 200ms and loop again
-                        time.sleep(0.2)
-                        continue
-
-                # if current day is not event day
-                else:
-                    # get default scene_id
-                    default_id = read_default_scene_id(cursor)
-
-                    # check the default scene info
-                    temp_function, temp_color_list, temp_cycle_time, temp_dimmer = read_scene_info(cursor, scene_id=default_id)
-
-                    # if the scene info has not changed from the last scene's info
-                    if (temp_function, temp_color_list, temp_cycle_time, temp_dimmer) == (function, color_list, cycle_time, dimmer) and default_id == read_default_scene_id(cursor):
-                        # wait for 200ms and loop again
-                        time.sleep(0.2)
-                        continue
-
-                    # if the scene info has changed
-                    else:
-                        # get the new scene info
-                        function, color_list, cycle_time, dimmer = temp_function, temp_color_list, temp_cycle_time, temp_dimmer
-
-                        # stop the lighting thread
-                        stop_flag.set()
-                        lighting_thread.join()
-                        stop_flag.clear()
-
-                        # and restart the lighting thread with new scene info
-                        lighting_thread = threading.Thread(target=function, args=(pwm, color_list, cycle_time, dimmer))
-                        lighting_thread.start()
-
-                        # wait for 200ms and loop again
-                        time.sleep(0.2)
-                        continue
-
-            # if the current time is not within business hours
-            else:
-                # check if current time has just left business hours
-                if not lights_off:
-                    # set lights as off
-                    lights_off = True
-
-                    # stop the lighting thread
-                    stop_flag.set()
-                    lighting_thread.join()
-                    stop_flag.clear()
-
-                    # set scene info for lights off
-                    function, color_list, cycle_time, dimmer = globals().get("sequence_solid"), [[0.0, 0.0, 0.0]], 1, 0
-
-                    # and restart the lighting thread with new info
-                    lighting_thread = threading.Thread(target=sequence_solid,
-                                                       args=(pwm, color_list, cycle_time, dimmer))
-                    lighting_thread.start()
-
-                    # wait for 200ms and loop again
-                    time.sleep(0.2)
-                    continue
-
-                # if off lighting has been running for at least one loop
-                else:
-                    # wait for 200ms and loop again
-                    time.sleep(0.2)
-                    continue
+
+# --------------------------- main -----------------------------
+
+def main():
+    # -------------- initialization and startup ----------------
+
+    # set from the GPIO and database watcher threads to wake the control tasks
+    input_wake = Wakeup()
+    config_wake = Wakeup()
+
+    if boot.FAST_BOOT:
+        # no startup blinks, the real scene is the first thing shown and the self-test reports afterwards
+        pwm, conn, cursor, input_bus = initialize_parallel(input_wake)
+
+    else:
+        # create pwm object for light control
+        pwm = initialize_pwm()
+
+        # indicate pwm object has been initialized
+        pwm_good(pwm)
+
+        # load sqlite database for program
+        conn, cursor = initialize_database()
+
+        # indicate database has been initialized
+        database_good(pwm)
+
+        # initialize input bus for hardware inputs
+        input_bus = initialize_input_bus(input_wake)
+
+        # indicate input bus has been initialized
+        input_bus_good(pwm)
+
+    # read the zone layout and set up every board it uses (layout changes need a restart)
+    zone_list = zones.read_zones(cursor)
+    pwms = initialize_boards(pwm, zone_list)
+
+    # initialize run LED (it starts blinking once the self-test has passed)
+    run_LED = initialize_run_LED()
+
+    # controller writes go to lighting.db from a background thread, batched and only when something changed
+    db_writer = writer.DatabaseWriter(DATABASE_PATH)
+
+    # watch lighting.db so configuration is only re-read after the PHP side writes something
+    watcher = config.ConfigWatcher(conn, DATABASE_PATH)
+    watcher.changed()
+
+    # wake the config task on database writes
+    watcher.notify(config_wake)
+
+    # compiled scenes, filled when the control core reads the settings
+    scene_cache = scenes.SceneCache()
+
+    # start the render thread (it lives as long as the program), recording every frame if FRAME_RECORDING is set
+    lighting = renderer.Renderer(pwms, zone_list, recorder.open_recorder())
+
+    # report the cold start and the self-test once the first frame is out
+    boot.start_report(lighting, pwms, DATABASE_PATH, input_bus, run_LED)
+
+    # serve frame rate, loop time, query time and I2C errors on the local metrics endpoint
+    try:
+        metrics.serve()
+    except OSError as e:
+        # lighting matters more than metrics
+        print(f"Metrics endpoint unavailable: {e}")
+
+    # systemctl stop unwinds run() so the preview socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # run the lighting hierarchy until the program is stopped
+    core = ControlCore(cursor, db_writer, watcher, scene_cache, input_bus, lighting, zone_list, input_wake, config_wake)
+    asyncio.run(core.run())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+import os
+import numpy
+import waveforms
+import collections
+
+# all envelope based behaviors use a 10ms step time
+STEP_TIME = 0.01
+
+# gamma between color/envelope levels and PWM duty cycle (1.0 keeps the linear response every site is set up for,
+# anything else also changes what each brightness setting and mixed color looks like)
+GAMMA = float(os.environ.get("LIGHTING_GAMMA", "1.0"))
+
+# crossfade increments for each cycle_time
+CROSSFADE_INCREMENTS = {
+    1: 10,
+    2: 20,
+    3: 30,
+    4: 40,
+    5: 50
+}
+
+# curve tables for every cycle_time, generated by scripts/build_*_lookup.py and memory-mapped once per process
+FADE_TABLE = waveforms.load_table("fade")
+DECAY_TABLE = waveforms.load_table("decay")
+BREATHE_TABLE = waveforms.load_table("breathe")
+
+# lookup table for wigwag
+WIGWAG = numpy.array([0x0, 0x0, 0xffff, 0xffff, 0x0, 0xffff, 0xffff, 0x0, 0xffff, 0xffff], dtype=numpy.uint16)
+
+# lookup table for sos (... --- ...)
+SOS = numpy.array([0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff,
+                   0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff,
+                   0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff,
+                   0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff,
+                   0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0xffff,
+                   0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0,
+                   0xffff, 0xffff, 0xffff, 0xffff, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0], dtype=numpy.uint16)
+
+
+# ------------------------ color tables -------------------------
+
+def gamma_table(gamma):
+    # 16-bit level -> 16-bit duty cycle, built once
+    x = numpy.arange(0x10000, dtype=numpy.float64) / 0xffff
+    return numpy.round(0xffff * x ** gamma).astype(numpy.uint16)
+
+
+GAMMA_TABLE = gamma_table(GAMMA)
+
+
+def color_levels(color_list):
+    # 8-bit colors to 16-bit levels (0xff -> 0xffff) as (colors x channels)
+    return numpy.asarray(color_list, dtype=numpy.int64) * 0x101
+
+
+def brightness_table(levels, dimmer):
+    # every level of the scene scaled down by the dimmer, once per scene
+    return (numpy.asarray(levels, dtype=numpy.int64) * (0xffff - dimmer)) // 0xffff
+
+
+# ---------------------- envelope functions ----------------------
+
+def solid_envelope(cycle_time):
+    # one full intensity step per color
+    return numpy.array([0xffff], dtype=numpy.uint16)
+
+
+def fade_envelope(cycle_time):
+    # one sine period from off to full and back over the cycle
+    return FADE_TABLE[cycle_time]
+
+
+def decay_envelope(cycle_time):
+    # fast linear rise over the first 20% then linear decay
+    return DECAY_TABLE[cycle_time]
+
+
+def breathe_envelope(cycle_time):
+    # three shallow sine periods that never fully turn off
+    return BREATHE_TABLE[cycle_time]
+
+
+def wigwag_envelope(cycle_time):
+    return WIGWAG
+
+
+def sos_envelope(cycle_time):
+    return SOS
+
+
+# ----------------------- render functions -----------------------
+
+def render_envelope(color_list, envelope, dimmer):
+    # scale the envelope by the dimmer
+    level = brightness_table(envelope, dimmer)
+
+    # multiply every color by every level in one pass -> (colors x steps x channels), then gamma correct
+    levels = (color_levels(color_list)[:, None, :] * level[None, :, None]) // 0xffff
+
+    return numpy.ascontiguousarray(GAMMA_TABLE[levels])
+
+
+def render_crossfade(color_list, inc, dimmer, hold=False):
+    colors = color_levels(color_list)
+
+    # every color fades into the next one, and the last color fades back into the first
+    current_colors = colors
+    next_colors = numpy.roll(colors, -1, axis=0)
+    color_difference = next_colors - current_colors
+
+    # progressive difference from the next color for steps 1..inc
+    i = numpy.arange(1, inc + 1, dtype=numpy.int64)
+    base = current_colors[:, None, :]
+    levels = base + (color_difference[:, None, :] * i[None, :, None]) // inc
+
+    # crossfade_hold shows the current color first and holds it
+    if hold:
+        levels = numpy.concatenate((base, levels), axis=1)
+
+    # scale by the dimmer, then gamma correct
+    return numpy.ascontiguousarray(GAMMA_TABLE[brightness_table(levels, dimmer)])
+
+
+def pack_frames(frames, address):
+    # convert duty cycles to PCA9685 ON/OFF register words (see backend.encode_duty_cycle)
+    on = numpy.where(frames == 0xffff, 0x1000, 0).astype('<u2')
+    off = numpy.where(frames == 0xffff, 0, numpy.where(frames < 0x0010, 0x1000, frames >> 4)).astype('<u2')
+
+    # interleave as ON_L, ON_H, OFF_L, OFF_H for every channel
+    words = numpy.stack((on, off), axis=-1)
+    data = words.view(numpy.uint8).reshape(frames.shape[:-1] + (4 * frames.shape[-1],))
+
+    # prepend the register pointer so every frame is a ready to send transaction
+    pointer = numpy.full(frames.shape[:-1] + (1,), address, dtype=numpy.uint8)
+
+    return numpy.ascontiguousarray(numpy.concatenate((pointer, data), axis=-1))
+
+
+# --------------------- behavior registry ----------------------
+
+# a behavior renders a scene's frames and gives the hold time of each step
+Behavior = collections.namedtuple("Behavior", ["render", "timing"])
+
+# behavior name (as stored in the scenes table) -> Behavior
+BEHAVIORS = {}
+
+
+def register_behavior(name, render, timing):
+    # render(color_list, cycle_time, dimmer) -> frames, timing(cycle_time) -> step durations
+    BEHAVIORS[name] = Behavior(render, timing)
+
+
+def register_envelope(name, envelope, step_time):
+    # behaviors that scale every color by one envelope, step_time(cycle_time) -> seconds per step
+    def render(color_list, cycle_time, dimmer):
+        return render_envelope(color_list, envelope(cycle_time), dimmer)
+
+    def timing(cycle_time):
+        return [step_time(cycle_time)] * len(envelope(cycle_time))
+
+    register_behavior(name, render, timing)
+
+
+def register_crossfade(name, step_time, hold=False):
+    # behaviors that fade each color into the next over CROSSFADE_INCREMENTS steps
+    def render(color_list, cycle_time, dimmer):
+        return render_crossfade(color_list, CROSSFADE_INCREMENTS[cycle_time], dimmer, hold=hold)
+
+    def timing(cycle_time):
+        inc = CROSSFADE_INCREMENTS[cycle_time]
+        if hold:
+            return [(2 * step_time * inc) / 5] + [step_time] * inc
+        return [step_time] * inc
+
+    register_behavior(name, render, timing)
+
+
+def get_behavior(name):
+    # fail fast on names that were never registered
+    behavior = BEHAVIORS.get(name)
+    if behavior is None:
+        raise ValueError(f"unknown behavior: {name}")
+
+    return behavior
+
+
+def compile_scene(name, color_list, cycle_time, dimmer):
+    behavior = get_behavior(name)
+
+    return behavior.render(color_list, cycle_time, dimmer), behavior.timing(cycle_time)
+
+
+register_envelope("sequence_solid", solid_envelope, lambda cycle_time: cycle_time)
+register_envelope("sequence_fade", fade_envelope, lambda cycle_time: STEP_TIME)
+register_envelope("sequence_decay", decay_envelope, lambda cycle_time: STEP_TIME)
+register_envelope("sequence_wigwag", wigwag_envelope, lambda cycle_time: cycle_time / 10)
+register_envelope("sequence_sos", sos_envelope, lambda cycle_time: cycle_time / 100)
+register_envelope("sequence_breathe", breathe_envelope, lambda cycle_time: STEP_TIME)
+register_crossfade("crossfade", step_time=0.025)
+register_crossfade("crossfade_hold", step_time=0.015, hold=True)
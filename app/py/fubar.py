@@ -1,19 +1,128 @@
 import os
 import time
 import sqlite3
-import gpiozero
 import threading
+import subprocess
+
+# lighting database and the factory settings it is reset from
+DATABASE_PATH = os.environ.get("LIGHTING_DB", '/home/user/project/database/lighting.db')
+FACTORY_PATH = os.environ.get("FACTORY_DB", os.path.join(os.path.dirname(DATABASE_PATH), "factory_settings.db"))
+
+# reset lighting.db in one write transaction and reload the controller in place (0 for the old reset and restarts)
+FAST_RESET = os.environ.get("FAST_RESET", "1") != "0"
+
+# tables a reset restores from factory_settings.db, and the sqlite_sequence value each starts over from
+RESET_TABLES = {
+    "scenes": 11,
+    "connections": None,
+    "events": 2,
+    "time": None,
+}
+
+# tables a reset empties without restoring anything (no account survives a reset)
+CLEAR_TABLES = {
+    "users": 0,
+}
+
+# time.monotonic() the last fast reset started, for the controller to log against its first frame after the reload
+RESET_STAMP = os.environ.get("RESET_STAMP", os.path.join(os.path.dirname(DATABASE_PATH), "reset.stamp"))
+
+# services that re-read lighting.db on systemctl reload, and services that have to be restarted
+RELOAD_SERVICES = ["controller.service"]
+RESTART_SERVICES = ["apache2"]
+
+
+def restore_factory_settings():
+    # copy the factory tables over lighting.db in one write transaction, with the write lock taken before anything
+    # is read, so a write from the controller or the web application can't land halfway and be lost
+    conn = sqlite3.connect(DATABASE_PATH, isolation_level=None)
+
+    try:
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("ATTACH DATABASE ? AS factory", (FACTORY_PATH,))
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table, sequence in RESET_TABLES.items():
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(f"INSERT INTO {table} SELECT * FROM factory.{table}")
+                if sequence is not None:
+                    conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (sequence, table))
+            for table, sequence in CLEAR_TABLES.items():
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (sequence, table))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+    print(f"{', '.join([*RESET_TABLES, *CLEAR_TABLES])} tables reset")
+
+
+def write_reset_stamp(start):
+    # CLOCK_MONOTONIC is the same clock in every process, so the controller can measure from start directly
+    try:
+        with open(RESET_STAMP, "w") as f:
+            f.write(repr(start))
+    except OSError as e:
+        print(f"Reset start not passed to the controller: {e}")
+
+
+def restart_services():
+    # every reload and restart at once, returns when all of them have finished
+    commands = ([["systemctl", "reload", service] for service in RELOAD_SERVICES]
+                + [["systemctl", "restart", service] for service in RESTART_SERVICES])
+    processes = [subprocess.Popen(command) for command in commands]
+
+    for command, process in zip(commands, processes):
+        if process.wait() == 0:
+            print(f"{command[2]} {command[1]}ed")
+        else:
+            print(f"{' '.join(command)} failed")
+
+
+def fast_reset(reset_LED):
+    # the controller keeps running, so the lights only change scene and never go out
+    # (it logs the time from the start of the reset to the first frame with the factory settings itself)
+    start = time.monotonic()
+    print("Database reset started:")
+
+    while True:
+        try:
+            restore_factory_settings()
+            break
+        except sqlite3.Error as e:
+            print("Reset unsuccessful.")
+            print(e)
+            time.sleep(2)
+
+    restored = time.monotonic()
+    print("\nDatabase reset completed.")
+
+    write_reset_stamp(start)
+    restart_services()
+    print(f"Database reset and service commands finished in {time.monotonic() - start:.2f} s "
+          f"(database {restored - start:.3f} s, services {time.monotonic() - restored:.2f} s)")
+
+    # turn off reset LED
+    reset_LED.on()
 
 
 def reset_database_and_services(reset_LED):
     # turn on reset_LED to indicate process has started
     reset_LED.blink(on_time=0.5, off_time=0.5)
 
+    if FAST_RESET:
+        fast_reset(reset_LED)
+        return
+
     while True:
         # reset all tables in lighting.db
         try:
             # connect to lighting.db
-            conn = sqlite3.connect('/home/user/project/database/lighting.db')
+            conn = sqlite3.connect(DATABASE_PATH)
             cursor = conn.cursor()
             
             # set database busy timeout
@@ -24,7 +133,7 @@ def reset_database_and_services(reset_LED):
             print("Database reset started:")
 
             # connect factory_settings.db
-            cursor.execute("ATTACH DATABASE '/home/user/project/database/factory_settings.db' AS factory")
+            cursor.execute("ATTACH DATABASE ? AS factory", (FACTORY_PATH,))
 
             # reset scenes and connections table
             cursor.execute("DELETE FROM scenes")
@@ -71,13 +180,9 @@ def reset_database_and_services(reset_LED):
     os.system("systemctl restart controller.service")
     print("Lighting control service restarted.")
 
-    # restart clock sync service
-    os.system("systemctl restart sync_clocks.service")
-    print("Clock sync service restarted.")
-
-    # restart rtc control service
-    os.system("systemctl restart set_rtc.service")
-    print("RTC control service restarted.")
+    # restart clock service
+    os.system("systemctl restart clocks.service")
+    print("Clock service restarted.")
 
     # restart apache
     os.system("systemctl restart apache2")
@@ -91,6 +196,9 @@ def reset_database_and_services(reset_LED):
 
 
 def main():
+    # only imported on the board, so the reset itself can run anywhere
+    import gpiozero
+
     # STAT1 on board using GPIO23 (board pin 16)
     reset_LED = gpiozero.LED(23)
 
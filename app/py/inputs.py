@@ -0,0 +1,47 @@
+import os
+import time
+import backend
+import metrics
+
+# GPIO input pins for connections 1-8
+INPUT_PINS = [22, 10, 9, 11, 5, 6, 13, 26]
+
+# debounce for connection inputs in seconds
+INPUT_BOUNCE_TIME = float(os.environ.get("INPUT_BOUNCE_TIME", "0.005"))
+
+
+class InputBus:
+    # connection inputs that wake the controller from their edge callbacks instead of being polled
+
+    def __init__(self, wake, pins=INPUT_PINS, bounce_time=INPUT_BOUNCE_TIME):
+        # set whenever any input changes state
+        self.wake = wake
+
+        # time.monotonic() of the newest edge that the controller hasn't acted on yet
+        self.edge_time = None
+
+        # initialize input pins as DigitalInputDevice objects on the configured backend
+        self.inputs = [backend.create_input(pin, bounce_time=bounce_time) for pin in pins]
+        for device in self.inputs:
+            device.when_activated = self.edge
+            device.when_deactivated = self.edge
+
+    def edge(self):
+        # runs on the GPIO callback thread
+        self.edge_time = time.monotonic()
+        self.wake.set()
+
+    def take_edge(self):
+        # hand the pending edge to the controller so the next scene start can be measured against it
+        edge_time = self.edge_time
+        self.edge_time = None
+
+        return edge_time
+
+    def states(self):
+        # gather states from inputs
+        return [device.value for device in self.inputs]
+
+    def record_first_frame(self, edge_time):
+        # called by the render thread once the scene an edge started is on the outputs
+        metrics.INPUT_LATENCY.observe(time.monotonic() - edge_time)
@@ -0,0 +1,285 @@
+import os
+import time
+import bisect
+import sqlite3
+import scheduler
+import threading
+import socketserver
+import http.server
+
+# where /metrics is served: "host:port" for HTTP, an absolute path for a Unix socket, empty to turn it off
+METRICS_ADDRESS = os.environ.get("METRICS_ADDRESS", "127.0.0.1:9685")
+
+# histogram buckets in seconds
+LOOP_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25, 1.0, 5.0)
+SWITCH_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 1.0)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    # a monotonically increasing count, one per combination of label values
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+
+        # the render, writer and control threads all update metrics, and the server thread reads them
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self.lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge:
+    # a value that can go up and down, one per combination of label values
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        with self.lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    # bucketed observations, one set of buckets per combination of label values
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labelnames = labelnames
+
+        # label values -> [bucket counts (last one is +Inf), count, sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+
+            series[0][bucket] += 1
+            series[1] += 1
+            series[2] += value
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+
+        # copy every series so a scrape never sees the buckets, count and sum of different observations
+        with self.lock:
+            values = [(labels, list(counts), count, total) for labels, (counts, count, total) in self.values.items()]
+        for labels, counts, count, total in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(self.labelnames + ("le",), labels + (bound,))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_count{format_labels(self.labelnames, labels)} {count}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, labels)} {total}"
+
+
+# ------------------------- metrics ---------------------------
+
+LOOP_TIME = Histogram("lighting_loop_seconds", "Time spent deciding and starting scenes after one wakeup.", LOOP_BUCKETS)
+
+QUERY_TIME = Histogram("lighting_sqlite_query_seconds", "Time spent executing one SQLite statement.",
+                       QUERY_BUCKETS, ("statement",))
+
+SCENE_SWITCHES = Counter("lighting_scene_switches_total", "Scene changes handed to the render thread.")
+
+WAKE_TIME = Histogram("lighting_wake_seconds", "Time from an input edge, database write, schedule transition, test mode preview or "
+                      "timeout to the control loop having acted on it.", SWITCH_BUCKETS, ("source",))
+
+SCENE_SWITCH_TIME = Histogram("lighting_scene_switch_seconds", "Time from a scene change to its first frame written.",
+                              SWITCH_BUCKETS)
+
+INPUT_LATENCY = Histogram("lighting_input_latency_seconds", "Time from a connection input edge to the first frame of "
+                          "the scene it started.", SWITCH_BUCKETS)
+
+I2C_FAILURES = Counter("lighting_i2c_write_failures_total", "Frame writes that failed on the I2C bus.", ("board",))
+
+COLD_START = Gauge("lighting_cold_start_seconds", "Time from process start to the first frame written.")
+
+SELF_TEST = Gauge("lighting_self_test_ok", "Startup self-test result (1 passed, 0 failed).", ("check",))
+
+# every metric above, in the order they are served
+REGISTRY = [LOOP_TIME, WAKE_TIME, QUERY_TIME, SCENE_SWITCHES, SCENE_SWITCH_TIME, INPUT_LATENCY, I2C_FAILURES, COLD_START,
+            SELF_TEST]
+
+
+class FrameRate:
+    # achieved frames per second between two scrapes, from the renderer's existing bus counters
+
+    def __init__(self):
+        self.last_time = time.monotonic()
+        self.last_frames = scheduler.BUS_STATS.frames
+
+    def lines(self):
+        now = time.monotonic()
+        frames = scheduler.BUS_STATS.frames
+        rate = (frames - self.last_frames) / (now - self.last_time) if frames >= self.last_frames else 0.0
+        self.last_time, self.last_frames = now, frames
+
+        yield "# HELP lighting_frame_rate Frames written per second since the last scrape."
+        yield "# TYPE lighting_frame_rate gauge"
+        yield f"lighting_frame_rate {rate}"
+
+
+def scheduler_lines():
+    # frame and bus counters the render thread keeps anyway, read at scrape time so playback pays nothing extra
+    bus = scheduler.bus_summary()
+    yield "# HELP lighting_frames_total Frames written to the boards."
+    yield "# TYPE lighting_frames_total counter"
+    yield f"lighting_frames_total {bus['frames']}"
+    yield "# HELP lighting_bus_seconds_per_frame Mean modeled I2C bus time per frame."
+    yield "# TYPE lighting_bus_seconds_per_frame gauge"
+    yield f"lighting_bus_seconds_per_frame {bus['mean_bus_time']}"
+
+    stats = scheduler.stats_summary()
+    for key, kind, documentation in (
+            ("frames", "counter", "Frames emitted per behavior."),
+            ("missed", "counter", "Frames skipped because their slot had passed."),
+            ("resyncs", "counter", "Timeline restarts after falling more than a second behind."),
+            ("mean_lateness", "gauge", "Mean time frames were written after their deadline."),
+            ("jitter", "gauge", "Standard deviation of frame lateness.")):
+        name = f"lighting_behavior_{key}_total" if kind == "counter" else f"lighting_behavior_{key}_seconds"
+        yield f"# HELP {name} {documentation}"
+        yield f"# TYPE {name} {kind}"
+        for behavior, summary in stats.items():
+            yield f'{name}{{behavior="{behavior}"}} {summary[key]}'
+
+
+# functions returning exposition lines built at scrape time
+COLLECTORS = [FrameRate().lines, scheduler_lines]
+
+
+def exposition():
+    # every metric in the Prometheus text format
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.lines())
+    for collector in COLLECTORS:
+        lines.extend(collector())
+
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------- sqlite ----------------------------
+
+def statement_label(sql):
+    # "SELECT scenes", "UPDATE testmode", "PRAGMA" (a handful of values, never the parameters)
+    words = sql.replace(";", " ").split()
+    if not words:
+        return "other"
+
+    keywords = [word.upper() for word in words]
+    for keyword in ("FROM", "INTO", "UPDATE"):
+        if keyword in keywords[:-1]:
+            return f"{keywords[0]} {words[keywords.index(keyword) + 1]}"
+
+    return keywords[0]
+
+
+class TimedCursor(sqlite3.Cursor):
+    # times every statement into QUERY_TIME
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            QUERY_TIME.observe(time.perf_counter() - start, statement_label(sql))
+
+
+class TimedConnection(sqlite3.Connection):
+    # sqlite3.connect(path, factory=TimedConnection) so every cursor is timed
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+
+# -------------------------- server ----------------------------
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrapes would fill the journal
+        return
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def serve(address=METRICS_ADDRESS):
+    # serve /metrics from a daemon thread, returns the server (None if turned off)
+    if not address:
+        return None
+
+    if address.startswith("/"):
+        if os.path.exists(address):
+            os.unlink(address)
+        server = UnixHTTPServer(address, MetricsHandler)
+    else:
+        host, port = address.rsplit(":", 1)
+        server = http.server.ThreadingHTTPServer((host, int(port)), MetricsHandler)
+        server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
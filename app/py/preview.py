@@ -0,0 +1,91 @@
+import os
+import grp
+import json
+import time
+import frames
+import asyncio
+
+# longest a client may take to send its line
+PREVIEW_READ_TIMEOUT = 1.0
+
+# largest accepted message in bytes
+PREVIEW_MAX_SIZE = 4096
+
+# group the web application runs as, only the controller's user and this group can connect
+PREVIEW_GROUP = os.environ.get("PREVIEW_GROUP", "www-data")
+
+
+def parse_preview(line):
+    # {"behavior": "sequence_fade", "brightness": 0-5, "speed": 1-5, "colors": [color_id or null, ...]}
+    # -> a testmode row (behavior, brightness, speed, color0 ... color9)
+    try:
+        message = json.loads(line)
+    except ValueError:
+        raise ValueError("preview is not valid JSON")
+    if not isinstance(message, dict):
+        raise ValueError("preview must be a JSON object")
+
+    behavior = message.get("behavior")
+    frames.get_behavior(behavior)
+
+    brightness = message.get("brightness")
+    speed = message.get("speed")
+    if type(brightness) is not int or not 0 <= brightness <= 5:
+        raise ValueError(f"invalid brightness: {brightness}")
+    if type(speed) is not int or not 1 <= speed <= 5:
+        raise ValueError(f"invalid speed: {speed}")
+
+    colors = message.get("colors")
+    if not isinstance(colors, list) or len(colors) > 10:
+        raise ValueError("colors must be a list of up to 10 color ids")
+    if any(color is not None and type(color) is not int for color in colors):
+        raise ValueError("color ids must be integers or null")
+    if all(color is None for color in colors):
+        raise ValueError("preview needs at least one color")
+
+    return (behavior, brightness, speed, *colors, *[None] * (10 - len(colors)))
+
+
+async def serve(path, apply, group=PREVIEW_GROUP):
+    # accept one JSON line per connection and reply "ok" or "error <reason>",
+    # apply(row, received_time) runs on the control loop and raises ValueError for scenes it can't build
+    async def handle(reader, writer):
+        try:
+            line = await asyncio.wait_for(reader.readline(), PREVIEW_READ_TIMEOUT)
+            received = time.monotonic()
+            apply(parse_preview(line), received)
+            reply = "ok"
+        except ValueError as e:
+            reply = f"error {e}"
+        except (asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+
+        try:
+            writer.write(reply.encode() + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(handle, path, limit=PREVIEW_MAX_SIZE)
+
+    # PHP runs as www-data, so the socket belongs to that group and other users on the box can't connect
+    try:
+        os.chown(path, -1, grp.getgrnam(group).gr_gid)
+    except (KeyError, OSError) as e:
+        print(f"Preview socket left in the controller's group, {group} unavailable: {e}")
+    os.chmod(path, 0o660)
+
+    return server
+
+
+def close(server, path):
+    # stop taking previews and remove the socket, so PHP falls back to the testmode row instead of a dead socket
+    server.close()
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,141 @@
+import os
+import mmap
+import time
+import struct
+import frames
+import backend
+import collections
+
+# ring file every written frame is appended to (empty turns recording off)
+RECORDING_PATH = os.environ.get("FRAME_RECORDING", "")
+
+# size of the ring in MiB, the oldest frames are overwritten once it is full
+RECORDING_SIZE = float(os.environ.get("FRAME_RECORDING_SIZE", "32"))
+
+# bump when the layout below changes, a ring in an older layout is started over
+RECORDING_VERSION = 1
+
+# file header: magic, version, record size, capacity (records), records written so far (never wraps)
+HEADER = struct.Struct("<4sHHIQ")
+MAGIC = b"PWMR"
+
+# behavior names follow the header so every record can store a one byte behavior index
+NAMES_OFFSET = 32
+
+# records start on the second page
+HEADER_SIZE = 4096
+
+# one board burst: time.monotonic(), time.time(), board address, first channel, channel count, zone count,
+# scene_id of every zone on the board (-1 for none), behavior index of every zone, duty cycle of every channel
+MAX_ZONES = backend.NUM_CHANNELS // 3
+RECORD = struct.Struct(f"<ddBBBB{MAX_ZONES}h{MAX_ZONES}B{backend.NUM_CHANNELS}H")
+
+# behavior index for a zone that isn't playing anything
+NO_BEHAVIOR = 0xff
+
+# every behavior a record can name, the crossfade between scenes included
+BEHAVIOR_NAMES = list(frames.BEHAVIORS) + ["scene_crossfade"]
+
+# one decoded record
+Record = collections.namedtuple("Record", ["time", "wall_time", "board", "first_channel", "scene_ids", "behaviors",
+                                           "duty_cycles"])
+
+
+def burst_duty_cycles(burst):
+    # duty cycles of every channel in a register burst (pointer byte then ON_L, ON_H, OFF_L, OFF_H per channel)
+    words = struct.unpack_from(f"<{(len(burst) - 1) // 2}H", burst, 1)
+
+    return [backend.decode_duty_cycle(on, off) for on, off in zip(words[::2], words[1::2])]
+
+
+class Recorder:
+    # fixed-size memory-mapped ring of every burst written to the boards (the page cache absorbs the writes)
+
+    def __init__(self, path, size=RECORDING_SIZE):
+        self.path = path
+        capacity = max(1, int(size * 1024 * 1024 - HEADER_SIZE) // RECORD.size)
+        names = "\0".join(BEHAVIOR_NAMES).encode()
+        if NAMES_OFFSET + len(names) > HEADER_SIZE:
+            raise ValueError("too many behaviors for the recording header")
+
+        # a ring with the same layout carries on where it left off, anything else starts over
+        file_size = HEADER_SIZE + capacity * RECORD.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            header = os.pread(fd, HEADER_SIZE, 0)
+            fresh = True
+            if len(header) == HEADER_SIZE:
+                layout = HEADER.unpack_from(header)[:4]
+                fresh = (layout != (MAGIC, RECORDING_VERSION, RECORD.size, capacity)
+                         or header[NAMES_OFFSET:NAMES_OFFSET + len(names) + 1] != names + b"\0")
+            if fresh:
+                os.ftruncate(fd, 0)
+            os.ftruncate(fd, file_size)
+            self.map = mmap.mmap(fd, file_size)
+        finally:
+            os.close(fd)
+
+        self.capacity = capacity
+        if fresh:
+            HEADER.pack_into(self.map, 0, MAGIC, RECORDING_VERSION, RECORD.size, capacity, 0)
+            self.map[NAMES_OFFSET:NAMES_OFFSET + len(names)] = names
+        self.count = HEADER.unpack_from(self.map)[4]
+
+        self.behavior_index = {name: i for i, name in enumerate(BEHAVIOR_NAMES)}
+
+    def record(self, board, burst, first_channel, zone_scenes):
+        # append one written burst, zone_scenes is (scene_id, behavior) for every zone on the board
+        duty_cycles = burst_duty_cycles(burst)
+        scene_ids = [-1] * MAX_ZONES
+        behaviors = [NO_BEHAVIOR] * MAX_ZONES
+        for i, (scene_id, behavior) in enumerate(zone_scenes[:MAX_ZONES]):
+            scene_ids[i] = -1 if scene_id is None else scene_id
+            behaviors[i] = self.behavior_index.get(behavior, NO_BEHAVIOR)
+
+        channels = duty_cycles + [0] * (backend.NUM_CHANNELS - len(duty_cycles))
+        offset = HEADER_SIZE + (self.count % self.capacity) * RECORD.size
+        RECORD.pack_into(self.map, offset, time.monotonic(), time.time(), board, first_channel, len(duty_cycles),
+                         len(zone_scenes), *scene_ids, *behaviors, *channels)
+
+        # the count goes last so a reader never sees a half written record as the newest one
+        self.count += 1
+        struct.pack_into("<Q", self.map, HEADER.size - 8, self.count)
+
+
+def open_recorder(path=RECORDING_PATH, size=RECORDING_SIZE):
+    # the recorder, or None if recording is off or the ring can't be created (lighting matters more)
+    if not path:
+        return None
+
+    try:
+        return Recorder(path, size)
+    except (OSError, ValueError) as e:
+        print(f"Frame recording unavailable: {e}")
+        return None
+
+
+def read_recording(path):
+    # every record in the ring from oldest to newest
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"{path}: not a frame recording")
+    magic, version, record_size, capacity, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a frame recording")
+    if version != RECORDING_VERSION or record_size != RECORD.size:
+        raise ValueError(f"{path}: recording version {version}, expected {RECORDING_VERSION}")
+
+    names = data[NAMES_OFFSET:HEADER_SIZE].split(b"\0\0", 1)[0].decode().split("\0")
+
+    records = []
+    for index in range(max(0, count - capacity), count):
+        fields = RECORD.unpack_from(data, HEADER_SIZE + (index % capacity) * RECORD.size)
+        mono, wall, board, first, channels, zone_count = fields[:6]
+        scene_ids = [None if s < 0 else s for s in fields[6:6 + MAX_ZONES][:zone_count]]
+        behaviors = [names[b] if b < len(names) else None for b in fields[6 + MAX_ZONES:6 + 2 * MAX_ZONES][:zone_count]]
+        duty_cycles = list(fields[6 + 2 * MAX_ZONES:][:channels])
+        records.append(Record(mono, wall, board, first, scene_ids, behaviors, duty_cycles))
+
+    return records
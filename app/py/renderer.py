@@ -0,0 +1,365 @@
+import math
+import time
+import queue
+import numpy
+import zones
+import frames
+import struct
+import backend
+import metrics
+import threading
+import scheduler
+import collections
+
+# every zone is composed on this frame tick, so each board gets at most one burst per tick
+FRAME_TICK = frames.STEP_TIME
+
+# scenes for every zone handed to the render thread at time.monotonic() time (scenes None stops the thread)
+Command = collections.namedtuple("Command", ["scenes", "fade", "input_bus", "edge_time", "time"])
+
+
+class Crossfade:
+    # a linear blend from a zone's current outputs to a scene's first frame, played once like a scene
+
+    behavior = "scene_crossfade"
+
+    def __init__(self, start, scene, fade):
+        steps = max(1, int(round(fade / frames.STEP_TIME)))
+        i = numpy.arange(1, steps + 1, dtype=numpy.int64)[:, None]
+
+        start = start.astype(numpy.int64)
+        target = scene.scene_frames[0][0].astype(numpy.int64)
+        blend = (start + ((target - start) * i) // steps).astype(numpy.uint16)
+
+        # same layout as a compiled scene with a single color
+        self.scene_frames = blend[None]
+        self.durations = [frames.STEP_TIME] * steps
+        self.transactions = [[row.tobytes() for row in frames.pack_frames(blend, backend.LED0_ON_L)]]
+
+
+class ZonePlayer:
+    # one zone's position in the timeline of the scene it is playing
+
+    def __init__(self, scene, start, then=None):
+        self.scene = scene
+
+        # scene to switch to once this one has played through once (only used for crossfades)
+        self.then = then
+        self.finished = False
+
+        # pace frames against absolute deadlines so write time never adds up as drift
+        self.deadline = scheduler.Deadline(scheduler.get_stats(scene.behavior), start)
+        self.color = 0
+        self.step = 0
+
+        # (color, step) of the frame on the outputs now
+        self.shown = None
+
+        # time.monotonic() the next frame is due (a single frame never changes, so it is only due once)
+        self.static = then is None and len(scene.transactions) == 1 and len(scene.durations) == 1
+        self.next_time = self.deadline.deadline
+
+    @property
+    def target(self):
+        # the scene this zone ends up on
+        return self.scene if self.then is None else self.then
+
+    def update(self):
+        # returns the (transaction, frame) due now, skipping frames whose slot has already passed
+        scene = self.scene
+        due = None
+
+        while due is None and not self.finished:
+            duration = scene.durations[self.step]
+            if self.deadline.due(duration):
+                due = scene.transactions[self.color][self.step], scene.scene_frames[self.color][self.step]
+                self.shown = self.color, self.step
+            self.deadline.advance(duration)
+
+            # move to the next step, and to the next color at the end of each color's steps
+            self.step += 1
+            if self.step == len(scene.durations):
+                self.step = 0
+                self.color = (self.color + 1) % len(scene.transactions)
+
+                # a crossfade only plays once
+                if self.then is not None and self.color == 0:
+                    self.finished = True
+
+        self.next_time = math.inf if self.static else self.deadline.deadline
+
+        return due
+
+    def swap(self, scene):
+        # carry on with a re-dimmed or re-timed version of the scene from the same point in its cycle,
+        # returns the (transaction, frame) that replaces the one on the outputs now (None if nothing is shown yet)
+        if self.then is not None:
+            # still crossfading, land on the new version instead
+            self.then = scene
+            return None
+
+        old = self.scene
+        self.scene = scene
+        self.static = len(scene.transactions) == 1 and len(scene.durations) == 1
+        if self.shown is None:
+            return None
+
+        color, step = self.shown
+        if scene.durations != old.durations:
+            # new speed: keep the fraction of the color's cycle that has played, in time rather than steps
+            now = time.monotonic()
+            slot_start = self.deadline.deadline - old.durations[step]
+            elapsed = sum(old.durations[:step]) + min(max(0.0, now - slot_start), old.durations[step])
+            position = elapsed * sum(scene.durations) / sum(old.durations)
+
+            # find the new step that covers that position and the time left in it
+            end = 0.0
+            for step, duration in enumerate(scene.durations):
+                end += duration
+                if end > position:
+                    break
+            self.deadline.deadline = now + (end - position)
+
+            self.shown = color, step
+            self.step = step + 1
+            self.color = color
+            if self.step == len(scene.durations):
+                self.step = 0
+                self.color = (color + 1) % len(scene.transactions)
+
+        self.next_time = math.inf if self.static else self.deadline.deadline
+
+        return scene.transactions[color][step], scene.scene_frames[color][step]
+
+
+class Board:
+    # one PCA9685 and the burst that sets every zone channel on it in one transaction
+
+    def __init__(self, pwm, channels, zone_indices):
+        self.pwm = pwm
+
+        # indices of the zones on this board (for the frame recording)
+        self.zones = zone_indices
+
+        # cover every zone on the board from the lowest to the highest channel used
+        self.first = min(channels)
+        last = max(channels) + zones.ZONE_CHANNELS
+        self.burst = bytearray(1 + 4 * (last - self.first))
+        self.burst[0] = backend.LED0_ON_L + 4 * self.first
+
+        # channels in gaps between zones stay off
+        for i in range(last - self.first):
+            struct.pack_into("<HH", self.burst, 1 + 4 * i, *backend.encode_duty_cycle(0))
+
+        # set when a zone on this board has a new frame that hasn't been written yet
+        self.dirty = False
+
+    def set(self, channel, transaction):
+        # copy the zone's packed registers (without the register pointer) into the burst
+        offset = 1 + 4 * (channel - self.first)
+        self.burst[offset:offset + len(transaction) - 1] = transaction[1:]
+        self.dirty = True
+
+
+class Renderer:
+    # one long-lived render thread that composes every zone's scene into one burst per board per frame
+
+    def __init__(self, pwms, zone_list=zones.DEFAULT_ZONES, recorder=None):
+        # pwms maps the I2C address of every board in zone_list to its PCA9685
+        self.zones = zone_list
+        self.boards = {}
+        for address in zones.boards(zone_list):
+            indices = [i for i, zone in enumerate(zone_list) if zone.board == address]
+            self.boards[address] = Board(pwms[address], [zone_list[i].channel for i in indices], indices)
+
+        # every burst written is also appended here if set (recorder.Recorder)
+        self.recorder = recorder
+
+        # scenes from the control loop, picked up between frames
+        self.commands = queue.Queue()
+
+        # each zone's player and the duty cycles currently on its outputs (crossfades start from here)
+        self.players = [None] * len(zone_list)
+        self.frames = [None] * len(zone_list)
+
+        # input edge the current scenes were started by, cleared once their first frame is written
+        self.input_bus = None
+        self.edge_time = None
+
+        # time of the newest scene change that hasn't been written yet
+        self.switch_time = None
+
+        # set once the first frame is on the bus (cold start measurement)
+        self.first_frame = threading.Event()
+
+        # frame ticks are counted from here
+        self.epoch = time.monotonic()
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def play(self, scene, fade=0.0, input_bus=None, edge_time=None):
+        # show the same scene on every zone
+        self.play_zones([scene] * len(self.zones), fade, input_bus, edge_time)
+
+    def play_zones(self, scenes, fade=0.0, input_bus=None, edge_time=None):
+        # switch each zone to its scene on the next frame boundary, crossfading for fade seconds (never blocks)
+        self.commands.put(Command(list(scenes), fade, input_bus, edge_time, time.monotonic()))
+
+    def stop(self):
+        # finish the current frame and end the render thread
+        self.commands.put(Command(None, 0.0, None, None, time.monotonic()))
+        self.thread.join()
+
+    def run(self):
+        command = self.commands.get()
+
+        while command.scenes is not None:
+            self.start(command)
+            command = self.render()
+
+    def start(self, command):
+        if command.edge_time is not None:
+            self.input_bus, self.edge_time = command.input_bus, command.edge_time
+
+        # zones start on the current tick so they stay in step with each other
+        start = self.tick_time(time.monotonic(), math.floor)
+        switched = False
+
+        for i, scene in enumerate(command.scenes):
+            # zones that are already on (or fading to) their scene keep their place in it
+            player = self.players[i]
+            if scene is None or (player is not None and player.target is scene):
+                continue
+
+            switched = True
+
+            # a brightness or speed change is swapped in without losing the animation's phase
+            if player is not None and player.target.same_show(scene):
+                due = player.swap(scene)
+                if due is not None:
+                    transaction, self.frames[i] = due
+                    zone = self.zones[i]
+                    self.boards[zone.board].set(zone.channel, transaction)
+                continue
+
+            # crossfade from what is on the outputs now, or switch on the next frame
+            frame = self.frames[i]
+            if command.fade > 0 and frame is not None and frame.shape == scene.scene_frames[0][0].shape:
+                self.players[i] = ZonePlayer(Crossfade(frame, scene, command.fade), start, then=scene)
+            else:
+                self.players[i] = ZonePlayer(scene, start)
+
+        # the switch counts as done once the next frame is written (the oldest unwritten one is timed)
+        if switched:
+            metrics.SCENE_SWITCHES.inc()
+            if self.switch_time is None:
+                self.switch_time = command.time
+
+    def next_command(self, timeout):
+        # wait up to timeout (None waits forever) and return the newest command, or None
+        try:
+            command = self.commands.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+        # only the newest scenes matter if several were queued while a frame was being written
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return command
+
+    def render(self):
+        while True:
+            now = time.monotonic()
+
+            # compose every zone whose next frame is due into its board's burst
+            for i, player in enumerate(self.players):
+                if player is None or player.next_time > now:
+                    continue
+
+                # a finished crossfade hands over to the scene it faded into
+                if player.finished:
+                    player = self.players[i] = ZonePlayer(player.then, player.next_time)
+
+                due = player.update()
+                if due is not None:
+                    transaction, self.frames[i] = due
+                    zone = self.zones[i]
+                    self.boards[zone.board].set(zone.channel, transaction)
+
+            # a board that failed to write is retried on the next tick
+            failed = self.write()
+
+            # wait for the tick of the next zone's deadline, or switch scenes right away
+            next_time = min((player.next_time for player in self.players if player is not None), default=math.inf)
+            if failed:
+                next_time = min(next_time, now + FRAME_TICK)
+            if next_time == math.inf:
+                timeout = None
+            else:
+                timeout = max(0.0, self.tick_time(next_time, math.ceil) - time.monotonic())
+
+            command = self.next_command(timeout)
+            if command is not None:
+                return command
+
+    def zone_scene(self, i):
+        # (scene_id, behavior) a zone is playing, a crossfade is named by the scene it fades into
+        player = self.players[i]
+        if player is None:
+            return None, None
+
+        return player.target.scene_id, player.scene.behavior
+
+    def tick_time(self, moment, rounding):
+        # round a time.monotonic() value to a frame tick (the small offset absorbs float error in summed durations)
+        ticks = (moment - self.epoch) / FRAME_TICK
+        ticks = rounding(ticks - 1e-6) if rounding is math.ceil else rounding(ticks + 1e-6)
+
+        return self.epoch + ticks * FRAME_TICK
+
+    def write(self):
+        # one burst per board that changed, and the bus time of the whole frame, returns True if a write failed
+        bursts = 0
+        bus_time = 0.0
+        failed = False
+        start = time.monotonic()
+
+        for address, board in self.boards.items():
+            if not board.dirty:
+                continue
+
+            # a glitch on the bus (remote I/O error) must not take the render thread down
+            try:
+                backend.write_buffer(board.pwm, board.burst)
+            except OSError:
+                metrics.I2C_FAILURES.inc(f"{address:#04x}")
+                failed = True
+                continue
+
+            board.dirty = False
+            bursts += 1
+            bus_time += backend.transaction_time(len(board.burst))
+
+            if self.recorder is not None:
+                self.recorder.record(address, board.burst, board.first, [self.zone_scene(i) for i in board.zones])
+
+        if not bursts:
+            return failed
+
+        end = time.monotonic()
+        scheduler.BUS_STATS.record(bursts, bus_time, end - start)
+        if not self.first_frame.is_set():
+            self.first_frame.set()
+
+        # measure scene change and input edge to first frame latency
+        if self.switch_time is not None:
+            metrics.SCENE_SWITCH_TIME.observe(end - self.switch_time)
+            self.switch_time = None
+        if self.edge_time is not None:
+            self.input_bus.record_first_frame(self.edge_time)
+            self.edge_time = None
+
+        return failed
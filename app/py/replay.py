@@ -0,0 +1,144 @@
+import sys
+import time
+import struct
+import backend
+import argparse
+import datetime
+import recorder
+import statistics
+
+# anything longer between two records is treated as a pause (a static scene or a restart) and shortened on replay
+MAX_GAP = 1.0
+
+# a record later than this after the one before it while a scene was animating counts as a stall
+STALL_TIME = 0.025
+
+
+def parse_time(value):
+    # "2026-10-17 23:00" or "2026-10-17T23:00:05" -> time.time() value
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def wall_time(record):
+    return datetime.datetime.fromtimestamp(record.wall_time).isoformat(sep=" ", timespec="milliseconds")
+
+
+def select_records(records, board=None, since=None, until=None):
+    return [record for record in records
+            if (board is None or record.board == board)
+            and (since is None or record.wall_time >= since)
+            and (until is None or record.wall_time <= until)]
+
+
+def describe(record):
+    zones = ", ".join(f"{scene_id}:{behavior}" for scene_id, behavior in zip(record.scene_ids, record.behaviors))
+    duty_cycles = " ".join(f"{duty_cycle:04x}" for duty_cycle in record.duty_cycles)
+
+    return f"{wall_time(record)} {record.board:#04x} [{zones}] ch{record.first_channel}: {duty_cycles}"
+
+
+def build_burst(record):
+    # the register burst the record was made from
+    buf = bytearray(1 + 4 * len(record.duty_cycles))
+    buf[0] = backend.LED0_ON_L + 4 * record.first_channel
+    for i, duty_cycle in enumerate(record.duty_cycles):
+        struct.pack_into("<HH", buf, 1 + 4 * i, *backend.encode_duty_cycle(duty_cycle))
+
+    return buf
+
+
+def analyze(records):
+    # per board: frame intervals, stalls while animating and scene changes
+    report = {}
+    for address in sorted({record.board for record in records}):
+        board_records = [record for record in records if record.board == address]
+        intervals = []
+        stalls = []
+        changes = []
+        for before, after in zip(board_records, board_records[1:]):
+            interval = after.time - before.time
+
+            # monotonic time starts over on a reboot, and static scenes are only written when they change
+            if 0 <= interval <= MAX_GAP:
+                intervals.append(interval)
+                if interval > STALL_TIME and before.scene_ids == after.scene_ids:
+                    stalls.append((interval, after))
+            if (before.scene_ids, before.behaviors) != (after.scene_ids, after.behaviors):
+                changes.append(after)
+
+        report[address] = {
+            "frames": len(board_records),
+            "from": wall_time(board_records[0]),
+            "to": wall_time(board_records[-1]),
+            "mean_interval": statistics.mean(intervals) if intervals else None,
+            "max_interval": max(intervals, default=None),
+            "stalls": sorted(stalls, key=lambda stall: stall[0], reverse=True),
+            "changes": changes,
+        }
+
+    return report
+
+
+def replay(records, backend_name, speed=1.0):
+    # write every record to the backend at its recorded pace, returns the lateness of every write
+    pwms = {}
+    for address in sorted({record.board for record in records}):
+        pwm = pwms[address] = backend.create_pwm(backend_name, address=address)
+        pwm.frequency = 1600
+
+    lateness = []
+    start = time.monotonic()
+    offset = 0.0
+    for before, record in zip([None] + records, records):
+        if before is not None:
+            offset += min(max(0.0, record.time - before.time), MAX_GAP) / speed
+
+        wait = start + offset - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        lateness.append(max(0.0, time.monotonic() - (start + offset)))
+        backend.write_buffer(pwms[record.board], build_burst(record))
+
+    return lateness
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show, analyze and replay a frame recording made with FRAME_RECORDING.")
+    parser.add_argument("recording", help="ring file written by the controller")
+    parser.add_argument("--since", type=parse_time, help="first wall clock time to look at (ISO 8601)")
+    parser.add_argument("--until", type=parse_time, help="last wall clock time to look at (ISO 8601)")
+    parser.add_argument("--board", type=lambda value: int(value, 0), help="only this I2C address")
+    parser.add_argument("--list", action="store_true", help="print every record")
+    parser.add_argument("--replay", choices=["simulated", "pca9685"], help="write the records to this output backend")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor")
+    parser.add_argument("--stalls", type=int, default=10, help="longest stalls to list per board")
+    args = parser.parse_args()
+
+    records = select_records(recorder.read_recording(args.recording), args.board, args.since, args.until)
+    if not records:
+        print("no records in that range")
+        sys.exit(1)
+
+    if args.list:
+        for record in records:
+            print(describe(record))
+
+    for address, summary in analyze(records).items():
+        mean, longest = summary["mean_interval"], summary["max_interval"]
+        print(f"board {address:#04x}: {summary['frames']} frames from {summary['from']} to {summary['to']}, "
+              f"interval mean {'-' if mean is None else f'{mean * 1000:.2f} ms'}, "
+              f"max {'-' if longest is None else f'{longest * 1000:.2f} ms'}, "
+              f"{len(summary['stalls'])} stalls over {STALL_TIME * 1000:.0f} ms, {len(summary['changes'])} scene changes")
+        for interval, record in summary["stalls"][:args.stalls]:
+            print(f"  stall {interval * 1000:7.2f} ms before {describe(record)}")
+        for record in summary["changes"]:
+            print(f"  scene change {describe(record)}")
+
+    if args.replay:
+        lateness = replay(records, args.replay, args.speed)
+        print(f"replayed {len(records)} frames on {args.replay}: lateness mean {statistics.mean(lateness) * 1000:.3f} ms, "
+              f"max {max(lateness) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import frames
+import backend
+import itertools
+
+# columns shared by the scenes and testmode tables
+SCENE_COLUMNS = "behavior, brightness, speed, color0, color1, color2, color3, color4, color5, color6, color7, color8, color9"
+
+# every compiled scene gets a new version so scenes can be compared by identity
+versions = itertools.count(1)
+
+
+def hex_to_color(hexval):
+    # extract each color from the hex value string and convert string to int (hex format), keeping all 8 bits
+    red = int(hexval[:2], 16)
+    green = int(hexval[2:4], 16)
+    blue = int(hexval[4:], 16)
+
+    return [red, green, blue]
+
+
+def row_color_ids(row):
+    # put all color_id keys into a list and remove unused colors
+    color_ids = [color_id for color_id in row[3:] if color_id is not None]
+
+    # if all colors were null, add black to the list (keep things from breaking)
+    if not color_ids:
+        color_ids = [64]
+
+    return color_ids
+
+
+class Scene:
+    # a scene with its whole cycle rendered and packed, ready to play
+
+    def __init__(self, scene_id, behavior, color_list, cycle_time, dimmer):
+        self.scene_id = scene_id
+        self.behavior = behavior
+        self.color_list = color_list
+        self.cycle_time = cycle_time
+        self.dimmer = dimmer
+        self.version = next(versions)
+
+        # render every frame and pack it into its I2C transaction once
+        self.scene_frames, self.durations = frames.compile_scene(behavior, color_list, cycle_time, dimmer)
+        buffers = frames.pack_frames(self.scene_frames, backend.LED0_ON_L)
+        self.transactions = [[row.tobytes() for row in color] for color in buffers]
+
+    def same_show(self, other):
+        # True if other is this scene with only its brightness or speed changed, so it can play on from the same phase
+        return other.scene_id == self.scene_id and other.behavior == self.behavior and other.color_list == self.color_list
+
+    def __repr__(self):
+        return f"Scene({self.scene_id}, {self.behavior}, v{self.version})"
+
+
+def build_scene(scene_id, row, id_to_hex):
+    # store scene table data in variables
+    behavior, brightness, speed = row[0], row[1], row[2]
+
+    # make sure the behavior string is a registered lighting behavior
+    frames.get_behavior(behavior)
+
+    # every color must exist in the colors table
+    missing = [color_id for color_id in row_color_ids(row) if color_id not in id_to_hex]
+    if missing:
+        raise ValueError(f"unknown color id {missing[0]}")
+
+    color_list = [hex_to_color(id_to_hex[color_id]) for color_id in row_color_ids(row)]
+
+    # derive cycle time from speed
+    cycle_time = 6 - speed
+
+    # derive dimmer from brightness (1 = 10%, 10 = 100%)
+    dimmer = int(0x3333 * (5 - brightness))
+
+    return Scene(scene_id, behavior, color_list, cycle_time, dimmer)
+
+
+class SceneCache:
+    # compiled scenes keyed by scene_id, dropped only when their scenes or colors rows change
+
+    def __init__(self):
+        self.rows = {}
+        self.hexvals = {}
+        self.scenes = {}
+
+    def refresh(self, cursor):
+        # read every scene and color row (only called after lighting.db has changed), returns whether any changed
+        cursor.execute(f"SELECT scene_id, {SCENE_COLUMNS} FROM scenes")
+        rows = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        cursor.execute("SELECT color_id, hexval FROM colors")
+        hexvals = dict(cursor.fetchall())
+
+        changed = rows != self.rows or hexvals != self.hexvals
+
+        # drop compiled scenes whose row or any of whose colors have changed
+        for scene_id in list(self.scenes):
+            row = rows.get(scene_id)
+            if row is None or row != self.rows.get(scene_id):
+                del self.scenes[scene_id]
+            elif any(hexvals.get(c) != self.hexvals.get(c) for c in row_color_ids(row)):
+                del self.scenes[scene_id]
+
+        self.rows = rows
+        self.hexvals = hexvals
+
+        return changed
+
+    def get(self, scene_id):
+        # compile the scene the first time it is needed, no database round trip
+        scene = self.scenes.get(scene_id)
+        if scene is None:
+            if scene_id not in self.rows:
+                raise ValueError(f"unknown scene: {scene_id}")
+            scene = self.scenes[scene_id] = build_scene(scene_id, self.rows[scene_id], self.hexvals)
+
+        return scene
+
+    def build(self, row):
+        # compile a scene that doesn't live in the scenes table (test mode)
+        return build_scene(None, row, self.hexvals)
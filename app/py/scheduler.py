@@ -0,0 +1,142 @@
+import math
+import time
+
+# if playback falls this far behind (suspend, clock stall) restart the timeline instead of skipping to catch up
+RESYNC_THRESHOLD = 1.0
+
+
+class FrameStats:
+    # running lateness and missed frame statistics for one behavior
+
+    def __init__(self):
+        self.frames = 0
+        self.missed = 0
+        self.resyncs = 0
+        self.total_lateness = 0.0
+        self.total_lateness_sq = 0.0
+        self.max_lateness = 0.0
+
+    def record(self, lateness):
+        self.frames += 1
+        self.total_lateness += lateness
+        self.total_lateness_sq += lateness * lateness
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+
+    def record_missed(self):
+        self.missed += 1
+
+    def record_resync(self):
+        self.resyncs += 1
+
+    def summary(self):
+        # mean lateness and jitter (standard deviation of lateness) in seconds
+        mean = self.total_lateness / self.frames if self.frames else 0.0
+        variance = self.total_lateness_sq / self.frames - mean * mean if self.frames else 0.0
+
+        return {
+            "frames": self.frames,
+            "missed": self.missed,
+            "resyncs": self.resyncs,
+            "mean_lateness": mean,
+            "max_lateness": self.max_lateness,
+            "jitter": math.sqrt(max(variance, 0.0)),
+        }
+
+
+# behavior name -> FrameStats
+STATS = {}
+
+
+def get_stats(behavior):
+    stats = STATS.get(behavior)
+    if stats is None:
+        stats = STATS[behavior] = FrameStats()
+
+    return stats
+
+
+def stats_summary():
+    return {behavior: stats.summary() for behavior, stats in STATS.items()}
+
+
+class Deadline:
+    # absolute time.monotonic() timeline for a render loop
+
+    def __init__(self, stats, start=None):
+        self.stats = stats
+        self.deadline = time.monotonic() if start is None else start
+
+    def due(self, duration):
+        # returns True if the frame starting at the current deadline should be emitted
+        now = time.monotonic()
+
+        # fell too far behind, restart the timeline from now
+        if now - self.deadline > RESYNC_THRESHOLD:
+            self.stats.record_resync()
+            self.deadline = now
+
+        # the whole slot for this frame has already passed, so skip it rather than slow down
+        if now >= self.deadline + duration:
+            self.stats.record_missed()
+            return False
+
+        self.stats.record(now - self.deadline)
+        return True
+
+    def advance(self, duration):
+        # move to the next frame and return how long to wait for it
+        self.deadline += duration
+
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class BusStats:
+    # I2C time spent per composed frame (every board burst written on one tick)
+
+    def __init__(self):
+        self.frames = 0
+        self.bursts = 0
+        self.total_bus_time = 0.0
+        self.max_bus_time = 0.0
+        self.last_bus_time = 0.0
+        self.total_write_time = 0.0
+        self.max_write_time = 0.0
+
+    def record(self, bursts, bus_time, write_time):
+        # bus_time is the modeled time on the wire, write_time the measured time spent in write_buffer()
+        self.frames += 1
+        self.bursts += bursts
+        self.total_bus_time += bus_time
+        self.last_bus_time = bus_time
+        self.total_write_time += write_time
+        if bus_time > self.max_bus_time:
+            self.max_bus_time = bus_time
+        if write_time > self.max_write_time:
+            self.max_write_time = write_time
+
+    def summary(self):
+        return {
+            "frames": self.frames,
+            "bursts": self.bursts,
+            "mean_bus_time": self.total_bus_time / self.frames if self.frames else 0.0,
+            "max_bus_time": self.max_bus_time,
+            "last_bus_time": self.last_bus_time,
+            "mean_write_time": self.total_write_time / self.frames if self.frames else 0.0,
+            "max_write_time": self.max_write_time,
+        }
+
+
+# bus time of every frame the renderer writes
+BUS_STATS = BusStats()
+
+
+def bus_summary():
+    return BUS_STATS.summary()
+
+
+def reset_stats():
+    # start every behavior and the bus from zero (used between benchmark runs)
+    global BUS_STATS
+    STATS.clear()
+    BUS_STATS = BusStats()
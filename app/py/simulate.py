@@ -0,0 +1,185 @@
+import sys
+import time
+import zones
+import inputs
+import scenes
+import sqlite3
+import argparse
+import datetime
+import controller
+import collections
+
+# one scripted change of a connection input (connection is 1-8 like connection_id)
+InputChange = collections.namedtuple("InputChange", ["time", "connection", "active"])
+
+# one line of the resulting timeline: what woke the control core, the active connection and every zone's scene
+Change = collections.namedtuple("Change", ["time", "source", "connection", "scenes"])
+
+
+class VirtualClock:
+    # stands in for datetime.datetime in the control core and only moves when the simulation moves it
+
+    def __init__(self, start):
+        self.moment = start
+
+    def now(self):
+        return self.moment
+
+
+class ScriptedInputs:
+    # stands in for inputs.InputBus, the script switches the connections
+
+    def __init__(self, count=len(inputs.INPUT_PINS)):
+        self.active = [False] * count
+
+    def states(self):
+        return list(self.active)
+
+    def take_edge(self):
+        return None
+
+
+class SceneLog:
+    # stands in for the renderer and keeps every scene change instead of playing it
+
+    def __init__(self):
+        self.plays = []
+
+    def play_zones(self, scenes, fade=0.0, input_bus=None, edge_time=None):
+        self.plays.append(list(scenes))
+
+
+class NullWriter:
+    # stands in for writer.DatabaseWriter, the copy of lighting.db is never written
+
+    def __init__(self):
+        self.connection = None
+
+    def update(self, key, sql, parameters=()):
+        if key == "connections":
+            self.connection = parameters[0]
+
+    def discard(self, key):
+        pass
+
+
+def parse_input(line):
+    # "2026-11-02T18:00 3 on" -> InputChange
+    try:
+        moment, connection, state = line.split()
+        change = InputChange(datetime.datetime.fromisoformat(moment), int(connection), state.lower())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected 'TIME CONNECTION on|off', got {line!r}")
+
+    if change.active not in ("on", "off") or not 1 <= change.connection <= len(inputs.INPUT_PINS):
+        raise argparse.ArgumentTypeError(f"expected 'TIME CONNECTION on|off', got {line!r}")
+
+    return change._replace(active=change.active == "on")
+
+
+def read_script(path):
+    # one input change per line, blank lines and # comments are skipped
+    with open(path) as file:
+        lines = [line.split("#", 1)[0].strip() for line in file]
+
+    return [parse_input(line.replace(" ", "T", 1) if line.count(" ") == 3 else line) for line in lines if line]
+
+
+def open_copy(path):
+    # the whole database in memory, so the simulation never touches the real file
+    source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn = sqlite3.connect(":memory:")
+    source.backup(conn)
+    source.close()
+
+    return conn
+
+
+def scene_label(scene, off_scene):
+    if scene is off_scene:
+        return "off"
+    if scene is None:
+        return "-"
+
+    return str(scene.scene_id)
+
+
+def simulate(database_path, start, end, script=()):
+    # play the control core's decisions from start to end, returns the timeline of scene changes
+    conn = open_copy(database_path)
+    cursor = conn.cursor()
+
+    clock = VirtualClock(start)
+    input_bus = ScriptedInputs()
+    lighting = SceneLog()
+    db_writer = NullWriter()
+    zone_list = zones.read_zones(cursor)
+    core = controller.ControlCore(cursor, db_writer, None, scenes.SceneCache(), input_bus, lighting, zone_list,
+                                  None, None, clock=clock)
+
+    # inputs scripted before the start are already in place
+    script = sorted(script)
+    while script and script[0].time <= start:
+        input_bus.active[script[0].connection - 1] = script[0].active
+        script.pop(0)
+
+    timeline = []
+
+    def step(source):
+        plays = len(lighting.plays)
+        core.update(source)
+        if len(lighting.plays) > plays:
+            labels = [scene_label(scene, core.off_scene) for scene in core.zone_scenes]
+            timeline.append(Change(clock.now(), source, db_writer.connection, labels))
+
+    step("startup")
+
+    # jump straight to the next schedule transition or scripted input, whichever is first
+    while True:
+        transition = core.schedule.next_transition(clock.now())
+        next_input = script[0].time if script else None
+        moments = [moment for moment in (transition, next_input) if moment is not None and moment <= end]
+        if not moments:
+            break
+
+        clock.moment = min(moments)
+        source = "schedule"
+        while script and script[0].time == clock.moment:
+            input_bus.active[script[0].connection - 1] = script[0].active
+            script.pop(0)
+            source = "input"
+
+        step(source)
+
+    return timeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast-forward the controller's scene decisions against a copy of lighting.db.")
+    parser.add_argument("--database", default=controller.DATABASE_PATH, help="lighting.db to read (never written)")
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat,
+                        default=datetime.datetime.now().replace(second=0, microsecond=0), help="virtual start time")
+    parser.add_argument("--days", type=float, default=30, help="how long to simulate")
+    parser.add_argument("--input", type=parse_input, action="append", default=[],
+                        help="scripted connection change 'TIME CONNECTION on|off', for example '2026-11-02T18:00 3 on'")
+    parser.add_argument("--script", help="file with one scripted connection change per line")
+    args = parser.parse_args()
+
+    script = args.input + (read_script(args.script) if args.script else [])
+    end = args.start + datetime.timedelta(days=args.days)
+
+    run_start = time.perf_counter()
+    timeline = simulate(args.database, args.start, end, script)
+    run_time = time.perf_counter() - run_start
+
+    for change in timeline:
+        connection = f"connection {change.connection}" if change.connection else "no connection"
+        scenes_shown = change.scenes[0] if len(set(change.scenes)) == 1 else " ".join(change.scenes)
+        print(f"{change.time:%a %Y-%m-%d %H:%M}  {change.source:8}  {connection:13}  scene {scenes_shown}")
+
+    print(f"{len(timeline)} scene changes from {args.start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M} "
+          f"simulated in {run_time:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
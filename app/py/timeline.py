@@ -0,0 +1,66 @@
+import datetime
+
+# look this many days ahead for the next transition before giving up (hours repeat weekly)
+SCAN_DAYS = 8
+
+
+class Timeline:
+    # weekly business hours and dated events compiled into open/close/event transitions
+
+    def __init__(self, open_hours, event_scenes, event_dates):
+        self.open_hours = open_hours
+
+        # first event listed for a date wins, same as event_dates.index()
+        self.events = {}
+        for scene_id, date in zip(event_scenes, event_dates):
+            self.events.setdefault(date, scene_id)
+
+        # per weekday, the minutes of the day where the state can change (midnight, opening, closing)
+        self.candidates = []
+        for open_hour, open_minute, close_hour, close_minute in open_hours:
+            self.candidates.append(sorted({0, open_hour * 60 + open_minute, close_hour * 60 + close_minute}))
+
+    def is_open(self, moment):
+        # get business hours for the moment's weekday
+        open_hour, open_minute, close_hour, close_minute = self.open_hours[moment.weekday()]
+        curr_hour, curr_minute = moment.hour, moment.minute
+
+        # manage all possible hour scenarios
+        if open_hour <= close_hour:
+            # normal hours like 9a-5p
+            return (open_hour, open_minute) <= (curr_hour, curr_minute) < (close_hour, close_minute)
+        else:
+            # overnight hours like 10:30a-1a (wingstop case)
+            return (curr_hour, curr_minute) >= (open_hour, open_minute) or (curr_hour, curr_minute) < (
+                close_hour, close_minute)
+
+    def event_scene(self, moment):
+        # scene_id of today's event, or None
+        return self.events.get(moment.date().isoformat())
+
+    def state(self, moment):
+        # (is_open, event scene_id or None), events only matter while open
+        is_open = self.is_open(moment)
+        return is_open, self.event_scene(moment) if is_open else None
+
+    def next_transition(self, now):
+        # first instant after now where the state differs, or None if it never changes
+        current = self.state(now)
+        midnight = datetime.datetime.combine(now.date(), datetime.time())
+
+        for day in range(SCAN_DAYS):
+            day_start = midnight + datetime.timedelta(days=day)
+            for minute in self.candidates[day_start.weekday()]:
+                moment = day_start + datetime.timedelta(minutes=minute)
+                if moment > now and self.state(moment) != current:
+                    return moment
+
+        return None
+
+    def seconds_until_next(self, now, limit):
+        # how long the controller can sleep before the schedule needs it again (capped at limit)
+        moment = self.next_transition(now)
+        if moment is None:
+            return limit
+
+        return min(max((moment - now).total_seconds(), 0.0), limit)
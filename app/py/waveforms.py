@@ -0,0 +1,87 @@
+import os
+import mmap
+import numpy
+import struct
+
+# directory of the generated tables (project/tables next to the backend directory)
+TABLE_DIR = os.environ.get("LIGHTING_TABLES",
+                           os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tables")))
+
+# bump when the layout below changes, old files are then rejected instead of misread
+TABLE_VERSION = 1
+
+# header: magic, version, number of curves
+HEADER = struct.Struct("<4sHH")
+MAGIC = b"PWMT"
+
+# one index entry per curve: cycle_time, byte offset of its samples, number of samples
+ENTRY = struct.Struct("<HxxII")
+
+# every cycle_time the web application can select (cycle_time = 6 - speed)
+CYCLE_TIMES = [1, 2, 3, 4, 5]
+
+# open tables, shared by every scene (the pages are shared with every other process mapping the same file)
+TABLES = {}
+
+
+def table_path(name, directory=TABLE_DIR):
+    return os.path.join(directory, f"{name}.u16")
+
+
+def write_table(name, curves, directory=TABLE_DIR):
+    # curves maps cycle_time -> samples (0-0xffff), written as little-endian uint16 after the index
+    curves = {cycle_time: numpy.asarray(curves[cycle_time]) for cycle_time in sorted(curves)}
+    for cycle_time, samples in curves.items():
+        if samples.min() < 0 or samples.max() > 0xffff:
+            raise ValueError(f"{name}: cycle_time {cycle_time} has samples outside 0-0xffff")
+
+    offset = HEADER.size + ENTRY.size * len(curves)
+    index = []
+    for cycle_time, samples in curves.items():
+        index.append(ENTRY.pack(cycle_time, offset, len(samples)))
+        offset += 2 * len(samples)
+
+    path = table_path(name, directory)
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, TABLE_VERSION, len(curves)))
+        file.write(b"".join(index))
+        for samples in curves.values():
+            file.write(samples.astype("<u2").tobytes())
+
+    # never leave a half written table where a starting controller could map it
+    os.replace(path + ".tmp", path)
+
+    return path
+
+
+def read_table(path):
+    # map a table read-only, returns cycle_time -> read-only uint16 array backed by the mapping
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path}: not a waveform table")
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a waveform table")
+    if version != TABLE_VERSION:
+        raise ValueError(f"{path}: table version {version}, expected {TABLE_VERSION} (rebuild it with the scripts in scripts/)")
+
+    curves = {}
+    for i in range(count):
+        cycle_time, offset, length = ENTRY.unpack_from(data, HEADER.size + ENTRY.size * i)
+        if offset + 2 * length > len(data):
+            raise ValueError(f"{path}: cycle_time {cycle_time} runs past the end of the file")
+        curves[cycle_time] = numpy.frombuffer(data, dtype="<u2", count=length, offset=offset)
+
+    return curves
+
+
+def load_table(name):
+    # map a table once per process
+    table = TABLES.get(name)
+    if table is None:
+        table = TABLES[name] = read_table(table_path(name))
+
+    return table
@@ -0,0 +1,90 @@
+import time
+import sqlite3
+import metrics
+import threading
+import collections
+
+# how long the writer gathers writes before committing them as one transaction
+WRITE_BATCH_TIME = 0.05
+
+# wait before retrying a batch that failed (database locked by the PHP side for longer than busy_timeout)
+WRITE_RETRY_TIME = 1.0
+
+# one pending statement
+Write = collections.namedtuple("Write", ["sql", "parameters"])
+
+
+class DatabaseWriter:
+    # every controller write to lighting.db goes through here, so the control loop never waits on a SQLite lock
+
+    def __init__(self, path, batch_time=WRITE_BATCH_TIME):
+        self.path = path
+        self.batch_time = batch_time
+
+        # key -> newest Write not yet taken by the writer thread (a newer write with the same key replaces it)
+        self.pending = {}
+
+        # key -> Write in the batch being committed
+        self.inflight = {}
+
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def update(self, key, sql, parameters=()):
+        # queue a write (never blocks), statements should only touch rows that actually change, and only if they
+        # still hold what the controller read (the web application may have written them since)
+        with self.lock:
+            self.pending[key] = Write(sql, tuple(parameters))
+        self.ready.set()
+
+    def discard(self, key):
+        # drop a queued write the writer thread hasn't taken yet
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def run(self):
+        # the connection belongs to this thread (sqlite3 connections stay on the thread that opened them)
+        conn = sqlite3.connect(self.path, factory=metrics.TimedConnection)
+        conn.execute("PRAGMA busy_timeout = 5000;")
+
+        while True:
+            self.ready.wait()
+
+            # let a burst of writes from one pass of the control loop collect into one transaction
+            time.sleep(self.batch_time)
+            with self.lock:
+                self.ready.clear()
+                self.inflight, self.pending = self.pending, {}
+
+            try:
+                self.commit(conn, self.inflight.values())
+            except sqlite3.Error as e:
+                print(f"Database write failed, retrying: {e}")
+                with self.lock:
+                    # newer writes with the same key win over the ones that failed
+                    self.pending = {**self.inflight, **self.pending}
+                    self.inflight = {}
+                self.ready.set()
+                time.sleep(WRITE_RETRY_TIME)
+                continue
+
+            with self.lock:
+                self.inflight = {}
+
+    def commit(self, conn, writes):
+        # one transaction for the batch, rolled back instead of committed if no row changed
+        changes = conn.total_changes
+        try:
+            for write in writes:
+                conn.execute(write.sql, write.parameters)
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+        if conn.total_changes == changes:
+            conn.rollback()
+        else:
+            conn.commit()
@@ -0,0 +1,61 @@
+import sqlite3
+import backend
+import collections
+
+# channels per RGB zone and zones per PCA9685 (channels 0-14, channel 15 is spare)
+ZONE_CHANNELS = 3
+ZONES_PER_BOARD = backend.NUM_CHANNELS // ZONE_CHANNELS
+
+# default PCA9685 address
+DEFAULT_BOARD = 0x40
+
+# one RGB fixture: I2C address of its board, first of its three channels, and its own default scene (None = site default)
+Zone = collections.namedtuple("Zone", ["zone_id", "board", "channel", "scene"])
+
+# used when lighting.db has no zones table: one fixture on channels 0-2 of the default board
+DEFAULT_ZONES = [Zone(1, DEFAULT_BOARD, 0, None)]
+
+
+def read_zones(cursor):
+    # read the zone layout from lighting.db
+    try:
+        cursor.execute("SELECT zone_id, board, channel, scene FROM zones ORDER BY zone_id")
+    except sqlite3.OperationalError:
+        # databases from before multi-zone support
+        return DEFAULT_ZONES
+
+    # a null board is the default board, a null channel puts the zone in its board's next free slot
+    zones = []
+    next_channel = collections.defaultdict(int)
+    for zone_id, board, channel, scene in cursor.fetchall():
+        board = DEFAULT_BOARD if board is None else board
+        channel = next_channel[board] if channel is None else channel
+        next_channel[board] = channel + ZONE_CHANNELS
+        zones.append(Zone(zone_id, board, channel, scene))
+
+    if not zones:
+        return DEFAULT_ZONES
+
+    check_zones(zones)
+
+    return zones
+
+
+def check_zones(zones):
+    # every zone needs three channels of its own on a real board
+    used = {}
+    for zone in zones:
+        if not 0x00 <= zone.board <= 0x7f:
+            raise ValueError(f"zone {zone.zone_id}: invalid I2C address {zone.board}")
+        if not 0 <= zone.channel <= backend.NUM_CHANNELS - ZONE_CHANNELS:
+            raise ValueError(f"zone {zone.zone_id}: channel {zone.channel} out of range")
+
+        for channel in range(zone.channel, zone.channel + ZONE_CHANNELS):
+            other = used.setdefault((zone.board, channel), zone.zone_id)
+            if other != zone.zone_id:
+                raise ValueError(f"zone {zone.zone_id}: channel {channel} of board {zone.board:#04x} is used by zone {other}")
+
+
+def boards(zones):
+    # I2C addresses of every board that drives a zone, in zone order
+    return list(dict.fromkeys(zone.board for zone in zones))
@@ -1,10 +1,21 @@
+import os
+import sys
 import numpy
+import argparse
 
-x = numpy.linspace(0, 6*numpy.pi, 500, endpoint=False, dtype=float)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "py"))
+import waveforms
 
-breathe = []
 
-for i in x:
-    breathe.append(int(round(20000*numpy.sin(i+((3*numpy.pi)/2)) + 45535)))
-    
-print(breathe)
+def breathe_curve(cycle_time):
+    # three shallow sine periods that never fully turn off, 100 steps per second
+    x = numpy.linspace(0, 6 * numpy.pi, 100 * cycle_time, endpoint=False, dtype=float)
+    return numpy.round(20000 * numpy.sin(x + ((3 * numpy.pi) / 2)) + 45535)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the breathe waveform table for every speed.")
+    parser.add_argument("--output-dir", default=waveforms.TABLE_DIR, help="table directory")
+    args = parser.parse_args()
+
+    print(waveforms.write_table("breathe", {c: breathe_curve(c) for c in waveforms.CYCLE_TIMES}, args.output_dir))
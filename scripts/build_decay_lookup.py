@@ -1,14 +1,22 @@
-import numpy as np
+import os
+import sys
+import numpy
+import argparse
 
-x1 = np.linspace(0, 65535, 100, endpoint=True, dtype=int)
-x2 = np.linspace(65535, 0, 400, endpoint=True, dtype=int)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "py"))
+import waveforms
 
-decay = []
 
-for i in range(100):
-	decay.append(int(x1[i]))
+def decay_curve(cycle_time):
+    # fast linear rise over the first 20% then linear decay, 100 steps per second
+    x1 = numpy.linspace(0, 65535, 20 * cycle_time, endpoint=True, dtype=int)
+    x2 = numpy.linspace(65535, 0, 80 * cycle_time, endpoint=True, dtype=int)
+    return numpy.concatenate((x1, x2))
 
-for i in range(400):
-	decay.append(int(x2[i]))
 
-print(decay)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the decay waveform table for every speed.")
+    parser.add_argument("--output-dir", default=waveforms.TABLE_DIR, help="table directory")
+    args = parser.parse_args()
+
+    print(waveforms.write_table("decay", {c: decay_curve(c) for c in waveforms.CYCLE_TIMES}, args.output_dir))
@@ -1,10 +1,21 @@
-import numpy as np
+import os
+import sys
+import numpy
+import argparse
 
-x = np.linspace(0, 2*np.pi, 500, endpoint=False, dtype=float)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "py"))
+import waveforms
 
-fade = []
 
-for i in x:
-    fade.append(int(round(32767.5*np.sin(i+((3*np.pi)/2)) + 32767.5)))
-    
-print(fade)
+def fade_curve(cycle_time):
+    # one sine period from off to full and back, 100 steps per second
+    x = numpy.linspace(0, 2 * numpy.pi, 100 * cycle_time, endpoint=False, dtype=float)
+    return numpy.round(32767.5 * numpy.sin(x + ((3 * numpy.pi) / 2)) + 32767.5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the fade waveform table for every speed.")
+    parser.add_argument("--output-dir", default=waveforms.TABLE_DIR, help="table directory")
+    args = parser.parse_args()
+
+    print(waveforms.write_table("fade", {c: fade_curve(c) for c in waveforms.CYCLE_TIMES}, args.output_dir))
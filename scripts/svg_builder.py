@@ -1,39 +1,139 @@
 import os
+import html
+import json
+import time
 import sqlite3
+import hashlib
+import argparse
+import concurrent.futures
 
-# database path
-path = r"C:\Users\andrewr\Desktop\light-tube-controller\database\lighting.db"
+# lighting database the colors are read from (never written)
+DATABASE_PATH = os.environ.get("LIGHTING_DB", '/home/user/project/database/lighting.db')
 
-# connect to SQLite database and get cursor
-conn = sqlite3.connect(path)
-cursor = conn.cursor()
+# web application assets, the swatches go to colors/<name>.svg and the sprite sheet to colors.svg
+ASSETS_DIR = os.environ.get("LIGHTING_ASSETS", '/var/www/html/assets')
 
-# get color names and hex values
-cursor.execute(f"""SELECT name, hexval FROM colors""")
-rows = cursor.fetchall()
+# hash of every file written, so the next run only writes the swatches whose content changed
+MANIFEST_NAME = "manifest.json"
 
-# windows formatted string for file path
-folder = r"C:\Users\andrewr\Desktop\light-tube-controller\svg"
+# swatches per row in the sprite sheet, and the size of each one
+SPRITE_COLUMNS = 8
+SWATCH_SIZE = 150
 
-# file creation counter
-count = 0
+# ring around every swatch (drawn once in the sprite sheet and reused by every swatch)
+RING_PATH = "M 48.167969 145.019531 C 38.824219 141.445312 30.300781 136.085938 23.019531 129.078125 C 15.734375 122.066406 10.03125 113.824219 6.046875 104.613281 C 2.199219 95.683594 0.207031 86.269531 0 76.511719 C -0.207031 66.753906 1.441406 57.273438 4.949219 48.203125 C 8.519531 38.855469 13.878906 30.335938 20.890625 23.054688 C 27.898438 15.769531 36.144531 10.066406 45.351562 6.082031 C 54.28125 2.234375 63.695312 0.242188 73.453125 0.0351562 C 83.210938 -0.171875 92.695312 1.476562 101.761719 4.980469 C 111.109375 8.554688 119.628906 13.914062 126.914062 20.921875 C 134.195312 27.933594 139.898438 36.175781 143.882812 45.386719 C 147.734375 54.316406 149.726562 63.730469 149.929688 73.488281 C 150.136719 83.246094 148.488281 92.726562 144.984375 101.796875 C 141.410156 111.144531 136.050781 119.664062 129.042969 126.945312 C 122.035156 134.230469 113.789062 139.933594 104.582031 143.917969 C 95.648438 147.765625 86.234375 149.757812 76.476562 149.964844 C 75.925781 149.964844 75.445312 149.964844 74.898438 149.964844 C 65.6875 149.964844 56.6875 148.316406 48.167969 145.019531 Z M 73.589844 8.347656 C 55.792969 8.691406 39.167969 15.976562 26.867188 28.824219 C 14.566406 41.675781 7.96875 58.578125 8.3125 76.375 C 8.65625 94.171875 15.941406 110.800781 28.789062 123.097656 C 41.296875 135.125 57.648438 141.652344 74.964844 141.652344 C 75.445312 141.652344 75.859375 141.652344 76.339844 141.652344 C 94.136719 141.308594 110.765625 134.023438 123.066406 121.175781 C 135.363281 108.324219 141.960938 91.421875 141.617188 73.625 C 141.273438 55.828125 133.988281 39.199219 121.140625 26.902344 C 108.636719 14.875 92.28125 8.347656 74.964844 8.347656 C 57.648438 8.347656 74.074219 8.347656 73.589844 8.347656 Z M 73.589844 8.347656 "
 
-# create 64 svg files
-for row in rows:
-    # get color name and hex value
-    name = row[0]
-    hex_value = row[1]
+# single swatch file, split around the fill color so the template is only built once
+SWATCH_HEAD = '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="200" zoomAndPan="magnify" viewBox="0 0 150 149.999998" height="200" preserveAspectRatio="xMidYMid meet" version="1.0"><defs><clipPath id="5f59d42015"><path d="M 7.34375 7.34375 L 142.65625 7.34375 L 142.65625 142.65625 L 7.34375 142.65625 Z M 7.34375 7.34375 " clip-rule="nonzero"/></clipPath><clipPath id="1409696588"><path d="M 75 7.34375 C 37.632812 7.34375 7.34375 37.632812 7.34375 75 C 7.34375 112.363281 37.632812 142.65625 75 142.65625 C 112.363281 142.65625 142.65625 112.363281 142.65625 75 C 142.65625 37.632812 112.363281 7.34375 75 7.34375 Z M 75 7.34375 " clip-rule="nonzero"/></clipPath><clipPath id="c4d20572c5"><path d="M 0.34375 0.34375 L 135.65625 0.34375 L 135.65625 135.65625 L 0.34375 135.65625 Z M 0.34375 0.34375 " clip-rule="nonzero"/></clipPath><clipPath id="4d98e6df44"><path d="M 68 0.34375 C 30.632812 0.34375 0.34375 30.632812 0.34375 68 C 0.34375 105.363281 30.632812 135.65625 68 135.65625 C 105.363281 135.65625 135.65625 105.363281 135.65625 68 C 135.65625 30.632812 105.363281 0.34375 68 0.34375 Z M 68 0.34375 " clip-rule="nonzero"/></clipPath><clipPath id="dca49be8fd"><rect x="0" width="136" y="0" height="136"/></clipPath></defs><g clip-path="url(#5f59d42015)"><g clip-path="url(#1409696588)"><g transform="matrix(1, 0, 0, 1, 7, 7)"><g clip-path="url(#dca49be8fd)"><g clip-path="url(#c4d20572c5)"><g clip-path="url(#4d98e6df44)"><path fill="#'
+SWATCH_TAIL = f'" d="M 0.34375 0.34375 L 135.65625 0.34375 L 135.65625 135.65625 L 0.34375 135.65625 Z M 0.34375 0.34375 " fill-opacity="1" fill-rule="nonzero"/></g></g></g></g></g></g><path fill="#000000" d="{RING_PATH}" fill-opacity="1" fill-rule="nonzero"/></svg>'
 
-    # create unique file name and path
-    filename = f"""{name}.svg"""
-    full_path = os.path.join(folder, filename)
 
-    # insert hex value into svg data
-    svg_data = f"""<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="200" zoomAndPan="magnify" viewBox="0 0 150 149.999998" height="200" preserveAspectRatio="xMidYMid meet" version="1.0"><defs><clipPath id="5f59d42015"><path d="M 7.34375 7.34375 L 142.65625 7.34375 L 142.65625 142.65625 L 7.34375 142.65625 Z M 7.34375 7.34375 " clip-rule="nonzero"/></clipPath><clipPath id="1409696588"><path d="M 75 7.34375 C 37.632812 7.34375 7.34375 37.632812 7.34375 75 C 7.34375 112.363281 37.632812 142.65625 75 142.65625 C 112.363281 142.65625 142.65625 112.363281 142.65625 75 C 142.65625 37.632812 112.363281 7.34375 75 7.34375 Z M 75 7.34375 " clip-rule="nonzero"/></clipPath><clipPath id="c4d20572c5"><path d="M 0.34375 0.34375 L 135.65625 0.34375 L 135.65625 135.65625 L 0.34375 135.65625 Z M 0.34375 0.34375 " clip-rule="nonzero"/></clipPath><clipPath id="4d98e6df44"><path d="M 68 0.34375 C 30.632812 0.34375 0.34375 30.632812 0.34375 68 C 0.34375 105.363281 30.632812 135.65625 68 135.65625 C 105.363281 135.65625 135.65625 105.363281 135.65625 68 C 135.65625 30.632812 105.363281 0.34375 68 0.34375 Z M 68 0.34375 " clip-rule="nonzero"/></clipPath><clipPath id="dca49be8fd"><rect x="0" width="136" y="0" height="136"/></clipPath></defs><g clip-path="url(#5f59d42015)"><g clip-path="url(#1409696588)"><g transform="matrix(1, 0, 0, 1, 7, 7)"><g clip-path="url(#dca49be8fd)"><g clip-path="url(#c4d20572c5)"><g clip-path="url(#4d98e6df44)"><path fill="#{hex_value}" d="M 0.34375 0.34375 L 135.65625 0.34375 L 135.65625 135.65625 L 0.34375 135.65625 Z M 0.34375 0.34375 " fill-opacity="1" fill-rule="nonzero"/></g></g></g></g></g></g><path fill="#000000" d="M 48.167969 145.019531 C 38.824219 141.445312 30.300781 136.085938 23.019531 129.078125 C 15.734375 122.066406 10.03125 113.824219 6.046875 104.613281 C 2.199219 95.683594 0.207031 86.269531 0 76.511719 C -0.207031 66.753906 1.441406 57.273438 4.949219 48.203125 C 8.519531 38.855469 13.878906 30.335938 20.890625 23.054688 C 27.898438 15.769531 36.144531 10.066406 45.351562 6.082031 C 54.28125 2.234375 63.695312 0.242188 73.453125 0.0351562 C 83.210938 -0.171875 92.695312 1.476562 101.761719 4.980469 C 111.109375 8.554688 119.628906 13.914062 126.914062 20.921875 C 134.195312 27.933594 139.898438 36.175781 143.882812 45.386719 C 147.734375 54.316406 149.726562 63.730469 149.929688 73.488281 C 150.136719 83.246094 148.488281 92.726562 144.984375 101.796875 C 141.410156 111.144531 136.050781 119.664062 129.042969 126.945312 C 122.035156 134.230469 113.789062 139.933594 104.582031 143.917969 C 95.648438 147.765625 86.234375 149.757812 76.476562 149.964844 C 75.925781 149.964844 75.445312 149.964844 74.898438 149.964844 C 65.6875 149.964844 56.6875 148.316406 48.167969 145.019531 Z M 73.589844 8.347656 C 55.792969 8.691406 39.167969 15.976562 26.867188 28.824219 C 14.566406 41.675781 7.96875 58.578125 8.3125 76.375 C 8.65625 94.171875 15.941406 110.800781 28.789062 123.097656 C 41.296875 135.125 57.648438 141.652344 74.964844 141.652344 C 75.445312 141.652344 75.859375 141.652344 76.339844 141.652344 C 94.136719 141.308594 110.765625 134.023438 123.066406 121.175781 C 135.363281 108.324219 141.960938 91.421875 141.617188 73.625 C 141.273438 55.828125 133.988281 39.199219 121.140625 26.902344 C 108.636719 14.875 92.28125 8.347656 74.964844 8.347656 C 57.648438 8.347656 74.074219 8.347656 73.589844 8.347656 Z M 73.589844 8.347656 " fill-opacity="1" fill-rule="nonzero"/></svg>"""
+def read_colors(path):
+    # (name, hexval) of every color, in color_id order
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT name, hexval FROM colors ORDER BY color_id").fetchall()
+    finally:
+        conn.close()
 
-    # create/overwrite a new svg
-    with open(full_path, "w") as file:
-        file.write(svg_data)
-        count += 1
 
-print(f"Successfully wrote {count} svg files.")
+def swatch_svg(hexval):
+    return SWATCH_HEAD + hexval + SWATCH_TAIL
+
+
+def sprite_svg(colors):
+    # every swatch in one file, each with a <view> so <img src="colors.svg#name"> shows just that swatch
+    # (the single files' clip paths come down to a circle of radius 67.65625 inside the ring)
+    rows = (len(colors) + SPRITE_COLUMNS - 1) // SPRITE_COLUMNS
+    width, height = SPRITE_COLUMNS * SWATCH_SIZE, rows * SWATCH_SIZE
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+             f'<defs><path id="ring" fill="#000000" d="{RING_PATH}"/></defs>']
+
+    for i, (name, hexval) in enumerate(colors):
+        x, y = (i % SPRITE_COLUMNS) * SWATCH_SIZE, (i // SPRITE_COLUMNS) * SWATCH_SIZE
+        parts.append(f'<view id="{html.escape(name)}" viewBox="{x} {y} {SWATCH_SIZE} {SWATCH_SIZE}"/>'
+                     f'<circle cx="{x + 75}" cy="{y + 75}" r="67.65625" fill="#{html.escape(hexval)}"/>'
+                     f'<use href="#ring" x="{x}" y="{y}"/>')
+
+    parts.append('</svg>')
+
+    return "".join(parts)
+
+
+def content_hash(data):
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def write_file(path, data):
+    # write next to the target and rename, so the web server never serves half a file
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def read_manifest(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def build(database_path, assets_dir, workers=None):
+    # write the swatches and the sprite sheet whose content changed, returns (written, unchanged, removed) swatch names
+    colors = read_colors(database_path)
+    swatch_dir = os.path.join(assets_dir, "colors")
+    os.makedirs(swatch_dir, exist_ok=True)
+
+    manifest_path = os.path.join(swatch_dir, MANIFEST_NAME)
+    manifest = read_manifest(manifest_path)
+    old_hashes = manifest.get("swatches", {})
+
+    # only swatches whose content differs from the last build (or whose file is gone) are written
+    hashes = {}
+    changed = {}
+    for name, hexval in colors:
+        data = swatch_svg(hexval)
+        hashes[name] = content_hash(data)
+        path = os.path.join(swatch_dir, f"{name}.svg")
+        if old_hashes.get(name) != hashes[name] or not os.path.exists(path):
+            changed[path] = data
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(write_file, changed.keys(), changed.values()))
+
+    # swatches of colors that were renamed or removed (only files an earlier build wrote)
+    removed = [name for name in old_hashes if name not in hashes]
+    for name in removed:
+        try:
+            os.unlink(os.path.join(swatch_dir, f"{name}.svg"))
+        except FileNotFoundError:
+            pass
+
+    # the sprite sheet depends on every color and its position
+    sprite = sprite_svg(colors)
+    sprite_path = os.path.join(assets_dir, "colors.svg")
+    sprite_hash = content_hash(sprite)
+    if manifest.get("sprite") != sprite_hash or not os.path.exists(sprite_path):
+        write_file(sprite_path, sprite)
+
+    # the manifest goes last, so an interrupted build is finished by the next one
+    write_file(manifest_path, json.dumps({"swatches": hashes, "sprite": sprite_hash}, indent=2) + "\n")
+
+    written = [os.path.basename(path)[:-4] for path in changed]
+
+    return written, len(colors) - len(written), removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the color swatch SVGs and the colors.svg sprite sheet.")
+    parser.add_argument("--database", default=DATABASE_PATH, help="lighting.db to read the colors from")
+    parser.add_argument("--output-dir", default=ASSETS_DIR, help="assets directory")
+    parser.add_argument("--workers", type=int, help="parallel writers (default: the executor's default)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written, unchanged, removed = build(args.database, args.output_dir, args.workers)
+    print(f"Wrote {len(written)} svg files, {unchanged} unchanged, {len(removed)} removed "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms.")
@@ -0,0 +1,30 @@
+import os
+import sys
+import shutil
+import sqlite3
+import pytest
+
+# the controller modules import each other by name, and never touch the hardware under test
+# (the build scripts are imported by name too)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "py"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+os.environ.setdefault("PWM_BACKEND", "simulated")
+os.environ.setdefault("METRICS_ADDRESS", "")
+
+LIGHTING_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "db", "lighting.db")
+
+
+@pytest.fixture
+def database(tmp_path):
+    # a copy of the shipped lighting.db, so tests can write to it
+    path = str(tmp_path / "lighting.db")
+    shutil.copy(LIGHTING_DB, path)
+
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    conn = sqlite3.connect(database)
+    yield conn
+    conn.close()
@@ -0,0 +1,32 @@
+import backend
+import pytest
+
+
+@pytest.mark.parametrize("value", [0x0010, 0x1234, 0x8000, 0xfff0, 0xfffe])
+def test_duty_cycle_round_trip_keeps_the_top_12_bits(value):
+    assert backend.decode_duty_cycle(*backend.encode_duty_cycle(value)) == value & 0xfff0
+
+
+def test_full_on_and_full_off_use_bit_12():
+    assert backend.encode_duty_cycle(0xffff) == (0x1000, 0)
+    assert backend.encode_duty_cycle(0x000f) == (0, 0x1000)
+    assert backend.decode_duty_cycle(0x1000, 0) == 0xffff
+    assert backend.decode_duty_cycle(0, 0x1000) == 0
+
+
+@pytest.mark.parametrize("value", [-1, 0x10000])
+def test_out_of_range_duty_cycle(value):
+    with pytest.raises(ValueError):
+        backend.encode_duty_cycle(value)
+
+
+def test_write_frame_is_one_transaction():
+    pwm = backend.SimulatedPCA9685()
+    pwm.frequency = 1600
+    transactions = pwm.i2c_device.transactions
+
+    backend.write_frame(pwm, [0xffff, 0x8000, 0], first_channel=3)
+
+    assert pwm.i2c_device.transactions == transactions + 1
+    assert [pwm.channels[channel].duty_cycle for channel in (3, 4, 5)] == [0xffff, 0x8000, 0]
+    assert pwm.channels[0].duty_cycle == 0
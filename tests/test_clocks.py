@@ -0,0 +1,54 @@
+import time
+import clocks
+import backend
+import pytest
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    # every time the system clock would have been stepped to
+    steps = []
+    monkeypatch.setattr(backend, "set_system_clock", lambda seconds, backend=None: steps.append(seconds))
+
+    return steps
+
+
+# the RTC only counts whole seconds, so up to another second of drift is read on top of the offset
+@pytest.mark.parametrize("drift, stepped", [(0.0, False), (1.0, False), (-1.0, False), (30.0, True), (-30.0, True)])
+def test_system_clock_is_only_stepped_past_the_tolerance(conn, steps, drift, stepped):
+    rtc = backend.SimulatedRTC()
+    rtc.offset = drift
+
+    clocks.sync_clocks(rtc, conn)
+
+    assert bool(steps) == stepped
+    if stepped:
+        assert abs(steps[0] - (time.time() + drift)) < 2.0
+
+
+def test_sync_saves_the_time_but_never_over_a_pending_change(conn, steps):
+    rtc = backend.SimulatedRTC()
+    now = rtc.datetime
+
+    conn.execute("UPDATE clock SET change = 0")
+    clocks.sync_clocks(rtc, conn)
+    assert conn.execute("SELECT year, month, day, change FROM clock").fetchone() == (
+        now.tm_year, now.tm_mon, now.tm_mday, 0)
+
+    conn.execute("UPDATE clock SET year = 2000, change = 1")
+    conn.commit()
+    clocks.sync_clocks(rtc, conn)
+    assert conn.execute("SELECT year FROM clock").fetchone()[0] == 2000
+
+
+def test_time_entered_in_the_web_application_is_applied_once(conn, steps):
+    rtc = backend.SimulatedRTC()
+    conn.execute("UPDATE clock SET year = 2030, month = 6, day = 15, hour = 8, minute = 30, change = 1")
+    conn.commit()
+
+    assert clocks.apply_clock_change(rtc, conn)
+    assert rtc.datetime[:4] == (2030, 6, 15, 8)
+    assert steps == [time.mktime((2030, 6, 15, 8, 30, 0, 5, 166, -1))]
+    assert conn.execute("SELECT change FROM clock").fetchone()[0] == 0
+
+    assert not clocks.apply_clock_change(rtc, conn)
@@ -0,0 +1,44 @@
+import config
+import struct
+import sqlite3
+
+
+def inotify_event(name):
+    # one inotify_event struct (wd, mask, cookie, len, name padded with nulls)
+    data = name.encode() + b"\0" * (16 - len(name) % 16)
+
+    return struct.pack("iIII", 1, config.IN_MODIFY, 0, len(data)) + data
+
+
+def test_only_commits_from_other_connections_are_changes(database, conn):
+    watcher = config.ConfigWatcher(conn, database)
+
+    # nothing has been read yet
+    assert watcher.changed()
+    assert not watcher.changed()
+
+    # the controller's own commit touches the files but doesn't move data_version
+    conn.execute("UPDATE testmode SET speed = speed + 1")
+    conn.commit()
+    assert not watcher.changed()
+
+    web = sqlite3.connect(database)
+    web.execute("UPDATE testmode SET speed = speed + 1")
+    web.commit()
+    web.close()
+    assert watcher.changed()
+    assert not watcher.changed()
+
+
+def test_forget_reports_a_change(database, conn):
+    watcher = config.ConfigWatcher(conn, database)
+    watcher.changed()
+
+    watcher.forget()
+    assert watcher.changed()
+
+
+def test_database_event_only_matches_the_database_files():
+    assert config.ConfigWatcher.database_event(inotify_event("lighting.db-wal"), "lighting.db")
+    assert not config.ConfigWatcher.database_event(inotify_event("factory_settings.db"), "lighting.db")
+    assert config.ConfigWatcher.database_event(inotify_event("other") + inotify_event("lighting.db"), "lighting.db")
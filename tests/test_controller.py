@@ -0,0 +1,265 @@
+import time
+import zones
+import config
+import writer
+import sqlite3
+import scenes
+import datetime
+import simulate
+import controller
+import asyncio
+import pytest
+
+# a Monday at noon
+NOON = datetime.datetime(2026, 11, 2, 12, 0)
+
+
+class ImmediateWriter:
+    # stands in for writer.DatabaseWriter and commits every write straight away
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def update(self, key, sql, parameters=()):
+        self.conn.execute(sql, parameters)
+        self.conn.commit()
+
+    def discard(self, key):
+        pass
+
+
+class DeferredWriter:
+    # stands in for writer.DatabaseWriter and keeps every write queued until flush()
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.pending = {}
+
+    def update(self, key, sql, parameters=()):
+        self.pending[key] = (sql, parameters)
+
+    def discard(self, key):
+        self.pending.pop(key, None)
+
+    def flush(self):
+        for sql, parameters in self.pending.values():
+            self.conn.execute(sql, parameters)
+        self.conn.commit()
+        self.pending = {}
+
+
+def make_core(conn, moment=NOON, db_writer=None):
+    cursor = conn.cursor()
+    lighting = simulate.SceneLog()
+    core = controller.ControlCore(cursor, db_writer or ImmediateWriter(conn), None, scenes.SceneCache(),
+                                  simulate.ScriptedInputs(), lighting, zones.read_zones(cursor), None, None,
+                                  clock=simulate.VirtualClock(moment))
+
+    return core, lighting
+
+
+def start_test(conn, behavior):
+    # what the web application's test button writes
+    conn.execute("UPDATE testmode SET flag = 1, reload = 1, behavior = ?, brightness = 5, speed = 3, color0 = 1",
+                 (behavior,))
+    conn.commit()
+
+
+def reload(core):
+    # what the config task does when another connection has committed
+    core.settings, core.schedule = controller.reload_settings(core.cursor, core.scene_cache, core.db_writer)
+    core.check_test_mode()
+
+
+@pytest.fixture
+def open_all_day(conn):
+    conn.execute("UPDATE time SET open_hour = 0, open_minute = 0, close_hour = 23, close_minute = 59")
+    conn.execute("DELETE FROM events")
+    conn.commit()
+
+
+@pytest.mark.parametrize("change", ["behavior = 'bogus'", "color0 = 999"])
+def test_bad_test_scene_ends_test_mode(conn, open_all_day, change):
+    conn.execute(f"UPDATE testmode SET flag = 1, reload = 1, {change}")
+    conn.commit()
+
+    core, lighting = make_core(conn)
+    core.check_test_mode()
+    core.update("startup")
+
+    # the row is reset so it isn't retried, and the lighting hierarchy carries on
+    assert conn.execute("SELECT flag, reload FROM testmode").fetchone() == (0, 0)
+    assert core.test_scene is None
+    assert core.test_timeout is None
+    assert lighting.plays[-1][0].scene_id == core.settings.default_id
+
+
+def test_bad_default_scene_shows_lights_off(conn, open_all_day):
+    conn.execute("UPDATE scenes SET behavior = 'bogus' WHERE is_default = 1")
+    conn.commit()
+
+    core, lighting = make_core(conn)
+    core.update("startup")
+
+    assert all(scene is core.off_scene for scene in lighting.plays[-1])
+
+
+def test_missing_default_scene_shows_lights_off(conn, open_all_day):
+    conn.execute("UPDATE scenes SET is_default = 0")
+    conn.commit()
+
+    core, lighting = make_core(conn)
+    core.update("startup")
+
+    assert all(scene is core.off_scene for scene in lighting.plays[-1])
+
+
+def test_bad_connection_scene_shows_lights_off(conn, open_all_day):
+    scene_id = conn.execute("SELECT scene FROM connections WHERE connection_id = 1").fetchone()[0]
+    conn.execute("UPDATE scenes SET color0 = 999 WHERE scene_id = ?", (scene_id,))
+    conn.commit()
+
+    core, lighting = make_core(conn)
+    core.input_bus.active[0] = True
+    core.update("input")
+
+    assert all(scene is core.off_scene for scene in lighting.plays[-1])
+    assert core.active_connection == 1
+
+
+def test_test_scene_written_while_reset_is_queued_is_shown(database, conn, open_all_day):
+    web = sqlite3.connect(database)
+    db_writer = DeferredWriter(conn)
+    core, lighting = make_core(conn, db_writer=db_writer)
+
+    async def scenario():
+        start_test(web, "sequence_solid")
+        reload(core)
+        assert core.test_scene.behavior == "sequence_solid"
+
+        # the web application sends another scene before the controller's reload reset is committed
+        start_test(web, "sequence_fade")
+        db_writer.flush()
+        assert conn.execute("SELECT reload FROM testmode").fetchone()[0] == 1
+
+        reload(core)
+        assert core.test_scene.behavior == "sequence_fade"
+        db_writer.flush()
+        assert conn.execute("SELECT flag, reload FROM testmode").fetchone() == (1, 0)
+        core.test_timeout.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_timeout_does_not_end_a_newer_test_scene(database, conn, open_all_day):
+    web = sqlite3.connect(database)
+    db_writer = DeferredWriter(conn)
+    core, lighting = make_core(conn, db_writer=db_writer)
+
+    async def scenario():
+        start_test(web, "sequence_solid")
+        reload(core)
+        db_writer.flush()
+
+        # test mode times out while the web application starts another test
+        controller.TEST_MODE_TIME, time_limit = 0, controller.TEST_MODE_TIME
+        try:
+            core.restart_test_timeout()
+            await core.test_timeout
+        finally:
+            controller.TEST_MODE_TIME = time_limit
+        start_test(web, "sequence_fade")
+        db_writer.flush()
+        assert conn.execute("SELECT flag, reload FROM testmode").fetchone() == (1, 1)
+
+        reload(core)
+        assert core.test_scene.behavior == "sequence_fade"
+        core.test_timeout.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_writer_commit_does_not_reload(database, conn, open_all_day):
+    db_writer = writer.DatabaseWriter(database, batch_time=0.01)
+    core, lighting = make_core(conn, db_writer=db_writer)
+    core.watcher = config.ConfigWatcher(conn, database)
+    core.watcher.changed()
+
+    # the writer thread marks a connection active, which is a commit from another connection
+    controller.set_active_connections(db_writer, 2)
+    end = time.monotonic() + 2.0
+    while conn.execute("SELECT is_active FROM connections WHERE connection_id = 2").fetchone()[0] != 1:
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.01)
+
+    assert core.watcher.changed()
+    assert not core.reload_config()
+
+    # a scene changed by the web application still reloads
+    web = sqlite3.connect(database)
+    web.execute("UPDATE scenes SET speed = speed % 5 + 1 WHERE is_default = 1")
+    web.commit()
+
+    assert core.watcher.changed()
+    assert core.reload_config()
+
+
+def shown(lighting):
+    # scene_id on every zone after the last update (None for lights off)
+    return [scene.scene_id for scene in lighting.plays[-1]]
+
+
+def test_default_scene_while_open(conn, open_all_day):
+    core, lighting = make_core(conn)
+    core.update("startup")
+
+    assert shown(lighting) == [core.settings.default_id]
+
+
+def test_event_scene_while_open(conn, open_all_day):
+    conn.execute("INSERT INTO events (scene, date) VALUES (10, ?)", (NOON.date().isoformat(),))
+    conn.commit()
+
+    core, lighting = make_core(conn)
+    core.update("startup")
+
+    assert shown(lighting) == [10]
+
+
+def test_lights_off_while_closed_even_on_an_event(conn):
+    conn.execute("UPDATE time SET open_hour = 0, open_minute = 0, close_hour = 0, close_minute = 0")
+    conn.execute("INSERT INTO events (scene, date) VALUES (10, ?)", (NOON.date().isoformat(),))
+    conn.commit()
+
+    core, lighting = make_core(conn)
+    core.update("startup")
+
+    assert all(scene is core.off_scene for scene in lighting.plays[-1])
+
+
+def test_lowest_connection_beats_closed_hours(conn):
+    conn.execute("UPDATE time SET open_hour = 0, open_minute = 0, close_hour = 0, close_minute = 0")
+    conn.commit()
+
+    core, lighting = make_core(conn)
+    core.input_bus.active[1] = True
+    core.input_bus.active[2] = True
+    core.update("input")
+
+    assert shown(lighting) == [core.settings.connection_scenes[1]]
+    assert core.active_connection == 2
+
+
+def test_test_scene_beats_connections(conn, open_all_day):
+    start_test(conn, "sequence_fade")
+
+    core, lighting = make_core(conn)
+    core.input_bus.active[0] = True
+
+    async def scenario():
+        core.check_test_mode()
+        core.update("startup")
+        assert lighting.plays[-1][0] is core.test_scene
+        core.test_timeout.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+import numpy
+import frames
+import backend
+
+
+class RecordingDevice:
+    # stands in for a PCA9685's I2C device and keeps every transaction
+
+    def __init__(self):
+        self.buffers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def write(self, buf, start=0, end=None):
+        self.buffers.append(bytes(buf[start:end]))
+
+
+class RecordingPWM:
+    def __init__(self):
+        self.i2c_device = RecordingDevice()
+
+
+def test_pack_frames_matches_write_frame():
+    # (colors, steps, channels), with the full on, full off and 12-bit edge cases
+    scene_frames = numpy.array([[[0xffff, 0x0000, 0x000f], [0x0010, 0x1234, 0xfff0]],
+                                [[0x8000, 0xfffe, 0x0001], [0x4321, 0x0f0f, 0xffff]]], dtype=numpy.uint16)
+    packed = frames.pack_frames(scene_frames, backend.LED0_ON_L)
+
+    pwm = RecordingPWM()
+    for color in scene_frames:
+        for frame in color:
+            backend.write_frame(pwm, [int(value) for value in frame])
+
+    assert [row.tobytes() for color in packed for row in color] == pwm.i2c_device.buffers
@@ -0,0 +1,44 @@
+import os
+import time
+import fubar
+import shutil
+import sqlite3
+import controller
+
+FACTORY_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "db", "factory_settings.db")
+
+
+def test_reset_clears_users_without_restoring_any(database, conn, tmp_path, monkeypatch):
+    factory = str(tmp_path / "factory_settings.db")
+    shutil.copy(FACTORY_DB, factory)
+    monkeypatch.setattr(fubar, "DATABASE_PATH", database)
+    monkeypatch.setattr(fubar, "FACTORY_PATH", factory)
+
+    conn.execute("INSERT INTO users (username, password) VALUES ('owner', 'hash')")
+    conn.execute("UPDATE scenes SET speed = speed % 5 + 1")
+    conn.commit()
+    with sqlite3.connect(factory) as factory_conn:
+        factory_conn.execute("INSERT INTO users (username, password) VALUES ('factory', 'hash')")
+
+    fubar.restore_factory_settings()
+
+    # every account is gone, including the one in the factory database
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+    assert conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'users'").fetchone()[0] == 0
+
+    # the settings tables are the factory ones again
+    with sqlite3.connect(factory) as factory_conn:
+        assert (conn.execute("SELECT * FROM scenes ORDER BY scene_id").fetchall()
+                == factory_conn.execute("SELECT * FROM scenes ORDER BY scene_id").fetchall())
+
+
+def test_reset_start_reaches_the_controller_once(tmp_path, monkeypatch):
+    stamp = str(tmp_path / "reset.stamp")
+    monkeypatch.setattr(fubar, "RESET_STAMP", stamp)
+    monkeypatch.setattr(controller, "RESET_STAMP", stamp)
+
+    start = time.monotonic()
+    fubar.write_reset_stamp(start)
+
+    assert controller.read_reset_start() == start
+    assert controller.read_reset_start() is None
@@ -0,0 +1,40 @@
+import time
+import scenes
+import inputs
+import backend
+import metrics
+import renderer
+import threading
+
+HEXVALS = {1: "ff0000"}
+
+
+def latency_totals():
+    # (count, sum) of the edge to first frame histogram
+    series = metrics.INPUT_LATENCY.values.get(())
+    return (0, 0.0) if series is None else (series[1], series[2])
+
+
+def test_edge_to_first_frame_latency_is_observed():
+    wake = threading.Event()
+    input_bus = inputs.InputBus(wake, pins=[22, 10])
+    lights = renderer.Renderer({0x40: backend.SimulatedPCA9685()})
+    count, total = latency_totals()
+
+    # the simulated pin fires the same callback gpiozero would
+    input_bus.inputs[1].drive(1)
+    assert wake.is_set()
+    assert input_bus.states() == [0, 1]
+
+    scene = scenes.build_scene(2, ("sequence_solid", 5, 3, 1) + (None,) * 9, HEXVALS)
+    edge_time = input_bus.take_edge()
+    lights.play(scene, input_bus=input_bus, edge_time=edge_time)
+
+    end = time.monotonic() + 2.0
+    while latency_totals()[0] == count and time.monotonic() < end:
+        time.sleep(0.005)
+    lights.stop()
+
+    assert latency_totals()[0] == count + 1
+    assert 0.0 < latency_totals()[1] - total < 1.0
+    assert input_bus.take_edge() is None
@@ -0,0 +1,63 @@
+import re
+import metrics
+import threading
+
+# one sample line of the Prometheus text format
+SAMPLE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? -?[0-9.e+-]+$')
+
+
+def test_counter_lines():
+    counter = metrics.Counter("test_total", "Things counted.", ("kind",))
+    counter.inc("a")
+    counter.inc("a", amount=2)
+    counter.inc("b")
+
+    assert list(counter.lines()) == ["# HELP test_total Things counted.", "# TYPE test_total counter",
+                                     'test_total{kind="a"} 3', 'test_total{kind="b"} 1']
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "Time taken.", (0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert list(histogram.lines())[2:] == ['test_seconds_bucket{le="0.1"} 2', 'test_seconds_bucket{le="1.0"} 3',
+                                           'test_seconds_bucket{le="+Inf"} 4', "test_seconds_count 4",
+                                           "test_seconds_sum 2.65"]
+
+
+def test_updates_from_several_threads_are_all_counted():
+    counter = metrics.Counter("test_total", "Things counted.")
+    histogram = metrics.Histogram("test_seconds", "Time taken.", (0.1, 1.0))
+
+    def work():
+        for _ in range(10000):
+            counter.inc()
+            histogram.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert list(counter.lines())[-1] == "test_total 80000"
+    assert "test_seconds_count 80000" in list(histogram.lines())
+
+
+def test_exposition_format():
+    metrics.QUERY_TIME.observe(0.001, "SELECT scenes")
+    lines = metrics.exposition().splitlines()
+
+    for metric in metrics.REGISTRY:
+        assert f"# TYPE {metric.name} {type(metric).__name__.lower()}" in lines
+    for line in lines:
+        assert line.startswith(("# HELP ", "# TYPE ")) or SAMPLE.match(line), line
+    assert any(line.startswith('lighting_sqlite_query_seconds_count{statement="SELECT scenes"}') for line in lines)
+
+
+def test_statement_label():
+    assert metrics.statement_label("SELECT flag, reload FROM testmode") == "SELECT testmode"
+    assert metrics.statement_label("UPDATE connections SET is_active = 0") == "UPDATE connections"
+    assert metrics.statement_label("INSERT INTO scenes VALUES (?)") == "INSERT scenes"
+    assert metrics.statement_label("PRAGMA busy_timeout = 5000;") == "PRAGMA"
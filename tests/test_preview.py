@@ -0,0 +1,75 @@
+import os
+import grp
+import json
+import stat
+import scenes
+import pytest
+import asyncio
+import preview
+
+
+def message(**changes):
+    fields = {"behavior": "sequence_fade", "brightness": 4, "speed": 2, "colors": [3, None, 7]}
+    fields.update(changes)
+
+    return json.dumps(fields)
+
+
+def test_valid_preview_is_a_testmode_row():
+    assert preview.parse_preview(message()) == ("sequence_fade", 4, 2, 3, None, 7) + (None,) * 7
+
+
+@pytest.mark.parametrize("line", [
+    "not json",
+    "[1, 2]",
+    message(behavior="bogus"),
+    message(behavior=None),
+    message(brightness=6),
+    message(brightness="5"),
+    message(brightness=True),
+    message(speed=0),
+    message(speed=2.5),
+    message(colors=1),
+    message(colors=list(range(1, 12))),
+    message(colors=["red"]),
+    message(colors=[1.0]),
+    message(colors=[None, None]),
+    message(colors=[]),
+])
+def test_malformed_previews_are_rejected(line):
+    with pytest.raises(ValueError):
+        preview.parse_preview(line)
+
+
+def send(path, line):
+    # what includes/preview.php does: one line out, one line back
+    async def exchange():
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(line.encode() + b"\n")
+        reply = await reader.readline()
+        writer.close()
+        return reply.decode().strip()
+
+    return exchange()
+
+
+def test_unknown_color_is_sent_back_as_an_error(conn, tmp_path):
+    cache = scenes.SceneCache()
+    cache.refresh(conn.cursor())
+    path = str(tmp_path / "preview.sock")
+    group = grp.getgrgid(os.getgid()).gr_name
+
+    async def scenario():
+        server = await preview.serve(path, lambda row, received: cache.build(row), group)
+
+        # only the controller's user and the web application's group can connect
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o660
+        assert os.stat(path).st_gid == os.getgid()
+
+        assert await send(path, message(colors=[999])) == "error unknown color id 999"
+        assert await send(path, message()) == "ok"
+
+        preview.close(server, path)
+        assert not os.path.exists(path)
+
+    asyncio.run(scenario())
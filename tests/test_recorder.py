@@ -0,0 +1,56 @@
+import replay
+import backend
+import recorder
+
+
+def ring_size(records):
+    # FRAME_RECORDING_SIZE (MiB) for a ring of exactly this many records
+    return (recorder.HEADER_SIZE + records * recorder.RECORD.size) / (1024 * 1024)
+
+
+def burst(duty_cycles, first_channel=0):
+    record = recorder.Record(0.0, 0.0, 0x40, first_channel, [], [], duty_cycles)
+
+    return bytes(replay.build_burst(record))
+
+
+def test_ring_keeps_the_newest_records(tmp_path):
+    path = str(tmp_path / "frames.ring")
+    ring = recorder.Recorder(path, ring_size(3))
+    for i in range(5):
+        ring.record(0x40, burst([i << 4, 0xffff, 0]), 0, [(9, "sequence_solid")])
+
+    records = recorder.read_recording(path)
+
+    assert [record.duty_cycles[0] for record in records] == [2 << 4, 3 << 4, 4 << 4]
+    assert all(record.scene_ids == [9] and record.behaviors == ["sequence_solid"] for record in records)
+
+
+def test_ring_carries_on_after_a_restart(tmp_path):
+    path = str(tmp_path / "frames.ring")
+    recorder.Recorder(path, ring_size(3)).record(0x40, burst([0x1000]), 0, [(None, None)])
+    recorder.Recorder(path, ring_size(3)).record(0x41, burst([0x2000]), 0, [(1, "sequence_fade")])
+
+    records = recorder.read_recording(path)
+
+    assert [(record.board, record.duty_cycles) for record in records] == [(0x40, [0x1000]), (0x41, [0x2000])]
+    assert records[0].scene_ids == [None] and records[0].behaviors == [None]
+
+
+def test_replay_writes_the_recorded_bursts(tmp_path, monkeypatch):
+    path = str(tmp_path / "frames.ring")
+    ring = recorder.Recorder(path, ring_size(10))
+    bursts = [burst([0xffff, 0x8000, 0x0000], 3), burst([0x1230, 0x0000, 0xffff], 3)]
+    for data in bursts:
+        ring.record(0x41, data, 3, [(9, "sequence_solid")])
+
+    records = recorder.read_recording(path)
+    assert [bytes(replay.build_burst(record)) for record in records] == bursts
+
+    pwms = []
+    monkeypatch.setattr(backend, "create_pwm", lambda name, address: pwms.append(
+        backend.SimulatedPCA9685(address=address)) or pwms[-1])
+    replay.replay(records, "simulated", speed=1000.0)
+
+    assert [pwm.address for pwm in pwms] == [0x41]
+    assert [pwms[0].channels[channel].duty_cycle for channel in (3, 4, 5)] == [0x1230, 0x0000, 0xffff]
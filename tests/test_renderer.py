@@ -0,0 +1,67 @@
+import time
+import scenes
+import renderer
+
+# two colors, so the phase includes which color is showing
+HEXVALS = {1: "ff0000", 2: "00ff00"}
+
+
+def build(brightness, speed):
+    return scenes.build_scene(1, ("sequence_fade", brightness, speed, 1, 2) + (None,) * 8, HEXVALS)
+
+
+def playing(scene, color, step, elapsed):
+    # a player showing (color, step) of scene, elapsed seconds into that step's slot
+    player = renderer.ZonePlayer(scene, time.monotonic())
+    player.shown = color, step
+    player.color, player.step = color, step + 1
+    player.deadline.deadline = time.monotonic() + scene.durations[step] - elapsed
+
+    return player
+
+
+def test_brightness_change_keeps_the_step():
+    old, new = build(5, 3), build(2, 3)
+    step = len(old.durations) // 2
+    player = playing(old, 1, step, 0.0)
+    deadline = player.deadline.deadline
+
+    transaction, frame = player.swap(new)
+
+    assert transaction == new.transactions[1][step]
+    assert (frame == new.scene_frames[1][step]).all()
+    assert (player.color, player.step) == (1, step + 1)
+    assert player.deadline.deadline == deadline
+
+
+def test_speed_change_keeps_the_fraction_of_the_cycle():
+    old, new = build(5, 3), build(5, 5)
+    assert len(old.durations) > 1 and old.durations != new.durations
+
+    step = len(old.durations) // 2
+    player = playing(old, 1, step, old.durations[step] / 2)
+    fraction = (sum(old.durations[:step]) + old.durations[step] / 2) / sum(old.durations)
+
+    player.swap(new)
+
+    # the new step covers the same fraction of the color's cycle, and ends when it would have
+    color, new_step = player.shown
+    position = fraction * sum(new.durations)
+    assert color == 1
+    assert sum(new.durations[:new_step]) <= position < sum(new.durations[:new_step + 1])
+    assert abs(player.deadline.deadline - time.monotonic() - (sum(new.durations[:new_step + 1]) - position)) < 0.01
+
+
+def test_swap_before_the_first_frame_shows_nothing():
+    player = renderer.ZonePlayer(build(5, 3), time.monotonic())
+
+    assert player.swap(build(2, 3)) is None
+    assert player.scene.dimmer == build(2, 3).dimmer
+
+
+def test_swap_during_a_crossfade_lands_on_the_new_version():
+    old, new = build(5, 3), build(2, 3)
+    player = renderer.ZonePlayer(old, time.monotonic(), then=old)
+
+    assert player.swap(new) is None
+    assert player.target is new
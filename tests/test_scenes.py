@@ -0,0 +1,53 @@
+import scenes
+import pytest
+
+
+@pytest.fixture
+def cache(conn):
+    cache = scenes.SceneCache()
+    cache.refresh(conn.cursor())
+
+    return cache
+
+
+def test_compiled_scenes_are_kept_until_their_row_changes(conn, cache):
+    scene = cache.get(9)
+    assert cache.get(9) is scene
+
+    # another scene's row changing doesn't touch scene 9
+    conn.execute("UPDATE scenes SET brightness = 1 WHERE scene_id = 10")
+    conn.commit()
+    cache.refresh(conn.cursor())
+    assert cache.get(9) is scene
+
+    conn.execute("UPDATE scenes SET brightness = 1 WHERE scene_id = 9")
+    conn.commit()
+    cache.refresh(conn.cursor())
+    assert cache.get(9) is not scene
+    assert cache.get(9).dimmer == int(0x3333 * 4)
+
+
+def test_compiled_scenes_are_dropped_when_their_colors_change(conn, cache):
+    scene = cache.get(9)
+    other = next(scene_id for scene_id, row in cache.rows.items() if scene_id != 9
+                 and not set(scenes.row_color_ids(row)) & set(scenes.row_color_ids(cache.rows[9])))
+    unrelated = cache.get(other)
+    color_id = scenes.row_color_ids(cache.rows[9])[0]
+
+    conn.execute("UPDATE colors SET hexval = '123456' WHERE color_id = ?", (color_id,))
+    conn.commit()
+    cache.refresh(conn.cursor())
+
+    assert cache.get(9) is not scene
+    assert cache.get(9).color_list[0] == scenes.hex_to_color("123456")
+    assert cache.get(other) is unrelated
+
+
+def test_deleted_scene_is_unknown(conn, cache):
+    cache.get(9)
+    conn.execute("DELETE FROM scenes WHERE scene_id = 9")
+    conn.commit()
+    cache.refresh(conn.cursor())
+
+    with pytest.raises(ValueError):
+        cache.get(9)
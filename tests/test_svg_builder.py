@@ -0,0 +1,40 @@
+import os
+import svg_builder
+
+
+def test_only_changed_swatches_are_written(database, conn, tmp_path):
+    assets = str(tmp_path / "assets")
+    written, unchanged, removed = svg_builder.build(database, assets)
+    colors = conn.execute("SELECT name, hexval FROM colors ORDER BY color_id").fetchall()
+
+    assert sorted(written) == sorted(name for name, _ in colors)
+    assert (unchanged, removed) == (0, [])
+    assert os.path.exists(os.path.join(assets, "colors.svg"))
+
+    # nothing changed, nothing is written
+    assert svg_builder.build(database, assets) == ([], len(colors), [])
+
+    name = colors[0][0]
+    conn.execute("UPDATE colors SET hexval = '123456' WHERE name = ?", (name,))
+    conn.commit()
+    assert svg_builder.build(database, assets) == ([name], len(colors) - 1, [])
+    with open(os.path.join(assets, "colors", f"{name}.svg")) as file:
+        assert 'fill="#123456"' in file.read()
+    with open(os.path.join(assets, "colors.svg")) as file:
+        assert 'fill="#123456"' in file.read()
+
+
+def test_missing_swatches_are_rewritten_and_stale_ones_removed(database, conn, tmp_path):
+    assets = str(tmp_path / "assets")
+    svg_builder.build(database, assets)
+    first, second = [row[0] for row in conn.execute("SELECT name FROM colors ORDER BY color_id LIMIT 2")]
+
+    os.unlink(os.path.join(assets, "colors", f"{first}.svg"))
+    conn.execute("UPDATE colors SET name = 'renamed' WHERE name = ?", (second,))
+    conn.commit()
+    written, _, removed = svg_builder.build(database, assets)
+
+    assert sorted(written) == sorted([first, "renamed"])
+    assert removed == [second]
+    assert not os.path.exists(os.path.join(assets, "colors", f"{second}.svg"))
+    assert os.path.exists(os.path.join(assets, "colors", "renamed.svg"))
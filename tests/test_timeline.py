@@ -0,0 +1,65 @@
+import datetime
+import timeline
+
+# a Monday
+MONDAY = datetime.date(2026, 11, 2)
+
+
+def at(day, hour, minute=0):
+    # day is the number of days after MONDAY
+    return datetime.datetime.combine(MONDAY + datetime.timedelta(days=day), datetime.time(hour, minute))
+
+
+def test_normal_hours():
+    schedule = timeline.Timeline([(9, 0, 17, 0)] * 7, [], [])
+
+    assert schedule.state(at(0, 8, 59)) == (False, None)
+    assert schedule.state(at(0, 9)) == (True, None)
+    assert schedule.state(at(0, 17)) == (False, None)
+    assert schedule.next_transition(at(0, 12)) == at(0, 17)
+    assert schedule.next_transition(at(0, 17)) == at(1, 9)
+
+
+def test_overnight_hours_close_after_midnight():
+    schedule = timeline.Timeline([(22, 0, 2, 0)] * 7, [], [])
+
+    assert schedule.state(at(0, 23)) == (True, None)
+    assert schedule.state(at(1, 1)) == (True, None)
+    assert schedule.next_transition(at(0, 23)) == at(1, 2)
+
+
+def test_event_starts_at_midnight_while_open():
+    schedule = timeline.Timeline([(22, 0, 2, 0)] * 7, [10], [MONDAY.isoformat()])
+
+    assert schedule.state(at(0, 23)) == (True, 10)
+    assert schedule.next_transition(at(0, 23)) == at(1, 0)
+    assert schedule.state(at(1, 0)) == (True, None)
+
+
+def test_event_only_shows_while_open():
+    schedule = timeline.Timeline([(9, 0, 17, 0)] * 7, [10], [at(1, 0).date().isoformat()])
+
+    assert schedule.state(at(1, 8)) == (False, None)
+    assert schedule.next_transition(at(0, 20)) == at(1, 9)
+    assert schedule.state(at(1, 9)) == (True, 10)
+
+
+def test_first_event_listed_for_a_date_wins():
+    schedule = timeline.Timeline([(9, 0, 17, 0)] * 7, [10, 11], [MONDAY.isoformat()] * 2)
+
+    assert schedule.state(at(0, 12)) == (True, 10)
+
+
+def test_closed_days_are_skipped():
+    hours = [(9, 0, 17, 0)] + [(0, 0, 0, 0)] * 6
+    schedule = timeline.Timeline(hours, [], [])
+
+    assert schedule.next_transition(at(0, 17)) == at(7, 9)
+
+
+def test_schedule_that_never_changes_sleeps_for_the_limit():
+    schedule = timeline.Timeline([(0, 0, 0, 0)] * 7, [], [])
+
+    assert schedule.next_transition(at(0, 12)) is None
+    assert schedule.seconds_until_next(at(0, 12), 60.0) == 60.0
+    assert timeline.Timeline([(9, 0, 17, 0)] * 7, [], []).seconds_until_next(at(0, 16, 59), 300.0) == 60.0
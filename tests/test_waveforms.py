@@ -0,0 +1,49 @@
+import numpy
+import pytest
+import waveforms
+import build_fade_lookup
+import build_decay_lookup
+import build_breathe_lookup
+
+
+def test_write_and_read_round_trip(tmp_path):
+    curves = {1: numpy.arange(0, 100), 3: numpy.array([0, 0xffff, 0x1234])}
+    path = waveforms.write_table("test", curves, str(tmp_path))
+
+    table = waveforms.read_table(path)
+
+    assert sorted(table) == [1, 3]
+    assert table[1].tolist() == list(range(100))
+    assert table[3].tolist() == [0, 0xffff, 0x1234]
+    assert not table[1].flags.writeable
+
+
+def test_samples_outside_16_bits_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        waveforms.write_table("test", {1: numpy.array([0, 0x10000])}, str(tmp_path))
+
+
+def test_other_files_and_versions_are_rejected(tmp_path):
+    path = tmp_path / "test.u16"
+    path.write_bytes(b"not a table at all")
+    with pytest.raises(ValueError, match="not a waveform table"):
+        waveforms.read_table(str(path))
+
+    path = waveforms.write_table("test", {1: numpy.arange(3)}, str(tmp_path))
+    with open(path, "r+b") as file:
+        file.write(waveforms.HEADER.pack(waveforms.MAGIC, waveforms.TABLE_VERSION + 1, 1))
+    with pytest.raises(ValueError, match="table version"):
+        waveforms.read_table(path)
+
+
+@pytest.mark.parametrize("name, curve", [
+    ("fade", build_fade_lookup.fade_curve),
+    ("decay", build_decay_lookup.decay_curve),
+    ("breathe", build_breathe_lookup.breathe_curve),
+])
+def test_shipped_tables_match_the_build_scripts(name, curve):
+    table = waveforms.load_table(name)
+
+    assert sorted(table) == waveforms.CYCLE_TIMES
+    for cycle_time in waveforms.CYCLE_TIMES:
+        assert table[cycle_time].tolist() == numpy.asarray(curve(cycle_time)).astype("<u2").tolist()
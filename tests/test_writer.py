@@ -0,0 +1,71 @@
+import time
+import writer
+import sqlite3
+import pytest
+
+
+def wait_for(condition, timeout=2.0):
+    # poll until the writer thread has done its part
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.01)
+
+
+def test_writes_with_the_same_key_are_coalesced(database, conn):
+    db_writer = writer.DatabaseWriter(database, batch_time=0.2)
+    for speed in range(1, 4):
+        db_writer.update("testmode.speed", "UPDATE testmode SET speed = ?", (speed,))
+    db_writer.update("testmode.brightness", "UPDATE testmode SET brightness = ?", (1,))
+
+    # only the newest write per key is kept
+    assert db_writer.pending["testmode.speed"].parameters == (3,)
+    assert len(db_writer.pending) == 2
+
+    wait_for(lambda: conn.execute("SELECT speed, brightness FROM testmode").fetchone() == (3, 1))
+
+
+def test_discard_drops_a_queued_write(database, conn):
+    db_writer = writer.DatabaseWriter(database, batch_time=0.2)
+    db_writer.update("testmode.speed", "UPDATE testmode SET speed = ?", (1,))
+    db_writer.discard("testmode.speed")
+
+    assert db_writer.pending == {}
+
+
+def test_failed_batch_is_rolled_back(conn):
+    db_writer = writer.DatabaseWriter.__new__(writer.DatabaseWriter)
+    writes = [writer.Write("UPDATE testmode SET speed = 1", ()), writer.Write("UPDATE missing SET x = 1", ())]
+
+    with pytest.raises(sqlite3.Error):
+        db_writer.commit(conn, writes)
+
+    assert not conn.in_transaction
+    assert conn.execute("SELECT speed FROM testmode").fetchone()[0] != 1
+
+
+def test_batch_that_changes_nothing_is_rolled_back(conn):
+    db_writer = writer.DatabaseWriter.__new__(writer.DatabaseWriter)
+    changes = conn.total_changes
+    db_writer.commit(conn, [writer.Write("UPDATE testmode SET speed = 1 WHERE flag = 99", ())])
+
+    assert not conn.in_transaction
+    assert conn.total_changes == changes
+
+
+def test_failed_batch_is_retried_with_newer_writes_winning(database, conn, capsys, monkeypatch):
+    monkeypatch.setattr(writer, "WRITE_RETRY_TIME", 0.05)
+    db_writer = writer.DatabaseWriter(database, batch_time=0.01)
+
+    # the table doesn't exist yet, so the batch fails and is put back
+    db_writer.update("later", "INSERT INTO later VALUES (?)", (1,))
+    output = []
+    wait_for(lambda: output.append(capsys.readouterr().out) or "Database write failed" in "".join(output))
+
+    db_writer.update("later", "INSERT INTO later VALUES (?)", (2,))
+    conn.execute("CREATE TABLE later (value INTEGER)")
+    conn.commit()
+
+    wait_for(lambda: conn.execute("SELECT value FROM later").fetchall() == [(2,)])
+    time.sleep(0.1)
+    assert conn.execute("SELECT value FROM later").fetchall() == [(2,)]
@@ -0,0 +1,47 @@
+import zones
+import pytest
+
+
+def add_zones(conn, rows):
+    conn.execute("CREATE TABLE zones (zone_id INTEGER PRIMARY KEY, board INTEGER, channel INTEGER, scene INTEGER)")
+    conn.executemany("INSERT INTO zones VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+
+
+def test_one_zone_without_a_zones_table(conn):
+    assert zones.read_zones(conn.cursor()) == zones.DEFAULT_ZONES
+
+
+def test_one_zone_with_an_empty_zones_table(conn):
+    add_zones(conn, [])
+
+    assert zones.read_zones(conn.cursor()) == zones.DEFAULT_ZONES
+
+
+def test_null_board_and_channel_fill_the_next_free_slot(conn):
+    add_zones(conn, [(1, None, None, None), (2, None, None, 9), (3, 0x41, None, None), (4, 0x41, 6, None),
+                     (5, 0x41, None, None)])
+
+    zone_list = zones.read_zones(conn.cursor())
+
+    assert zone_list == [zones.Zone(1, 0x40, 0, None), zones.Zone(2, 0x40, 3, 9), zones.Zone(3, 0x41, 0, None),
+                         zones.Zone(4, 0x41, 6, None), zones.Zone(5, 0x41, 9, None)]
+    assert zones.boards(zone_list) == [0x40, 0x41]
+
+
+@pytest.mark.parametrize("rows, message", [
+    ([(1, 0x40, 0, None), (2, 0x40, 2, None)], "channel 2 of board 0x40 is used by zone 1"),
+    ([(1, None, 14, None)], "channel 14 out of range"),
+    ([(1, 0x80, 0, None)], "invalid I2C address"),
+])
+def test_invalid_layouts(conn, rows, message):
+    add_zones(conn, rows)
+
+    with pytest.raises(ValueError, match=message):
+        zones.read_zones(conn.cursor())
+
+
+def test_zones_on_different_boards_may_share_channels(conn):
+    add_zones(conn, [(1, 0x40, 0, None), (2, 0x41, 0, None)])
+
+    assert [zone.board for zone in zones.read_zones(conn.cursor())] == [0x40, 0x41]